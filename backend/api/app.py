@@ -1,47 +1,160 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, json, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from functools import wraps
 from openai import AuthenticationError
 import os
+import shutil
+import tempfile
+import zlib
+from datetime import datetime
 from dotenv import load_dotenv
 
 
-from backend.services.bookmark_service import BookmarkService
+from backend.services.bookmark_service import BookmarkService, DuplicateBookmarkError, SEARCH_MODES
 from backend.services.collection_service import CollectionService
 from backend.services.favorite_service import FavoriteService
 from backend.services.tag_service import TagService
+from backend.services.embedding_worker import EmbeddingWorker
+from backend.services.import_service import ImportService, ImportRecordError
+from backend.services.batch_service import BatchService, BatchError
+from backend.services.duplicate_service import DuplicateService
+from backend.services.export_service import ExportService, CONTENT_TYPES
+from backend.infra import metrics
+from backend.infra.cache import LRUCache
 from backend.infra.db import db
+from backend.infra.versions import etag_variant, versions
+
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Adds JSON encoding time to the current request's `serialize` timing."""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.timed('serialize'):
+            return super().dumps(obj, **kwargs)
+
 
 load_dotenv()
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['OPENAI_API_KEY'] = os.environ.get('API_KEY')
 
 # Allow common dev origins so data loads when using different ports or network URL
-CORS(
-    app,
-    origins=[
-        "http://localhost:3000",
-        "https://localhost:3000",
-        "http://localhost:3001",
-        "http://localhost:3002",
-        "http://127.0.0.1:3000",
-        "http://127.0.0.1:3001",
-        "http://127.0.0.1:3002",
-    ],
-    supports_credentials=True,
-)
+CORS_ORIGINS = [
+    "http://localhost:3000",
+    "https://localhost:3000",
+    "http://localhost:3001",
+    "http://localhost:3002",
+    "http://127.0.0.1:3000",
+    "http://127.0.0.1:3001",
+    "http://127.0.0.1:3002",
+]
+CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
 
 db.init_app(app)
 
 bookmark_service = BookmarkService()
 collection_service = CollectionService()
 tag_service = TagService()
-favorite_service = FavoriteService()
+favorite_service = FavoriteService(bookmark_service)
+import_service = ImportService(bookmark_service)
+batch_service = BatchService(bookmark_service)
+duplicate_service = DuplicateService(bookmark_service)
+export_service = ExportService()
 
 with app.app_context():
+    metrics.instrument_engine(db.engine)
     db.create_all()
+    # With a saved index, each process loads it at startup instead of on its first search.
+    if bookmark_service.index_path:
+        bookmark_service.warm_index()
+
+# Bookmark writes only queue embeddings; this worker computes them in batches.
+# Set EMBEDDING_WORKER=off when running `python -m backend.worker` separately.
+embedding_worker = EmbeddingWorker(app, bookmark_service)
+bookmark_service.worker = embedding_worker
+if os.environ.get('EMBEDDING_WORKER', 'thread') == 'thread':
+    embedding_worker.start()
+
+@app.before_request
+def _start_timing():
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.timings, g.timings_token = metrics.begin_request(route)
+
+
+@app.after_request
+def _server_timing(response):
+    timings = g.get('timings')
+    if timings is not None:
+        timings.status = response.status_code
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+
+@app.teardown_request
+def _record_timing(exc):
+    # Streamed bodies tear down after the last chunk, so this covers the whole response.
+    timings = g.pop('timings', None)
+    if timings is None:
+        return
+    route = timings.route
+    metrics.REQUEST_SECONDS.observe(timings.elapsed(), method=request.method, route=route, status=timings.status or 500)
+    metrics.REQUEST_QUERIES.observe(timings.counts.get('db', 0), route=route)
+    metrics.REQUEST_DB_SECONDS.observe(timings.durations.get('db', 0.0), route=route)
+    if 'serialize' in timings.durations:
+        metrics.SERIALIZATION_SECONDS.observe(timings.durations['serialize'], route=route)
+    metrics.end_request(g.pop('timings_token'))
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Rendered GET bodies keyed by ETag; off unless RESPONSE_CACHE_SIZE is set.
+response_cache = LRUCache(maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 0)))
+
+
+def conditional(*resources):
+    """
+    ETag a GET view from the version counters of the resources it renders.
+    A matching If-None-Match gets a 304 before the view (and the database)
+    runs. The tag is taken before the view queries, so a write racing the
+    query can only make it stale, never wrong.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = versions.etag(resources, etag_variant(request.full_path, request.headers.get('Accept', '')))
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(etag) if response_cache.maxsize else None
+                if cached is not None:
+                    body, mimetype = cached
+                    response = Response(body, mimetype=mimetype)
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if response_cache.maxsize and not response.is_streamed:
+                        response_cache.set(etag, (response.get_data(), response.mimetype))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            updated_at = versions.last_modified(*resources)
+            if updated_at:
+                response.last_modified = updated_at
+            return response
+        return wrapper
+    return decorator
+
+
 @app.route('/tags', methods=['GET'])
+@conditional('tags')
 def get_tags():
     tags = tag_service.get_all()
     return jsonify([tag.to_dict() for tag in tags])
@@ -52,6 +165,7 @@ def create_tags():
     return jsonify(tag.to_dict()), 201
 
 @app.route('/tags/<int:tag_id>', methods=['GET'])
+@conditional('tags')
 def get_tag(tag_id):
     tag = tag_service.get_by_id(tag_id)
     if tag:
@@ -65,11 +179,13 @@ def delete_tag(tag_id):
     return jsonify({'error': 'Tag not found'}), 404
 
 @app.route('/collections', methods=['GET'])
+@conditional('collections')
 def get_collections():
     collections = collection_service.get_all()
     return jsonify([col.to_dict() for col in collections])
 
 @app.route('/collections/<int:collection_id>', methods=['GET'])
+@conditional('collections')
 def get_collection(collection_id):
     col = collection_service.get_by_id(collection_id)
     if col:
@@ -96,23 +212,39 @@ def delete_collection(collection_id):
     return jsonify({'error': 'Collection not found'}), 404
 
 @app.route('/bookmarks/<int:bookmark_id>', methods=['GET'])
+@conditional('bookmarks')
 def get_bookmark(bookmark_id):
     bm = bookmark_service.get_by_id(bookmark_id)
     if bm:
         return jsonify(bm.to_dict())
     return jsonify({'error': 'Bookmark not found'}), 404
 
+@app.route('/bookmarks/<int:bookmark_id>/similar', methods=['GET'])
+@conditional('bookmarks')
+def get_similar_bookmarks(bookmark_id):
+    """Related bookmarks from the precomputed neighbour lists, best first, each with its `score`; no embedding call."""
+    limit = min(50, max(1, request.args.get('limit', 10, type=int)))
+    similar = bookmark_service.neighbors.similar(bookmark_id, limit)
+    if similar is None:
+        return jsonify({'error': 'Bookmark not found'}), 404
+    return jsonify([{**bm.to_dict(), 'score': score} for bm, score in similar])
+
 @app.route('/create-bookmark', methods=['POST'])
 def create_bookmark():
+    """With `reject_duplicate: true`, 409 with the saved bookmark if the URL is already saved."""
     data = request.json
-    bm = bookmark_service.create(
-        data['title'],
-        data['url'],
-        data['description'],
-        data['collection_id'],
-        data.get('tag_ids', []),
-        data.get('is_favorite', False)
-    )
+    try:
+        bm = bookmark_service.create(
+            data['title'],
+            data['url'],
+            data['description'],
+            data['collection_id'],
+            data.get('tag_ids', []),
+            data.get('is_favorite', False),
+            reject_duplicate=bool(data.get('reject_duplicate', False)),
+        )
+    except DuplicateBookmarkError as e:
+        return jsonify({'error': str(e), 'duplicateOf': e.existing.to_dict()}), 409
     return jsonify(bm.to_dict()), 201
 
 @app.route('/bookmarks/<int:bookmark_id>', methods=['PUT'])
@@ -137,30 +269,236 @@ def delete_bookmark(bookmark_id):
         return jsonify({'success': True})
     return jsonify({'error': 'Bookmark not found'}), 404
 
+@app.route('/bookmarks/import', methods=['POST'])
+def import_bookmarks():
+    """
+    Bulk import from a Netscape bookmark HTML export, a JSON array or NDJSON,
+    sent as multipart `file` or as the raw body. Streams NDJSON progress events.
+    """
+    upload = request.files.get('file')
+    if upload:
+        # Flask closes request.files before a streamed body runs, so spool the upload off first.
+        source = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        shutil.copyfileobj(upload.stream, source)
+        source.seek(0)
+    else:
+        source = request.stream
+    try:
+        events = import_service.start(
+            source,
+            fmt=request.args.get('format'),
+            filename=upload.filename if upload else None,
+            content_type=upload.mimetype if upload else request.mimetype,
+            default_collection_id=request.args.get('collection_id', type=int),
+        )
+    except ImportRecordError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(json.dumps(event) + '\n' for event in events),
+        mimetype='application/x-ndjson',
+    )
+
+def _batch(action):
+    """
+    Run a batch action on the JSON body's `ids` and answer with
+    {results: {id: 'ok' | 'unchanged' | 'not_found'}, counts: {status: n}}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'expected a JSON object with ids'}), 400
+    try:
+        results = action(data)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    counts = {}
+    for status in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    return jsonify({'results': {str(bm_id): status for bm_id, status in results.items()}, 'counts': counts})
+
+@app.route('/bookmarks/batch/favorite', methods=['POST'])
+def batch_favorite():
+    return _batch(lambda data: batch_service.set_favorite(data.get('ids'), True))
+
+@app.route('/bookmarks/batch/unfavorite', methods=['POST'])
+def batch_unfavorite():
+    return _batch(lambda data: batch_service.set_favorite(data.get('ids'), False))
+
+@app.route('/bookmarks/batch/move', methods=['POST'])
+def batch_move():
+    return _batch(lambda data: batch_service.move(data.get('ids'), data.get('collection_id')))
+
+@app.route('/bookmarks/batch/tags', methods=['POST'])
+def batch_tags():
+    return _batch(lambda data: batch_service.set_tags(data.get('ids'), data.get('add'), data.get('remove')))
+
+@app.route('/bookmarks/batch/delete', methods=['POST'])
+def batch_delete():
+    return _batch(lambda data: batch_service.delete(data.get('ids')))
+
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"invalid boolean: {value}")
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _bookmark_filters():
+    args = request.args
+    return {
+        'collection_id': args.get('collection_id', type=int),
+        'tag_id': args.get('tag_id', type=int),
+        'favorite': _parse_bool(args.get('favorite')),
+        'created_after': _parse_datetime(args.get('created_after')),
+        'created_before': _parse_datetime(args.get('created_before')),
+    }
+
+
+def _buffered(parts, size=64 * 1024):
+    """Join small streamed pieces into larger writes."""
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _list_bookmarks(**fixed_filters):
+    """
+    Bookmark listing shared by /bookmarks and /favorites.
+    - `limit` and/or `cursor`: one keyset page as {items, nextCursor}
+    - `format=ndjson` (or Accept: application/x-ndjson): every row, one JSON object per line
+    - otherwise: every row as a JSON array, streamed
+    Filters: collection_id, tag_id, favorite, created_after, created_before.
+    """
+    try:
+        filters = {**_bookmark_filters(), **fixed_filters}
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = min(500, max(1, request.args.get('limit', 50, type=int)))
+            items, next_cursor = bookmark_service.list_page(limit, request.args.get('cursor'), **filters)
+            return jsonify({'items': [bm.to_dict() for bm in items], 'nextCursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = bookmark_service.iter_filtered(**filters)
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        body = (json.dumps(bm.to_dict()) + '\n' for bm in rows)
+        return Response(stream_with_context(_buffered(body)), mimetype='application/x-ndjson')
+
+    def array():
+        yield '['
+        for i, bm in enumerate(rows):
+            yield (',' if i else '') + json.dumps(bm.to_dict())
+        yield ']'
+    return Response(stream_with_context(_buffered(array())), mimetype='application/json')
+
+
+def _gzipped(parts):
+    """Compress streamed text pieces into gzip member bytes as they come."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for part in parts:
+        data = compressor.compress(part.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route('/export', methods=['GET'])
+def export_bookmarks():
+    """
+    Download the whole library as `format` json (default), ndjson, csv or
+    html (a Netscape bookmark file), with tags and collection names;
+    `embeddings=true` adds stored vectors (not for html). `gzip=true` sends
+    a .gz file; clients sending Accept-Encoding: gzip get the body
+    compressed on the fly either way.
+    """
+    fmt = request.args.get('format', 'json')
+    try:
+        embeddings = bool(_parse_bool(request.args.get('embeddings')))
+        as_file = bool(_parse_bool(request.args.get('gzip')))
+        parts = export_service.stream(fmt, embeddings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    body = _buffered(parts)
+    filename = f"bookmarks.{fmt}"
+    headers = {}
+    mimetype = CONTENT_TYPES[fmt]
+    if as_file:
+        body, filename, mimetype = _gzipped(body), filename + '.gz', 'application/gzip'
+    elif 'gzip' in request.accept_encodings:
+        body = _gzipped(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
 @app.route('/bookmarks', methods=['GET'])
+@conditional('bookmarks')
 def get_bookmarks():
-    bookmarks = bookmark_service.get_all()
-    return jsonify([bm.to_dict() for bm in bookmarks])
+    return _list_bookmarks()
 
 
 @app.route('/bookmarks/search', methods=['GET'])
 def search_bookmarks():
-    """Vector search: query string compared to bookmark embeddings, returns top 15 by similarity."""
+    """
+    Search bookmarks, top 15 by relevance. `mode` is hybrid (BM25 and
+    vector ranks fused), semantic (embeddings only) or lexical (BM25 only).
+    Takes the same collection_id, tag_id, favorite and created_after/before
+    filters as /bookmarks; they are applied while ranking, not afterwards.
+    """
     q = request.args.get('q', '').strip()
     if not q:
         return jsonify([])
     limit = min(15, max(1, request.args.get('limit', 15, type=int)))
+    mode = request.args.get('mode')
+    if mode is not None and mode not in SEARCH_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    try:
+        filters = _bookmark_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
-        bookmarks = bookmark_service.search_by_query(q, limit=limit)
+        bookmarks = bookmark_service.search_by_query(q, limit=limit, mode=mode, filters=filters)
         return jsonify([bm.to_dict() for bm in bookmarks])
     except AuthenticationError:
         return jsonify({'error': 'OpenAI API key not configured or invalid. Set API_KEY in .env.'}), 503
 
 
+@app.route('/bookmarks/duplicates', methods=['GET'])
+@conditional('bookmarks')
+def get_duplicates():
+    """
+    Duplicate clusters found by the last `backend.jobs.find_duplicates` run,
+    largest first, `limit` (default 50) per page; pass `nextAfter` back as
+    `after` for the next page.
+    """
+    limit = min(500, max(1, request.args.get('limit', 50, type=int)))
+    clusters, next_after = duplicate_service.clusters(limit, request.args.get('after', 0, type=int))
+    return jsonify({'clusters': clusters, 'nextAfter': next_after})
+
+
+@app.route('/bookmarks/search/cache-stats', methods=['GET'])
+def search_cache_stats():
+    return jsonify(bookmark_service.cache_stats())
+
 @app.route('/favorites', methods=['GET'])
+@conditional('bookmarks')
 def get_favorites():
-    favorites = favorite_service.get_all()
-    return jsonify([bm.to_dict() for bm in favorites])
+    return _list_bookmarks(favorite=True)
 
 @app.route('/favorites/<int:bookmark_id>', methods=['POST'])
 def add_favorite(bookmark_id):
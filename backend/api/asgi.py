@@ -0,0 +1,228 @@
+"""
+ASGI entry point for the async serving mode:
+
+    SERVER_MODE=asgi gunicorn -c backend/gunicorn.conf.py backend.api.asgi:app
+
+Search, single-bookmark reads and favorite toggles run on the event loop.
+Query embeddings come from the provider's async client and rows from an
+async SQLAlchemy session, so one worker can keep hundreds of them in flight
+while the embedding API answers. Every other route is handed to the Flask
+app in backend.api.app through a WSGI bridge on a thread pool, so both modes
+serve the same API.
+"""
+import asyncio
+from email.utils import formatdate
+import json
+import os
+import re
+from urllib.parse import parse_qs
+
+from openai import AuthenticationError
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from backend.api import app as flask_module
+from backend.infra import metrics
+from backend.infra.async_db import create_session_factory
+from backend.infra.versions import etag_variant, versions
+from backend.services.async_bookmark_service import AsyncBookmarkService
+from backend.services.bookmark_service import SEARCH_MODES
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.args = {key: values[0] for key, values in parse_qs(self.query_string).items()}
+        self.body = body
+
+    @property
+    def full_path(self):
+        return f"{self.path}?{self.query_string}"
+
+
+def json_response(payload, status=200, headers=None):
+    with metrics.timed('serialize'):
+        body = json.dumps(payload).encode('utf-8')
+    return status, dict(headers or {}), body, 'application/json'
+
+
+def _search_filters(args):
+    """The /bookmarks list filters from query args, parsed as the Flask app does; raises ValueError."""
+    def integer(name):
+        # Like Flask's args.get(name, type=int): a malformed value is ignored.
+        try:
+            return int(args[name])
+        except (KeyError, ValueError):
+            return None
+    return {
+        'collection_id': integer('collection_id'),
+        'tag_id': integer('tag_id'),
+        'favorite': flask_module._parse_bool(args.get('favorite')),
+        'created_after': flask_module._parse_datetime(args.get('created_after')),
+        'created_before': flask_module._parse_datetime(args.get('created_before')),
+    }
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+
+class AsyncApp:
+    def __init__(self, flask_app, wsgi_threads=None):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_threads or int(os.environ.get('ASGI_WSGI_THREADS', 16)))
+        self.routes = []
+        self.engine = None
+        self.bookmarks = None
+        self._start_lock = asyncio.Lock()
+
+    def route(self, method, rule, pattern):
+        """Register a native handler; `rule` is the Flask rule, used as the metrics route label."""
+        compiled = re.compile(f"^{pattern}$")
+
+        def decorator(handler):
+            self.routes.append((method, compiled, rule, handler))
+            return handler
+        return decorator
+
+    async def run_sync(self, fn, *args):
+        """Run a sync service call on a thread, inside a Flask app context."""
+        def call():
+            with self.flask_app.app_context():
+                return fn(*args)
+        return await asyncio.to_thread(call)
+
+    async def startup(self):
+        async with self._start_lock:
+            if self.bookmarks is None:
+                self.engine, sessions = create_session_factory(self.flask_app.config['SQLALCHEMY_DATABASE_URI'])
+                self.bookmarks = AsyncBookmarkService(flask_module.bookmark_service, sessions, self.run_sync)
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+        await flask_module.bookmark_service.embedder.aclose()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http':
+            for method, pattern, rule, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match and scope['method'] == method:
+                    return await self._serve(handler, rule, match.groupdict(), scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _serve(self, handler, rule, params, scope, receive, send):
+        if self.bookmarks is None:
+            await self.startup()
+        timings, token = metrics.begin_request(rule)
+        try:
+            body = b''
+            while True:
+                message = await receive()
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            request = Request(scope, body)
+            status, headers, payload, content_type = await handler(self, request, **params)
+            headers['Server-Timing'] = timings.server_timing()
+            if content_type:
+                headers['Content-Type'] = content_type
+            headers['Content-Length'] = str(len(payload))
+            origin = request.headers.get('origin')
+            if origin in flask_module.CORS_ORIGINS:
+                headers['Access-Control-Allow-Origin'] = origin
+                headers['Access-Control-Allow-Credentials'] = 'true'
+                headers['Vary'] = 'Origin'
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': payload})
+            timings.status = status
+        finally:
+            metrics.REQUEST_SECONDS.observe(timings.elapsed(), method=scope['method'], route=rule,
+                                            status=timings.status or 500)
+            metrics.REQUEST_QUERIES.observe(timings.counts.get('db', 0), route=rule)
+            metrics.REQUEST_DB_SECONDS.observe(timings.durations.get('db', 0.0), route=rule)
+            if 'serialize' in timings.durations:
+                metrics.SERIALIZATION_SECONDS.observe(timings.durations['serialize'], route=rule)
+            metrics.end_request(token)
+
+
+app = AsyncApp(flask_module.app)
+
+
+@app.route('GET', '/bookmarks/search', r'/bookmarks/search')
+async def search_bookmarks(app, request):
+    q = request.args.get('q', '').strip()
+    if not q:
+        return json_response([])
+    try:
+        limit = min(15, max(1, int(request.args.get('limit', 15))))
+    except ValueError:
+        limit = 15
+    mode = request.args.get('mode')
+    if mode is not None and mode not in SEARCH_MODES:
+        return json_response({'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}, 400)
+    try:
+        filters = _search_filters(request.args)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    try:
+        bookmarks = await app.bookmarks.search_by_query(q, limit=limit, mode=mode, filters=filters)
+    except AuthenticationError:
+        return json_response({'error': 'OpenAI API key not configured or invalid. Set API_KEY in .env.'}, 503)
+    return json_response([bm.to_dict() for bm in bookmarks])
+
+
+@app.route('GET', '/bookmarks/<int:bookmark_id>', r'/bookmarks/(?P<bookmark_id>\d+)')
+async def get_bookmark(app, request, bookmark_id):
+    # Same ETag as the Flask route's @conditional('bookmarks'), so clients can switch between modes.
+    etag = versions.etag(('bookmarks',), etag_variant(request.full_path, request.headers.get('accept', '')))
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    updated_at = versions.last_modified('bookmarks')
+    if updated_at:
+        headers['Last-Modified'] = formatdate(updated_at, usegmt=True)
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return 304, headers, b'', None
+    bm = await app.bookmarks.get_by_id(int(bookmark_id))
+    if bm is None:
+        return json_response({'error': 'Bookmark not found'}, 404)
+    return json_response(bm.to_dict(), headers=headers)
+
+
+@app.route('POST', '/favorites/<int:bookmark_id>', r'/favorites/(?P<bookmark_id>\d+)')
+async def add_favorite(app, request, bookmark_id):
+    bm = await app.bookmarks.set_favorite(int(bookmark_id), True)
+    if bm is None:
+        return json_response({'error': 'Bookmark not found'}, 404)
+    return json_response(bm.to_dict())
+
+
+@app.route('DELETE', '/favorites/<int:bookmark_id>', r'/favorites/(?P<bookmark_id>\d+)')
+async def remove_favorite(app, request, bookmark_id):
+    if await app.bookmarks.set_favorite(int(bookmark_id), False) is None:
+        return json_response({'error': 'Bookmark not found'}, 404)
+    return json_response({'success': True})
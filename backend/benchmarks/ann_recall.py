@@ -0,0 +1,87 @@
+"""
+Recall and latency of the IVF index against exact search on synthetic clustered embeddings.
+
+    python -m backend.benchmarks.ann_recall --size 200000 --dim 256 --nprobe 1 4 16 64
+
+For every nprobe value it reports recall@k against EmbeddingIndex (exact) and the
+mean / p99 query latency of both; --json writes the same numbers to a file.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.ivf_index import IVFIndex
+
+
+def clustered_vectors(size, dim, clusters, spread, seed):
+    """Gaussian blobs around random centers, which is roughly how topical embeddings group."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size)
+    return (centers[labels] + rng.normal(scale=spread, size=(size, dim))).astype(np.float32), centers, rng
+
+
+def _timed_search(index, queries, k, **kwargs):
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append({bm_id for bm_id, _ in index.search(query, k, **kwargs)})
+        latencies.append(time.perf_counter() - started)
+    latencies = np.asarray(latencies) * 1000
+    return results, {'mean_ms': round(float(latencies.mean()), 3), 'p99_ms': round(float(np.percentile(latencies, 99)), 3)}
+
+
+def run(size, dim, clusters, spread, queries, k, nlist, nprobes, seed=0):
+    vectors, centers, rng = clustered_vectors(size, dim, clusters, spread, seed)
+    labels = rng.integers(0, clusters, queries)
+    query_vectors = centers[labels] + rng.normal(scale=spread, size=(queries, dim))
+
+    exact = EmbeddingIndex()
+    exact.load(enumerate(vectors))
+    ivf = IVFIndex(nlist=nlist or None, min_train_size=0)
+    ivf.load(enumerate(vectors))
+    started = time.perf_counter()
+    nlist = ivf.rebuild()
+    build_seconds = time.perf_counter() - started
+
+    truth, exact_latency = _timed_search(exact, query_vectors, k)
+    report = {
+        'size': size,
+        'dim': dim,
+        'k': k,
+        'nlist': nlist,
+        'build_seconds': round(build_seconds, 2),
+        'exact': exact_latency,
+        'ivf': [],
+    }
+    for nprobe in nprobes:
+        found, latency = _timed_search(ivf, query_vectors, k, nprobe=nprobe)
+        recall = sum(len(a & b) for a, b in zip(truth, found)) / (k * queries)
+        report['ivf'].append({'nprobe': nprobe, 'recall': round(recall, 4), **latency})
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--clusters', type=int, default=1000)
+    parser.add_argument('--spread', type=float, default=1.0, help='noise around each cluster center')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=15)
+    parser.add_argument('--nlist', type=int, default=0, help='0 picks sqrt(size)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+    report = run(args.size, args.dim, args.clusters, args.spread, args.queries, args.k, args.nlist, args.nprobe)
+    print(f"{report['size']} x {report['dim']}, nlist {report['nlist']}, built in {report['build_seconds']}s")
+    print(f"exact      mean {report['exact']['mean_ms']:8.3f} ms  p99 {report['exact']['p99_ms']:8.3f} ms")
+    for row in report['ivf']:
+        print(f"nprobe {row['nprobe']:3d} mean {row['mean_ms']:8.3f} ms  p99 {row['p99_ms']:8.3f} ms  recall@{args.k} {row['recall']:.3f}")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
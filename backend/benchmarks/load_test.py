@@ -0,0 +1,202 @@
+"""
+Throughput of the sync and async serving modes under concurrent search load.
+
+    python -m backend.benchmarks.load_test --size 10000 --concurrency 200 --duration 20 --embedding-latency 0.2
+
+Generates a library (unless --reuse) and starts gunicorn in each mode on a
+free port: sync workers serving backend.main:app, and uvicorn workers
+serving backend.api.asgi:app. Both use the fake embedding provider, delayed
+by --embedding-latency seconds per call to stand in for the OpenAI round
+trip. The servers are driven by --concurrency keep-alive connections. Each
+request is a hybrid search with a query no cache has seen, or, for
+--read-ratio of them, a bookmark read. Requests/s and latency percentiles
+are reported per mode.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from backend.benchmarks.suite import QUERIES
+
+MODES = {
+    'sync': ('backend.main:app', {}),
+    'asgi': ('backend.api.asgi:app', {'SERVER_MODE': 'asgi'}),
+}
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _read_response(reader):
+    """(status, close) after reading one HTTP/1.1 response, body included."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    version, status = lines[0].split(' ', 2)[:2]
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    close = headers.get('connection') == 'close' or version == 'HTTP/1.0'
+    return int(status), close
+
+
+async def _client(port, deadline, paths, latencies, errors, timeout):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = next(paths)
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+            status, close = await asyncio.wait_for(_read_response(reader), timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            errors.append(path)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            errors.append(path)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _paths(size, read_ratio, seed):
+    rng = np.random.default_rng(seed)
+    n = 0
+    while True:
+        n += 1
+        if rng.random() < read_ratio:
+            yield f"/bookmarks/{int(rng.integers(1, size + 1))}"
+        else:
+            # A counter in the query defeats the embedding and result caches.
+            words = QUERIES[n % len(QUERIES)].replace(' ', '+')
+            yield f"/bookmarks/search?mode=hybrid&q={words}+{n}"
+
+
+async def drive(port, concurrency, duration, size, read_ratio, timeout=30.0, seed=0):
+    latencies, errors = [], []
+    paths = _paths(size, read_ratio, seed)
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(_client(port, deadline, paths, latencies, errors, timeout) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    values = np.asarray(latencies or [0.0]) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(values, 50)), 1),
+        'p95_ms': round(float(np.percentile(values, 95)), 1),
+        'p99_ms': round(float(np.percentile(values, 99)), 1),
+    }
+
+
+def _start_server(mode, port, workers, env):
+    app, extra = MODES[mode]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'backend/gunicorn.conf.py', '--bind', f"127.0.0.1:{port}",
+         '--workers', str(workers), '--access-logfile', os.devnull, app],
+        cwd=ROOT, env={**env, **extra}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited:\n{process.stderr.read().decode()[-2000:]}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b"GET /collections HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+                if sock.recv(12).startswith(b'HTTP/1.1 200'):
+                    return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['sync', 'asgi'])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers in each mode')
+    parser.add_argument('--concurrency', type=int, default=200, help='concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--embedding-latency', type=float, default=0.2, help='seconds per fake embedding call')
+    parser.add_argument('--read-ratio', type=float, default=0.2, help='share of bookmark reads among requests')
+    parser.add_argument('--database-url', help='database with a generated library; default is a SQLite file in the temp dir')
+    parser.add_argument('--reuse', action='store_true', help='use the existing library instead of generating one')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if database_url is None:
+        path = os.path.join(tempfile.gettempdir(), f"bookmark-load-{args.size}.db")
+        if not args.reuse and os.path.exists(path):
+            os.remove(path)
+        database_url = f"sqlite:///{path}"
+    env = {
+        **os.environ,
+        'DATABASE_URL': database_url,
+        'EMBEDDING_WORKER': 'off',
+        'EMBEDDING_PROVIDER': 'fake',
+        'EMBEDDING_DIM': os.environ.get('EMBEDDING_DIM', '64'),
+        'EMBEDDING_FAKE_LATENCY': str(args.embedding_latency),
+        'EMBEDDING_INDEX': os.environ.get('EMBEDDING_INDEX', 'flat'),
+    }
+    if not args.reuse:
+        os.environ.update(env)
+        from backend.api.app import app, bookmark_service
+        from backend.benchmarks.synthetic import generate
+        with app.app_context():
+            generate(bookmark_service, args.size, log=lambda *_: None)
+
+    report = {'meta': {k: v for k, v in vars(args).items() if k not in ('json', 'reuse')}, 'modes': {}}
+    for mode in args.modes:
+        port = _free_port()
+        server = _start_server(mode, port, args.workers, env)
+        try:
+            report['modes'][mode] = asyncio.run(drive(port, args.concurrency, args.duration, args.size, args.read_ratio))
+        finally:
+            server.terminate()
+            try:
+                server.wait(30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        row = report['modes'][mode]
+        print(f"{mode:5s} {row['rps']:8.1f} req/s  p50 {row['p50_ms']:8.1f} ms  p95 {row['p95_ms']:8.1f} ms  "
+              f"p99 {row['p99_ms']:8.1f} ms  errors {row['errors']}")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Memory and recall of the int8 QuantizedIndex against exact float32 search on synthetic clustered embeddings.
+
+    python -m backend.benchmarks.quantization --size 200000 --dim 1536 --rescore 0 50 200 500
+
+For every rescore depth it reports recall@k against EmbeddingIndex (exact)
+and the mean / p99 query latency, next to the resident memory of both
+indexes; --json writes the same numbers to a file.
+"""
+import argparse
+import json
+
+from backend.benchmarks.ann_recall import _timed_search, clustered_vectors
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.quantized_index import QuantizedIndex
+
+
+def run(size, dim, clusters, spread, queries, k, rescores, seed=0):
+    vectors, centers, rng = clustered_vectors(size, dim, clusters, spread, seed)
+    labels = rng.integers(0, clusters, queries)
+    query_vectors = centers[labels] + rng.normal(scale=spread, size=(queries, dim))
+
+    exact = EmbeddingIndex()
+    exact.load(enumerate(vectors))
+    quantized = QuantizedIndex()
+    quantized.load(enumerate(vectors))
+    del vectors
+
+    truth, exact_latency = _timed_search(exact, query_vectors, k)
+    report = {
+        'size': size,
+        'dim': dim,
+        'k': k,
+        'memory': quantized.memory_report(),
+        'exact': exact_latency,
+        'int8': [],
+    }
+    for rescore in rescores:
+        quantized.rescore = rescore
+        found, latency = _timed_search(quantized, query_vectors, k)
+        recall = sum(len(a & b) for a, b in zip(truth, found)) / (k * queries)
+        report['int8'].append({'rescore': rescore, 'recall': round(recall, 4), **latency})
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--clusters', type=int, default=1000)
+    parser.add_argument('--spread', type=float, default=1.0, help='noise around each cluster center')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=15)
+    parser.add_argument('--rescore', type=int, nargs='+', default=[0, 50, 200, 500])
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+    report = run(args.size, args.dim, args.clusters, args.spread, args.queries, args.k, args.rescore)
+    memory = report['memory']
+    print(f"{report['size']} x {report['dim']}: float32 {memory['float32_bytes'] / 2**20:.1f} MiB, "
+          f"int8 {memory['resident_bytes'] / 2**20:.1f} MiB resident ({memory['ratio']}x smaller)")
+    print(f"exact        mean {report['exact']['mean_ms']:8.3f} ms  p99 {report['exact']['p99_ms']:8.3f} ms")
+    for row in report['int8']:
+        print(f"rescore {row['rescore']:4d} mean {row['mean_ms']:8.3f} ms  p99 {row['p99_ms']:8.3f} ms  "
+              f"recall@{args.k} {row['recall']:.3f}")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
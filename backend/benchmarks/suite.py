@@ -0,0 +1,263 @@
+"""
+End-to-end API benchmarks against a synthetic library.
+
+    python -m backend.benchmarks.suite --size 100000 --json results.json
+    python -m backend.benchmarks.suite --size 100000 --json new.json --baseline results.json --threshold 0.25
+
+Generates a library (see backend.benchmarks.synthetic) into a SQLite file in
+the temp directory, or into --database-url, embedded by the deterministic fake
+provider. Then it times each scenario through the Flask test client: search,
+listing, reads, creates, updates, imports and the collection and tag
+endpoints. Each scenario reports latency percentiles and SQL statements per
+request, counted by the metrics instrumentation (streamed bodies included).
+
+With --baseline, every scenario is compared with the baseline's numbers. The
+run exits with status 1 if any p50 grew by more than --threshold (and by more
+than --min-delta-ms), or if any scenario issues more queries per request.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+QUERIES = [
+    "python asyncio", "css grid layout", "postgres index", "vector embedding", "docker deploy",
+    "oauth token", "color palette", "sourdough bread", "train itinerary", "index fund",
+    "pytest fixtures", "react dom", "query planner", "transformer inference", "prometheus latency",
+    "password hashing", "typography spacing", "pasta sauce", "hotel museum", "tax savings",
+]
+
+
+def _percentiles(latencies_ms):
+    values = np.asarray(latencies_ms)
+    return {
+        'iterations': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def _scenarios(size, rng, collection_ids, tag_ids):
+    """name -> (iterations scale, request(i) returning a test-client response)."""
+    ids = rng.integers(1, size + 1, 10_000).tolist()
+    state = {'cursor': None, 'created': 0}
+
+    def search(mode, **filters):
+        return lambda client, i: client.get('/bookmarks/search', query_string={
+            'q': f"{QUERIES[i % len(QUERIES)]} {QUERIES[(i * 7 + 3) % len(QUERIES)].split()[0]}", 'mode': mode,
+            **filters})
+
+    def list_page(client, i):
+        query = {'limit': 50}
+        if state['cursor']:
+            query['cursor'] = state['cursor']
+        response = client.get('/bookmarks', query_string=query)
+        state['cursor'] = response.get_json()['nextCursor']
+        return response
+
+    def stream_collection(client, i):
+        # The smallest collections, so this measures streaming overhead rather than volume.
+        response = client.get('/bookmarks', query_string={'collection_id': collection_ids[-1 - i % 5]})
+        response.get_data()
+        return response
+
+    def create(client, i):
+        state['created'] += 1
+        return client.post('/create-bookmark', json={
+            'title': f"bench created {state['created']}", 'url': f"https://bench.example/{state['created']}",
+            'description': "created by the benchmark", 'collection_id': collection_ids[i % len(collection_ids)],
+            'tag_ids': tag_ids[i % len(tag_ids):i % len(tag_ids) + 2],
+        })
+
+    def update(client, i):
+        return client.put(f'/bookmarks/{ids[i]}', json={'title': f"bench updated {i}", 'tag_ids': tag_ids[:i % 4]})
+
+    def favorite(client, i):
+        bookmark_id = ids[i // 2]
+        return client.post(f'/favorites/{bookmark_id}') if i % 2 == 0 else client.delete(f'/favorites/{bookmark_id}')
+
+    def import_batch(client, i, records=500):
+        body = "\n".join(json.dumps({
+            'title': f"imported {i}-{n}", 'url': f"https://import.example/{i}/{n}",
+            'description': "bulk import", 'collection': "imported", 'tags': [f"tag{n % 20}", "imported"],
+        }) for n in range(records))
+        response = client.post('/bookmarks/import?format=ndjson', data=body, content_type='application/x-ndjson')
+        response.get_data()
+        return response
+
+    return {
+        'search_lexical': (1, search('lexical')),
+        'search_semantic': (1, search('semantic')),
+        'search_hybrid': (1, search('hybrid')),
+        # The least and most used collections: filtered searches should cost less than unfiltered ones.
+        'search_semantic_small_collection': (1, search('semantic', collection_id=collection_ids[-1])),
+        'search_semantic_large_collection': (1, search('semantic', collection_id=collection_ids[0])),
+        'search_hybrid_favorites': (1, search('hybrid', favorite='true')),
+        'list_page': (1, list_page),
+        'list_collection_page': (1, lambda client, i: client.get(
+            '/bookmarks', query_string={'collection_id': collection_ids[0], 'limit': 50})),
+        'list_stream_small_collection': (0.2, stream_collection),
+        'get_bookmark': (1, lambda client, i: client.get(f'/bookmarks/{ids[i]}')),
+        'create_bookmark': (1, create),
+        'update_bookmark': (1, update),
+        'favorite_toggle': (1, favorite),
+        'import_500': (0.05, import_batch),
+        'collections_list': (1, lambda client, i: client.get('/collections')),
+        'collection_get': (1, lambda client, i: client.get(f'/collections/{collection_ids[i % len(collection_ids)]}')),
+        'tags_list': (0.2, lambda client, i: client.get('/tags')),
+        'tag_get': (1, lambda client, i: client.get(f'/tags/{tag_ids[i % len(tag_ids)]}')),
+        'create_tag': (0.2, lambda client, i: client.post('/create-tags', json={'name': f"bench-{time.time_ns()}", 'color': "#3B82F6"})),
+    }
+
+
+def run(size, iterations=100, warmup=5, collections=50, tags=500, tags_per_bookmark=3, collection_skew=1.0,
+        tag_skew=1.0, seed=0, database_url=None, reuse=False, only=None, log=print):
+    """Generate (or reuse) a library, run the scenarios and return the report."""
+    if database_url is None:
+        path = os.path.join(tempfile.gettempdir(), f"bookmark-bench-{size}-{seed}.db")
+        if not reuse and os.path.exists(path):
+            os.remove(path)
+        database_url = f"sqlite:///{path}"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['EMBEDDING_WORKER'] = 'off'
+    os.environ.setdefault('EMBEDDING_PROVIDER', 'fake')
+    os.environ.setdefault('EMBEDDING_DIM', '64')
+    os.environ.setdefault('RESPONSE_CACHE_SIZE', '0')
+
+    from backend.api.app import app, bookmark_service
+    from backend.benchmarks.synthetic import generate
+    from backend.infra import metrics
+    from backend.infra.db import db
+    from backend.models.bookmark import Bookmark
+    from backend.models.collection import Collection
+    from backend.models.tags import Tag
+
+    setup = {}
+    with app.app_context():
+        existing = db.session.query(db.func.count(Bookmark.id)).scalar()
+        if not (reuse and existing):
+            started = time.perf_counter()
+            generate(bookmark_service, size, collections=collections, tags=tags, tags_per_bookmark=tags_per_bookmark,
+                     collection_skew=collection_skew, tag_skew=tag_skew, seed=seed, log=log)
+            setup['generate_seconds'] = round(time.perf_counter() - started, 2)
+        rows = db.session.query(db.func.count(Bookmark.id)).scalar()
+        collection_ids = [row[0] for row in db.session.query(Collection.id).order_by(Collection.count.desc(), Collection.id)]
+        tag_ids = [row[0] for row in db.session.query(Tag.id).order_by(Tag.id)]
+        started = time.perf_counter()
+        bookmark_service.warm_index()
+        bookmark_service._ensure_lexical_index()
+        setup['index_load_seconds'] = round(time.perf_counter() - started, 2)
+
+    client = app.test_client()
+    rng = np.random.default_rng(seed)
+    report = {
+        'meta': {
+            'size': size,
+            'bookmarks': rows,
+            'collections': collections,
+            'tags': tags,
+            'tags_per_bookmark': tags_per_bookmark,
+            'seed': seed,
+            'database': database_url.split(':', 1)[0],
+            'embedding_index': os.environ.get('EMBEDDING_INDEX', 'ivf'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'setup': setup,
+        'scenarios': {},
+    }
+    for name, (scale, request) in _scenarios(size, rng, collection_ids, tag_ids).items():
+        if only and name not in only:
+            continue
+        count = max(3, int(iterations * scale))
+        for i in range(warmup):
+            request(client, 5000 + i)
+        latencies, queries = [], []
+        for i in range(count):
+            statements, _ = metrics.DB_QUERY_SECONDS.snapshot()
+            started = time.perf_counter()
+            response = request(client, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+            queries.append(metrics.DB_QUERY_SECONDS.snapshot()[0] - statements)
+        report['scenarios'][name] = {**_percentiles(latencies), 'queries': round(float(np.mean(queries)), 2)}
+        log(f"{name:30s} p50 {report['scenarios'][name]['p50_ms']:9.3f} ms  "
+            f"p95 {report['scenarios'][name]['p95_ms']:9.3f} ms  queries {report['scenarios'][name]['queries']}")
+    return report
+
+
+def compare(results, baseline, threshold=0.25, min_delta_ms=0.5, metric='p50_ms'):
+    """
+    Rows of (scenario, baseline, current, ratio, status) for scenarios in both
+    reports. Status is 'regression' for a latency or query-count increase over
+    the thresholds, 'improved' for the mirror image, otherwise 'ok'.
+    """
+    rows = []
+    for name, current in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        old, new = before[metric], current[metric]
+        ratio = new / old if old else float('inf')
+        status = 'ok'
+        if new - old > min_delta_ms and ratio > 1 + threshold:
+            status = 'regression'
+        elif old - new > min_delta_ms and ratio < 1 / (1 + threshold):
+            status = 'improved'
+        if current.get('queries', 0) > before.get('queries', 0) + 0.5:
+            status = 'regression'
+        rows.append((name, old, new, round(ratio, 3), status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000, help='bookmarks to generate, e.g. 10000, 100000, 1000000')
+    parser.add_argument('--collections', type=int, default=50)
+    parser.add_argument('--tags', type=int, default=500)
+    parser.add_argument('--tags-per-bookmark', type=int, default=3)
+    parser.add_argument('--collection-skew', type=float, default=1.0, help='Zipf exponent of collection sizes; 0 is uniform')
+    parser.add_argument('--tag-skew', type=float, default=1.0, help='Zipf exponent of tag popularity; 0 is uniform')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--database-url', help='empty database to generate into; default is a SQLite file in the temp dir')
+    parser.add_argument('--reuse', action='store_true', help='benchmark an existing generated library')
+    parser.add_argument('--only', nargs='+', help='scenario names to run')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative p50 growth')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='ignore changes smaller than this')
+    args = parser.parse_args(argv)
+
+    report = run(args.size, iterations=args.iterations, warmup=args.warmup, collections=args.collections, tags=args.tags,
+                 tags_per_bookmark=args.tags_per_bookmark, collection_skew=args.collection_skew,
+                 tag_skew=args.tag_skew, seed=args.seed, database_url=args.database_url, reuse=args.reuse,
+                 only=args.only)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    if baseline.get('meta', {}).get('size') != report['meta']['size']:
+        print(f"warning: baseline has {baseline.get('meta', {}).get('size')} bookmarks, this run {report['meta']['size']}")
+    rows = compare(report, baseline, args.threshold, args.min_delta_ms)
+    for name, old, new, ratio, status in rows:
+        print(f"{name:30s} {old:9.3f} -> {new:9.3f} ms  x{ratio:<6} {status}")
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Deterministic synthetic bookmark libraries for benchmarks.
+
+Titles and descriptions are drawn from topic vocabularies so lexical and
+semantic search have something to rank; collections and tags are assigned
+with a Zipf skew (a few big ones, a long tail). Every row is stored already
+embedded by the service's embedder, with collection and tag counters set, so
+the database looks like a library the app has been running against.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, func, insert, select, text, update
+
+from backend.infra import embedding_codec
+from backend.infra.db import db
+from backend.infra.urls import normalize_url
+from backend.infra.versions import versions
+from backend.models.bookmark import EMBEDDING_READY, Bookmark, bookmark_tags
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+
+TOPICS = {
+    'python': "python django flask asyncio typing packaging pytest numpy pandas wheel interpreter",
+    'web': "css html javascript browser react layout flexbox grid accessibility dom fetch",
+    'data': "postgres sqlite index query planner vacuum replication schema migration join",
+    'ml': "embedding vector transformer training inference gradient dataset tokenizer model",
+    'ops': "kubernetes docker deploy monitoring prometheus logging incident latency cache",
+    'security': "tls oauth password hashing csrf cors token audit vulnerability sandbox",
+    'design': "typography color palette icon spacing figma contrast grid illustration",
+    'cooking': "recipe bread pasta sourdough oven spice sauce roast fermentation knife",
+    'travel': "flight hotel itinerary museum hiking train map visa beach island",
+    'finance': "budget invoice tax savings index fund mortgage pension inflation",
+}
+FILLER = "guide notes tutorial reference deep dive introduction tips patterns overview cheatsheet".split()
+DOMAINS = ["github.com", "docs.python.org", "developer.mozilla.org", "news.ycombinator.com",
+           "stackoverflow.com", "medium.com", "example.org", "wikipedia.org", "youtube.com", "arxiv.org"]
+COLORS = ["#3B82F6", "#10B981", "#F59E0B", "#EF4444", "#8B5CF6", "#EC4899"]
+
+
+def zipf_weights(n, skew):
+    """Probabilities over n items proportional to 1 / rank**skew (skew 0 is uniform)."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def library_texts(size, seed=0):
+    """(title, description, url) for `size` bookmarks; the same seed always gives the same texts."""
+    rng = np.random.default_rng(seed)
+    topics = [words.split() for words in TOPICS.values()]
+    topic_of = rng.integers(0, len(topics), size)
+    rows = []
+    for i in range(size):
+        words = topics[topic_of[i]]
+        title = " ".join(rng.choice(words, rng.integers(2, 5), replace=False)) + " " + FILLER[i % len(FILLER)]
+        description = " ".join(rng.choice(words + FILLER, rng.integers(6, 16)))
+        url = f"https://{DOMAINS[i % len(DOMAINS)]}/{title.replace(' ', '-')}-{i}"
+        rows.append((title, description, url))
+    return rows
+
+
+def generate(service, size, collections=50, tags=500, tags_per_bookmark=3, collection_skew=1.0, tag_skew=1.0,
+             favorite_ratio=0.05, seed=0, batch_size=5000, log=print):
+    """
+    Insert a synthetic library into an empty database (call inside an app
+    context). Vectors come from `service.embedder`, so a fake or local
+    provider keeps this offline and reproducible.
+    """
+    if db.session.query(func.count(Bookmark.id)).scalar():
+        raise ValueError("database already has bookmarks; generate into an empty one")
+    rng = np.random.default_rng(seed + 1)
+    session = db.session
+
+    session.execute(insert(Collection), [
+        {'name': f"collection {i}", 'icon': 'folder', 'color': COLORS[i % len(COLORS)], 'count': 0}
+        for i in range(collections)
+    ])
+    session.execute(insert(Tag), [
+        {'name': f"tag{i}", 'color': COLORS[i % len(COLORS)], 'count': 0} for i in range(tags)
+    ])
+    collection_ids = np.array([row[0] for row in session.execute(select(Collection.id).order_by(Collection.id))])
+    tag_ids = np.array([row[0] for row in session.execute(select(Tag.id).order_by(Tag.id))])
+    session.commit()
+
+    collection_of = collection_ids[rng.choice(collections, size, p=zipf_weights(collections, collection_skew))]
+    tag_p = zipf_weights(tags, tag_skew)
+    per_bookmark = min(tags_per_bookmark, tags)
+    favorites = rng.random(size) < favorite_ratio
+    created = datetime(2024, 1, 1)
+    collection_counts = np.zeros(collections, dtype=np.int64)
+    tag_counts = np.zeros(tags, dtype=np.int64)
+    texts = library_texts(size, seed)
+    model = service.embedding_model
+    now = datetime.utcnow()
+
+    for start in range(0, size, batch_size):
+        chunk = range(start, min(start + batch_size, size))
+        batch_texts = [service.embedding_text(texts[i][0], texts[i][1]) for i in chunk]
+        vectors = service.embedder.embed_many(batch_texts)
+        session.execute(insert(Bookmark.__table__), [{
+            'id': i + 1,
+            'title': texts[i][0],
+            'url': texts[i][2],
+            'normalized_url': normalize_url(texts[i][2]),
+            'description': texts[i][1],
+            'collection_id': int(collection_of[i]),
+            'created_at': created + timedelta(minutes=i),
+            'updated_at': now,
+            'is_favorite': bool(favorites[i]),
+            'has_dark_icon': False,
+            'embedding': embedding_codec.pack(vector, service.embedding_dtype),
+            'embedding_dim': len(vector),
+            'embedding_model': model,
+            'embedding_hash': service.text_hash(texts[i][0], texts[i][1]),
+            'embedding_status': EMBEDDING_READY,
+            'embedding_attempts': 0,
+            'embedded_at': now,
+        } for i, vector in zip(chunk, vectors)])
+        pairs = []
+        for i in chunk:
+            chosen = rng.choice(tags, per_bookmark, replace=False, p=tag_p) if per_bookmark else []
+            tag_counts[chosen] += 1
+            pairs.extend({'bookmark_id': i + 1, 'tag_id': int(tag_ids[t])} for t in chosen)
+        if pairs:
+            session.execute(insert(bookmark_tags), pairs)
+        session.commit()
+        log(f"inserted {chunk.stop}/{size} bookmarks")
+
+    np.add.at(collection_counts, np.searchsorted(collection_ids, collection_of), 1)
+    collection_table, tag_table = Collection.__table__, Tag.__table__
+    session.execute(update(collection_table).where(collection_table.c.id == bindparam('c_id')).values(count=bindparam('c_count')),
+                    [{'c_id': int(c), 'c_count': int(n)} for c, n in zip(collection_ids, collection_counts)])
+    session.execute(update(tag_table).where(tag_table.c.id == bindparam('t_id')).values(count=bindparam('t_count')),
+                    [{'t_id': int(t), 't_count': int(n)} for t, n in zip(tag_ids, tag_counts)])
+    if session.get_bind().dialect.name == 'postgresql':
+        # Ids were inserted explicitly; move the sequence past them so the app can create more.
+        session.execute(text("SELECT setval(pg_get_serial_sequence('bookmark', 'id'), (SELECT max(id) FROM bookmark))"))
+    session.commit()
+    versions.bump('bookmarks', 'collections', 'tags', 'memberships')
+    return {'bookmarks': size, 'collections': collections, 'tags': tags, 'tags_per_bookmark': per_bookmark}
@@ -1,9 +1,19 @@
 import multiprocessing
+import os
 bind = "0.0.0.0:8000"
 workers = multiprocessing.cpu_count() * 2 + 1
-# worker_class = "uvicorn.workers.UvicornWorker"
+# SERVER_MODE=asgi serves backend.api.asgi:app on uvicorn workers; each one
+# overlaps many searches waiting on the embedding API, so fewer are needed.
+if os.environ.get("SERVER_MODE") == "asgi":
+    worker_class = "uvicorn.workers.UvicornWorker"
 loglevel = "info"
 accesslog = "-"
 errorlog = "-"
 timeout = 120
-workers = 3
+workers = int(os.environ.get("WEB_CONCURRENCY", 3))
+
+
+def post_worker_init(worker):
+    # Lets streamed responses such as GET /export outlive `timeout`, see backend.infra.heartbeat.
+    from backend.infra import heartbeat
+    heartbeat.register(worker.notify)
@@ -0,0 +1,47 @@
+"""
+Async SQLAlchemy engine and sessions for the ASGI app, on the same database
+and models as the Flask-SQLAlchemy `db`.
+
+    postgresql://...  ->  postgresql+asyncpg://...
+    sqlite:///...     ->  sqlite+aiosqlite:///...
+"""
+import os
+
+from backend.infra import metrics
+
+_ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """The async-driver form of a sync SQLAlchemy URL; URLs already naming an async driver pass through."""
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        raise ValueError(f"Not a database URL: {url!r}")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def create_session_factory(url=None):
+    """
+    (engine, async_sessionmaker) for DATABASE_URL. Pool size and overflow come
+    from ASYNC_DB_POOL_SIZE / ASYNC_DB_MAX_OVERFLOW: with hundreds of requests
+    in flight, the pool rather than the worker count bounds database
+    concurrency.
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    url = async_database_url(url or os.environ['DATABASE_URL'])
+    options = {}
+    if not url.startswith('sqlite'):
+        options = {
+            'pool_size': int(os.environ.get('ASYNC_DB_POOL_SIZE', 20)),
+            'max_overflow': int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 20)),
+            'pool_pre_ping': True,
+        }
+    engine = create_async_engine(url, **options)
+    metrics.instrument_engine(engine.sync_engine, name='async')
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
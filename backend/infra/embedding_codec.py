@@ -0,0 +1,29 @@
+import numpy as np
+
+# Little-endian so blobs are portable between hosts.
+DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+}
+_BY_ITEMSIZE = {dtype.itemsize: dtype for dtype in DTYPES.values()}
+
+
+def pack(vector, dtype='float32'):
+    """Encode an embedding as packed little-endian float bytes."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    return np.asarray(vector, dtype=DTYPES[dtype]).ravel().tobytes()
+
+
+def unpack(blob, dim):
+    """
+    Decode a packed embedding back to a float32 array. The storage dtype is
+    implied by the blob length: 4 bytes per component for float32, 2 for float16.
+    """
+    if blob is None or not dim:
+        return None
+    blob = bytes(blob)
+    dtype = _BY_ITEMSIZE.get(len(blob) // dim)
+    if dtype is None or len(blob) != dim * dtype.itemsize:
+        raise ValueError(f"Embedding blob of {len(blob)} bytes does not match dimension {dim}")
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+
+from backend.infra.filter_index import allowed_rows, score_rows
+
+
+class EmbeddingIndex:
+    """
+    Process-resident vector index: a contiguous float32 matrix of
+    L2-normalized embeddings plus the bookmark id owning each row.
+    Scoring is a single matrix-vector product followed by an argpartition top-k.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._matrix = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self.dim = None
+        self.loaded = False
+        self.generation = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, bookmark_id):
+        return bookmark_id in self._positions
+
+    def ids(self):
+        with self._lock:
+            return list(self._positions)
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    def _ensure_capacity(self, needed):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._matrix = matrix
+        self._ids = ids
+
+    def load(self, items):
+        """Replace the index contents with an iterable of (bookmark_id, vector) pairs."""
+        ids = []
+        rows = []
+        dim = None
+        for bookmark_id, vector in items:
+            if vector is None:
+                continue
+            vec = self._normalize(vector)
+            if dim is None:
+                dim = vec.shape[0]
+            elif vec.shape[0] != dim:
+                continue
+            ids.append(bookmark_id)
+            rows.append(vec)
+        with self._lock:
+            self._matrix = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._positions = {}
+            self._size = 0
+            self.dim = dim
+            if rows:
+                self._ensure_capacity(len(rows))
+                self._matrix[:len(rows)] = np.vstack(rows)
+                self._ids[:len(rows)] = ids
+                self._positions = {bookmark_id: pos for pos, bookmark_id in enumerate(ids)}
+                self._size = len(rows)
+            self.loaded = True
+            self.generation += 1
+
+    def upsert(self, bookmark_id, vector):
+        """Insert or replace the vector for one bookmark."""
+        vec = self._normalize(vector)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+            if vec.shape[0] != self.dim:
+                raise ValueError(f"Embedding has dimension {vec.shape[0]}, index expects {self.dim}")
+            pos = self._positions.get(bookmark_id)
+            if pos is None:
+                self._ensure_capacity(self._size + 1)
+                pos = self._size
+                self._ids[pos] = bookmark_id
+                self._positions[bookmark_id] = pos
+                self._size += 1
+            self._matrix[pos] = vec
+            self.generation += 1
+
+    def contains_vector(self, bookmark_id, vector):
+        """True if the bookmark is indexed with (a scaled copy of) this vector."""
+        with self._lock:
+            pos = self._positions.get(bookmark_id)
+            if pos is None:
+                return False
+            vec = self._normalize(vector)
+            return vec.shape[0] == self.dim and np.allclose(self._matrix[pos], vec, atol=1e-6)
+
+    def remove(self, bookmark_id):
+        """Drop a bookmark from the index; the last row is moved into its slot."""
+        with self._lock:
+            pos = self._positions.pop(bookmark_id, None)
+            if pos is None:
+                return False
+            last = self._size - 1
+            if pos != last:
+                moved_id = int(self._ids[last])
+                self._matrix[pos] = self._matrix[last]
+                self._ids[pos] = moved_id
+                self._positions[moved_id] = pos
+            self._ids[last] = -1
+            self._size = last
+            self.generation += 1
+            return True
+
+    def search(self, query_vector, k, allowed=None):
+        """
+        Return up to `k` (bookmark_id, cosine similarity) pairs, most similar
+        first. `allowed` is a FilterIndex bitmap; only its bookmarks are scored.
+        """
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            query = self._normalize(query_vector)
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Query has dimension {query.shape[0]}, index expects {self.dim}")
+            ids = self._ids[:n]
+            if allowed is None:
+                scores = self._matrix[:n] @ query
+            else:
+                rows = allowed_rows(allowed, ids)
+                scores = score_rows(self._matrix[:n], rows, query)
+                ids = ids[rows]
+                n = rows.shape[0]
+            if k < n:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(n)
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(ids[i]), float(scores[i])) for i in top]
+
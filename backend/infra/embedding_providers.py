@@ -0,0 +1,198 @@
+"""
+Embedding backends behind one interface: `embed_many(texts)` returns one
+vector per text, in order, and `model` names the vector space so stored
+embeddings from different backends are never mixed.
+
+    EMBEDDING_PROVIDER=openai   remote, EMBEDDING_MODEL (default text-embedding-ada-002), needs API_KEY
+    EMBEDDING_PROVIDER=local    feature-hashing projection on the CPU, no network, EMBEDDING_DIM (default 384)
+    EMBEDDING_PROVIDER=fake     deterministic pseudo-random vectors for tests and benchmarks,
+                                optionally delayed by EMBEDDING_FAKE_LATENCY seconds per call
+
+Each provider also has `embed_many_async` for the ASGI app. After an
+embedding migration has switched models, `provider_for_model` rebuilds the
+provider from the model name alone.
+"""
+from collections import Counter
+import asyncio
+import hashlib
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_OPENAI_MODEL = "text-embedding-ada-002"
+
+
+def content_hash(model, text):
+    """Key for a stored vector: the model plus the text with whitespace collapsed."""
+    normalized = " ".join((text or "").split())
+    return hashlib.sha256(f"{model}\n{normalized}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingProvider:
+    model = None
+
+    def embed_many(self, texts, timeout=None):
+        raise NotImplementedError
+
+    def embed(self, text, timeout=None):
+        return self.embed_many([text], timeout=timeout)[0]
+
+    async def embed_many_async(self, texts, timeout=None):
+        """Awaitable embed_many; providers without a native async client run it on a thread."""
+        return await asyncio.to_thread(self.embed_many, list(texts), timeout)
+
+    async def embed_async(self, text, timeout=None):
+        return (await self.embed_many_async([text], timeout=timeout))[0]
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIEmbeddings(EmbeddingProvider):
+    """
+    OpenAI embeddings endpoint; one request per embed_many call. The async
+    client is created on first use and shares one pooled HTTP client
+    (OPENAI_MAX_CONNECTIONS) across every in-flight request in the process.
+    """
+
+    def __init__(self, client=None, model=None, api_key=None, async_client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=api_key)
+        self.client = client
+        self.model = model or DEFAULT_OPENAI_MODEL
+        self._api_key = api_key
+        self._async_client = async_client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            connections = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 256))
+            self._async_client = AsyncOpenAI(api_key=self._api_key, http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections // 4),
+            ))
+        return self._async_client
+
+    @staticmethod
+    def _vectors(response):
+        data = sorted(response.data, key=lambda item: getattr(item, 'index', 0))
+        return [item.embedding for item in data]
+
+    def embed_many(self, texts, timeout=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        kwargs = {'timeout': timeout} if timeout else {}
+        return self._vectors(self.client.embeddings.create(model=self.model, input=texts, **kwargs))
+
+    async def embed_many_async(self, texts, timeout=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        kwargs = {'timeout': timeout} if timeout else {}
+        return self._vectors(await self.async_client.embeddings.create(model=self.model, input=texts, **kwargs))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """
+    Signed feature hashing of word unigrams, word bigrams and character
+    trigrams into `dim` buckets, with sublinear term weights. Texts sharing
+    words and word pieces land close together; it needs no model files and
+    embeds thousands of texts per second on one core.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.model = f"local-hashing-{dim}"
+
+    def _features(self, text):
+        words = _WORD.findall(text.casefold())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.update(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed_many(self, texts, timeout=None):
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text or "")
+            if not features:
+                continue
+            # crc32 rather than hash(): buckets must not change between processes.
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features), dtype=np.uint32, count=len(features))
+            weights = 1.0 + np.log(np.fromiter(features.values(), dtype=np.float32, count=len(features)))
+            weights[hashes < 0x80000000] *= -1
+            matrix[row] = np.bincount(hashes % self.dim, weights=weights, minlength=self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return (matrix / norms).tolist()
+
+
+class FakeEmbeddings(EmbeddingProvider):
+    """
+    Unit vectors seeded by the text's sha256: equal texts embed equally,
+    nothing else is similar. `latency` seconds per call stands in for a
+    remote provider's round trip in load tests.
+    """
+
+    def __init__(self, dim=8, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.model = f"fake-{dim}"
+
+    def vector(self, text):
+        seed = int(hashlib.sha256((text or "").encode('utf-8')).hexdigest()[:8], 16)
+        vec = np.random.default_rng(seed).normal(size=self.dim)
+        return (vec / np.linalg.norm(vec)).tolist()
+
+    def embed_many(self, texts, timeout=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.vector(text) for text in texts]
+
+    async def embed_many_async(self, texts, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self.vector(text) for text in texts]
+
+
+def provider_from_env():
+    kind = os.environ.get('EMBEDDING_PROVIDER', 'openai')
+    if kind == 'openai':
+        return OpenAIEmbeddings(model=os.environ.get('EMBEDDING_MODEL'), api_key=os.environ.get('API_KEY'))
+    if kind == 'local':
+        return HashingEmbeddings(dim=int(os.environ.get('EMBEDDING_DIM', 384)))
+    if kind == 'fake':
+        return FakeEmbeddings(dim=int(os.environ.get('EMBEDDING_DIM', 8)),
+                              latency=float(os.environ.get('EMBEDDING_FAKE_LATENCY', 0)))
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER {kind!r}; expected 'openai', 'local' or 'fake'")
+
+
+_MODEL_DIM = re.compile(r"(local-hashing|fake)-(\d+)")
+
+
+def provider_for_model(model):
+    """The provider whose vectors are named `model`: local-hashing-<dim>, fake-<dim>, or else an OpenAI model."""
+    match = _MODEL_DIM.fullmatch(model)
+    if match is None:
+        return OpenAIEmbeddings(model=model, api_key=os.environ.get('API_KEY'))
+    kind, dim = match.group(1), int(match.group(2))
+    if kind == 'local-hashing':
+        return HashingEmbeddings(dim=dim)
+    return FakeEmbeddings(dim=dim, latency=float(os.environ.get('EMBEDDING_FAKE_LATENCY', 0)))
@@ -0,0 +1,237 @@
+import threading
+
+import numpy as np
+
+SEARCH_FILTERS = ('collection_id', 'tag_id', 'favorite', 'created_after', 'created_before')
+
+
+class FilterIndex:
+    """
+    The bookmark attributes search can be scoped by, held as arrays indexed
+    by bookmark id: present, collection, favorite and created_at columns,
+    plus a sorted id array per tag. `mask(...)` ANDs them into one boolean
+    bitmap over the id space, which the vector and lexical indexes apply
+    while scoring, so a filtered search only scores the bookmarks it can
+    return.
+
+    `stamp` is the (epoch, version) of the shared 'memberships' counter the
+    contents reflect. Writes in this process are applied in place via
+    apply(); a write by another process leaves the stamp behind the counter,
+    and the owner refreshes the bookmarks it changed, or reloads.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._reset(0)
+        self.loaded = False
+        self.stamp = None
+        self.generation = 0
+
+    def _reset(self, capacity):
+        self._present = np.zeros(capacity, dtype=bool)
+        self._collection = np.full(capacity, -1, dtype=np.int64)
+        self._favorite = np.zeros(capacity, dtype=bool)
+        self._created = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[us]')
+        self._tags = {}
+
+    def __len__(self):
+        return int(self._present.sum())
+
+    def _ensure_capacity(self, max_id):
+        capacity = self._present.shape[0]
+        if max_id < capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity <= max_id:
+            new_capacity *= 2
+        grow = new_capacity - capacity
+        self._present = np.concatenate([self._present, np.zeros(grow, dtype=bool)])
+        self._collection = np.concatenate([self._collection, np.full(grow, -1, dtype=np.int64)])
+        self._favorite = np.concatenate([self._favorite, np.zeros(grow, dtype=bool)])
+        self._created = np.concatenate([self._created, np.full(grow, np.datetime64('NaT'), dtype='datetime64[us]')])
+
+    def load(self, rows, tag_pairs, stamp=None):
+        """Replace the contents with (id, collection_id, is_favorite, created_at) rows and (bookmark_id, tag_id) pairs."""
+        ids, collections, favorites, created = [], [], [], []
+        for bookmark_id, collection_id, is_favorite, created_at in rows:
+            ids.append(bookmark_id)
+            collections.append(-1 if collection_id is None else collection_id)
+            favorites.append(bool(is_favorite))
+            created.append(created_at)
+        pairs = np.array([tuple(pair) for pair in tag_pairs], dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[np.lexsort((pairs[:, 0], pairs[:, 1]))]
+        tag_ids, starts = np.unique(pairs[:, 1], return_index=True)
+        ends = np.append(starts[1:], pairs.shape[0])
+        with self._lock:
+            self._reset(0)
+            if ids:
+                ids = np.asarray(ids, dtype=np.int64)
+                self._ensure_capacity(int(ids.max()))
+                self._present[ids] = True
+                self._collection[ids] = collections
+                self._favorite[ids] = favorites
+                self._created[ids] = np.array(created, dtype='datetime64[us]')
+            self._tags = {int(tag_id): pairs[start:end, 0] for tag_id, start, end in zip(tag_ids, starts, ends)}
+            self.loaded = True
+            self.stamp = stamp
+            self.generation += 1
+
+    def apply(self, stamp, change):
+        """
+        Run `change(self)` for a write committed in this process, whose bump
+        took the memberships counter to `stamp`. The stamp only advances if it
+        was one behind, i.e. no other write came in between.
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            change(self)
+            epoch, version = stamp
+            if self.stamp == (epoch, version - 1):
+                self.stamp = stamp
+            self.generation += 1
+
+    def refresh(self, stamp, ids, rows, tag_pairs):
+        """
+        Make the bookmarks `ids` match the database, given the (id,
+        collection_id, is_favorite, created_at) rows of those that still exist
+        and their (bookmark_id, tag_id) pairs, and move the stamp to `stamp`.
+        """
+        with self._lock:
+            ids = self._known(ids)
+            self._present[ids] = False
+            for tag_id, members in self._tags.items():
+                keep = ~np.isin(members, ids)
+                if not keep.all():
+                    self._tags[tag_id] = members[keep]
+            for row in rows:
+                self.upsert(*row)
+            self.add_tags(tag_pairs)
+            self.stamp = stamp
+            self.generation += 1
+
+    # -- changes; call through apply() -----------------------------------------
+
+    def upsert(self, bookmark_id, collection_id, is_favorite, created_at):
+        self._ensure_capacity(bookmark_id)
+        self._present[bookmark_id] = True
+        self._collection[bookmark_id] = -1 if collection_id is None else collection_id
+        self._favorite[bookmark_id] = bool(is_favorite)
+        self._created[bookmark_id] = np.datetime64(created_at, 'us') if created_at else np.datetime64('NaT')
+
+    def set_favorite(self, ids, is_favorite):
+        ids = self._known(ids)
+        self._favorite[ids] = is_favorite
+
+    def move(self, ids, collection_id):
+        ids = self._known(ids)
+        self._collection[ids] = collection_id
+
+    def remove(self, ids):
+        self._present[self._known(ids)] = False
+
+    def add_tags(self, pairs):
+        for tag_id, ids in self._by_tag(pairs).items():
+            self._tags[tag_id] = np.union1d(self._tags.get(tag_id, np.empty(0, dtype=np.int64)), ids)
+
+    def remove_tags(self, pairs):
+        for tag_id, ids in self._by_tag(pairs).items():
+            if tag_id in self._tags:
+                self._tags[tag_id] = np.setdiff1d(self._tags[tag_id], ids, assume_unique=True)
+
+    def _known(self, ids):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        return ids[ids < self._present.shape[0]]
+
+    @staticmethod
+    def _by_tag(pairs):
+        grouped = {}
+        for bookmark_id, tag_id in pairs:
+            grouped.setdefault(tag_id, set()).add(bookmark_id)
+        return {tag_id: np.fromiter(ids, dtype=np.int64, count=len(ids)) for tag_id, ids in grouped.items()}
+
+    # -- reads -------------------------------------------------------------------
+
+    def mask(self, collection_id=None, tag_id=None, favorite=None, created_after=None, created_before=None):
+        """Bitmap over bookmark ids of the bookmarks matching every given filter; None when no filter is given."""
+        if collection_id is None and tag_id is None and favorite is None and created_after is None and created_before is None:
+            return None
+        with self._lock:
+            allowed = self._present.copy()
+            if tag_id is not None:
+                tagged = np.zeros_like(allowed)
+                members = self._tags.get(tag_id, np.empty(0, dtype=np.int64))
+                tagged[members[members < tagged.shape[0]]] = True
+                allowed &= tagged
+            if collection_id is not None:
+                allowed &= self._collection == collection_id
+            if favorite is not None:
+                allowed &= self._favorite == favorite
+            if created_after is not None:
+                allowed &= self._created >= np.datetime64(created_after, 'us')
+            if created_before is not None:
+                allowed &= self._created < np.datetime64(created_before, 'us')
+        return allowed
+
+
+def allowed_rows(allowed, ids):
+    """Positions in the id column `ids` whose bookmark is set in the `allowed` bitmap; tombstones (-1) never are."""
+    inside = (ids >= 0) & (ids < allowed.shape[0])
+    hits = np.zeros(ids.shape[0], dtype=bool)
+    hits[inside] = allowed[ids[inside]]
+    return np.flatnonzero(hits)
+
+
+def score_rows(matrix, rows, query):
+    """
+    Scores of `matrix[rows]`. Copying the rows out costs about three times
+    as much per row as scoring in place, so past a quarter of the matrix a
+    full scan is cheaper.
+    """
+    if rows.shape[0] * 4 > matrix.shape[0]:
+        return (matrix @ query)[rows]
+    return matrix[rows] @ query
+
+
+class FilterChanges:
+    """
+    Records the FilterIndex changes a write makes, so they can be applied
+    to this process's index and the bookmarks they touch logged for others.
+    """
+
+    def __init__(self):
+        self._calls = []
+
+    def upsert(self, bookmark_id, collection_id, is_favorite, created_at):
+        self._calls.append(('upsert', (bookmark_id, collection_id, is_favorite, created_at)))
+
+    def set_favorite(self, ids, is_favorite):
+        self._calls.append(('set_favorite', (list(ids), is_favorite)))
+
+    def move(self, ids, collection_id):
+        self._calls.append(('move', (list(ids), collection_id)))
+
+    def remove(self, ids):
+        self._calls.append(('remove', (list(ids),)))
+
+    def add_tags(self, pairs):
+        self._calls.append(('add_tags', ([tuple(pair) for pair in pairs],)))
+
+    def remove_tags(self, pairs):
+        self._calls.append(('remove_tags', ([tuple(pair) for pair in pairs],)))
+
+    def bookmark_ids(self):
+        ids = set()
+        for name, args in self._calls:
+            if name == 'upsert':
+                ids.add(args[0])
+            elif name in ('add_tags', 'remove_tags'):
+                ids.update(bookmark_id for bookmark_id, _ in args[0])
+            else:
+                ids.update(args[0])
+        return sorted(ids)
+
+    def replay(self, filters):
+        for name, args in self._calls:
+            getattr(filters, name)(*args)
@@ -0,0 +1,28 @@
+"""
+Liveness pings for long streamed responses. gunicorn's sync worker only
+tells the arbiter it is alive between requests, so a response that streams
+for longer than `timeout` gets the worker killed mid-body. gunicorn.conf.py
+registers the worker's `notify` here, and long streams call beat() as they
+go. Outside gunicorn (or under workers that ping on their own) it is a no-op.
+"""
+import time
+
+_notify = None
+_last = 0.0
+INTERVAL = 5.0
+
+
+def register(notify):
+    global _notify
+    _notify = notify
+
+
+def beat():
+    """Tell the arbiter this worker is alive, at most once every INTERVAL seconds."""
+    global _last
+    if _notify is None:
+        return
+    now = time.monotonic()
+    if now - _last >= INTERVAL:
+        _last = now
+        _notify()
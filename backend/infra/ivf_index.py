@@ -0,0 +1,414 @@
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from backend.infra.filter_index import allowed_rows, score_rows
+
+log = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """
+    Inverted-file vector index. Embeddings are partitioned by spherical k-means
+    into `nlist` lists; a search scores the query against the centroids and
+    then only against the vectors of the `nprobe` closest lists.
+
+    Until it has been trained (rebuild) the index is one list scanned exactly,
+    so small libraries get exact results. Inserts and deletes are applied to
+    the nearest list in place; once the index has grown by `rebuild_growth`
+    since the last training, `needs_rebuild()` asks for a new partitioning.
+    A rebuild trains on a snapshot in a background thread and replays writes
+    made meanwhile before swapping the new lists in.
+    """
+
+    def __init__(self, nlist=None, nprobe=None, min_train_size=None, rebuild_growth=None,
+                 kmeans_iterations=8, train_per_list=32, initial_capacity=64, seed=0):
+        self.nlist = nlist if nlist is not None else int(os.environ.get('IVF_NLIST', 0))
+        self.nprobe = nprobe or int(os.environ.get('IVF_NPROBE', 16))
+        self.min_train_size = min_train_size if min_train_size is not None else int(os.environ.get('IVF_MIN_TRAIN_SIZE', 20000))
+        self.rebuild_growth = rebuild_growth or float(os.environ.get('IVF_REBUILD_GROWTH', 2.0))
+        self.kmeans_iterations = kmeans_iterations
+        self.train_per_list = train_per_list
+        self._initial_capacity = initial_capacity
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        # Held for a whole rebuild so rebuilds and load()/restore() never interleave.
+        self._rebuild_lock = threading.Lock()
+        self._journal = None
+        self._rebuild_thread = None
+        self._reset(None, None)
+        self.loaded = False
+        self.generation = 0
+
+    def _reset(self, dim, centroids):
+        self.dim = dim
+        self._centroids = centroids
+        n_lists = 1 if centroids is None else centroids.shape[0]
+        self._vectors = [None] * n_lists
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._sizes = [0] * n_lists
+        self._positions = {}
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, bookmark_id):
+        return bookmark_id in self._positions
+
+    def ids(self):
+        with self._lock:
+            return list(self._positions)
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    @property
+    def rebuilding(self):
+        return self._rebuild_thread is not None and self._rebuild_thread.is_alive()
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    @staticmethod
+    def _normalize_rows(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    # -- list storage -------------------------------------------------------
+
+    def _ensure_capacity(self, list_no, needed):
+        vectors = self._vectors[list_no]
+        capacity = 0 if vectors is None else vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        size = self._sizes[list_no]
+        if size:
+            grown[:size] = vectors[:size]
+            ids[:size] = self._ids[list_no][:size]
+        self._vectors[list_no] = grown
+        self._ids[list_no] = ids
+
+    def _append(self, list_no, bookmark_id, vec):
+        pos = self._sizes[list_no]
+        self._ensure_capacity(list_no, pos + 1)
+        self._vectors[list_no][pos] = vec
+        self._ids[list_no][pos] = bookmark_id
+        self._sizes[list_no] = pos + 1
+        self._positions[bookmark_id] = (list_no, pos)
+
+    def _delete(self, bookmark_id):
+        list_no, pos = self._positions.pop(bookmark_id)
+        last = self._sizes[list_no] - 1
+        if pos != last:
+            moved_id = int(self._ids[list_no][last])
+            self._vectors[list_no][pos] = self._vectors[list_no][last]
+            self._ids[list_no][pos] = moved_id
+            self._positions[moved_id] = (list_no, pos)
+        self._ids[list_no][last] = -1
+        self._sizes[list_no] = last
+
+    def _assign(self, matrix, chunk=16384):
+        """Nearest centroid for every row of `matrix`."""
+        if self._centroids is None:
+            return np.zeros(matrix.shape[0], dtype=np.int64)
+        return _nearest(matrix, self._centroids, chunk)
+
+    def _fill(self, ids, matrix):
+        """Bulk-load rows into the (empty) lists, grouped by nearest centroid."""
+        assignment = self._assign(matrix)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=len(self._sizes))
+        start = 0
+        for list_no, count in enumerate(counts):
+            if not count:
+                continue
+            rows = order[start:start + count]
+            start += count
+            self._ensure_capacity(list_no, int(count))
+            self._vectors[list_no][:count] = matrix[rows]
+            self._ids[list_no][:count] = ids[rows]
+            self._sizes[list_no] = int(count)
+            self._positions.update((int(bookmark_id), (list_no, pos)) for pos, bookmark_id in enumerate(ids[rows]))
+
+    def _snapshot(self):
+        ids = np.concatenate([self._ids[i][:size] for i, size in enumerate(self._sizes)])
+        parts = [self._vectors[i][:size] for i, size in enumerate(self._sizes) if size]
+        matrix = np.vstack(parts) if parts else np.empty((0, self.dim or 0), dtype=np.float32)
+        return ids, matrix
+
+    # -- EmbeddingIndex interface ------------------------------------------
+
+    def load(self, items):
+        """Replace the contents with (bookmark_id, vector) pairs, untrained; call rebuild() to partition."""
+        ids = []
+        rows = []
+        dim = None
+        for bookmark_id, vector in items:
+            if vector is None:
+                continue
+            vec = self._normalize(vector)
+            if dim is None:
+                dim = vec.shape[0]
+            elif vec.shape[0] != dim:
+                continue
+            ids.append(bookmark_id)
+            rows.append(vec)
+        with self._rebuild_lock, self._lock:
+            self._reset(dim, None)
+            if rows:
+                self._fill(np.asarray(ids, dtype=np.int64), np.vstack(rows))
+            self.loaded = True
+            self.generation += 1
+
+    def upsert(self, bookmark_id, vector):
+        """Insert or replace the vector for one bookmark, in the list of its nearest centroid."""
+        vec = self._normalize(vector)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+            if vec.shape[0] != self.dim:
+                raise ValueError(f"Embedding has dimension {vec.shape[0]}, index expects {self.dim}")
+            list_no = int(self._assign(vec[None, :])[0])
+            current = self._positions.get(bookmark_id)
+            if current is not None and current[0] == list_no:
+                self._vectors[list_no][current[1]] = vec
+            else:
+                if current is not None:
+                    self._delete(bookmark_id)
+                self._append(list_no, bookmark_id, vec)
+            if self._journal is not None:
+                self._journal.append((bookmark_id, vec))
+            self.generation += 1
+
+    def contains_vector(self, bookmark_id, vector):
+        """True if the bookmark is indexed with (a scaled copy of) this vector."""
+        with self._lock:
+            current = self._positions.get(bookmark_id)
+            if current is None:
+                return False
+            vec = self._normalize(vector)
+            list_no, pos = current
+            return vec.shape[0] == self.dim and np.allclose(self._vectors[list_no][pos], vec, atol=1e-6)
+
+    def remove(self, bookmark_id):
+        with self._lock:
+            if bookmark_id not in self._positions:
+                return False
+            self._delete(bookmark_id)
+            if self._journal is not None:
+                self._journal.append((bookmark_id, None))
+            self.generation += 1
+            return True
+
+    def search(self, query_vector, k, nprobe=None, allowed=None):
+        """
+        Return up to `k` (bookmark_id, cosine similarity) pairs, most similar
+        first, scanning the `nprobe` lists whose centroids are closest to the query.
+
+        With an `allowed` bitmap (see FilterIndex) only its bookmarks are
+        scored. A filter selective enough that the probed lists would hold
+        fewer of its bookmarks than `k` on average scans every list instead:
+        it costs no more than an unfiltered probe and loses no recall.
+        """
+        with self._lock:
+            if not self._positions or k <= 0:
+                return []
+            query = self._normalize(query_vector)
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Query has dimension {query.shape[0]}, index expects {self.dim}")
+            n_lists = len(self._sizes)
+            nprobe = min(nprobe or self.nprobe, n_lists)
+            if self._centroids is None or (allowed is not None and int(allowed.sum()) * nprobe < k * n_lists):
+                probes = range(n_lists)
+            else:
+                centroid_scores = self._centroids @ query
+                probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            scores = []
+            ids = []
+            for list_no in probes:
+                size = self._sizes[list_no]
+                if not size:
+                    continue
+                list_ids = self._ids[list_no][:size]
+                if allowed is None:
+                    scores.append(self._vectors[list_no][:size] @ query)
+                    ids.append(list_ids)
+                else:
+                    rows = allowed_rows(allowed, list_ids)
+                    scores.append(score_rows(self._vectors[list_no][:size], rows, query))
+                    ids.append(list_ids[rows])
+            if not scores:
+                return []
+            scores = np.concatenate(scores)
+            ids = np.concatenate(ids)
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    # -- training ------------------------------------------------------------
+
+    def needs_rebuild(self):
+        size = len(self._positions)
+        if self.rebuilding or size < self.min_train_size:
+            return False
+        return not self.trained or size >= self.trained_size * self.rebuild_growth
+
+    def rebuild(self, nlist=None):
+        """
+        Retrain the centroids on the current vectors and repartition. Writes
+        made while training runs are journaled and replayed before the swap.
+        """
+        with self._rebuild_lock:
+            return self._rebuild(nlist)
+
+    def _rebuild(self, nlist):
+        with self._lock:
+            ids, matrix = self._snapshot()
+            self._journal = []
+            dim = self.dim
+        try:
+            n = ids.shape[0]
+            nlist = nlist or self.nlist or max(1, int(round(math.sqrt(n))))
+            nlist = max(1, min(nlist, n))
+            centroids = self._train(matrix, nlist) if n else None
+            rebuilt = IVFIndex(initial_capacity=self._initial_capacity)
+            rebuilt._reset(dim, centroids)
+            if n:
+                rebuilt._fill(ids, matrix)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._centroids = rebuilt._centroids
+            self._vectors = rebuilt._vectors
+            self._ids = rebuilt._ids
+            self._sizes = rebuilt._sizes
+            self._positions = rebuilt._positions
+            for bookmark_id, vec in journal:
+                if bookmark_id in self._positions:
+                    self._delete(bookmark_id)
+                if vec is not None:
+                    self._append(int(self._assign(vec[None, :])[0]), bookmark_id, vec)
+            self.trained_size = n
+            self.loaded = True
+            self.generation += 1
+        return nlist
+
+    def rebuild_async(self, on_done=None):
+        """Run rebuild() in a daemon thread; `on_done(index)` is called after the swap."""
+        with self._lock:
+            if self.rebuilding:
+                return False
+
+            def run():
+                try:
+                    self.rebuild()
+                    if on_done is not None:
+                        on_done(self)
+                except Exception:
+                    log.exception("IVF index rebuild failed")
+
+            self._rebuild_thread = threading.Thread(target=run, name='ivf-rebuild', daemon=True)
+            self._rebuild_thread.start()
+            return True
+
+    def wait_for_rebuild(self, timeout=None):
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _train(self, matrix, nlist):
+        """Spherical k-means over a sample of `train_per_list` rows per centroid."""
+        n = matrix.shape[0]
+        sample_size = min(n, nlist * self.train_per_list)
+        sample = matrix[self._rng.choice(n, sample_size, replace=False)] if sample_size < n else matrix
+        centroids = sample[self._rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignment = _nearest(sample, centroids)
+            counts = np.bincount(assignment, minlength=nlist)
+            order = np.argsort(assignment, kind='stable')
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+            centroids[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = np.flatnonzero(counts == 0)
+            if empty.size:
+                # Reseed empty lists with random sample rows.
+                centroids[empty] = sample[self._rng.choice(sample.shape[0], empty.size, replace=False)]
+            centroids = self._normalize_rows(centroids)
+        return centroids.astype(np.float32)
+
+    # -- persistence ---------------------------------------------------------
+
+    def save(self, path, meta=None):
+        """Write the index to `path` (atomically, via a temporary file) with a JSON `meta` dict."""
+        with self._lock:
+            ids, matrix = self._snapshot()
+            offsets = np.concatenate(([0], np.cumsum(self._sizes))).astype(np.int64)
+            centroids = self._centroids if self._centroids is not None else np.empty((0, self.dim or 0), dtype=np.float32)
+            header = {
+                'dim': self.dim,
+                'trained_size': self.trained_size,
+                'meta': meta or {},
+            }
+        # A file of its own, so processes saving at the same time never write into each other's.
+        fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp', dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, ids=ids, vectors=matrix, offsets=offsets, centroids=centroids, header=np.array(json.dumps(header)))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def restore(self, path):
+        """Replace the contents with an index written by save(); returns its meta dict."""
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            ids = data['ids']
+            matrix = data['vectors']
+            offsets = data['offsets']
+            centroids = data['centroids']
+        with self._rebuild_lock, self._lock:
+            self._reset(header['dim'], centroids if centroids.shape[0] else None)
+            for list_no in range(len(offsets) - 1):
+                start, end = int(offsets[list_no]), int(offsets[list_no + 1])
+                if end > start:
+                    self._ensure_capacity(list_no, end - start)
+                    self._vectors[list_no][:end - start] = matrix[start:end]
+                    self._ids[list_no][:end - start] = ids[start:end]
+                    self._sizes[list_no] = end - start
+                    self._positions.update((int(bookmark_id), (list_no, pos)) for pos, bookmark_id in enumerate(ids[start:end]))
+            self.trained_size = header['trained_size']
+            self.loaded = True
+            self.generation += 1
+        return header['meta']
+
+
+def _nearest(matrix, centroids, chunk=16384):
+    assignment = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], chunk):
+        assignment[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+    return assignment
@@ -0,0 +1,147 @@
+from collections import Counter
+import heapq
+import math
+import re
+import threading
+from urllib.parse import urlsplit
+
+_WORD = re.compile(r"[^\W_]+")
+_DOMAIN = re.compile(r"(?:[^\W_]+(?:-[^\W_]+)*\.)+[^\W_]{2,}")
+
+
+def tokenize(text):
+    """Lower-cased word tokens; dotted host names also count as one token, e.g. 'github.com'."""
+    if not text:
+        return []
+    text = text.casefold()
+    return _WORD.findall(text) + _DOMAIN.findall(text)
+
+
+def url_tokens(url):
+    """Host (with and without `www.`), its labels, and the words of the path and query."""
+    if not url:
+        return []
+    parts = urlsplit(url if '//' in url else f"//{url}")
+    host = (parts.hostname or '').casefold()
+    tokens = []
+    if host:
+        bare = host[4:] if host.startswith('www.') else host
+        tokens += [host, bare] if bare != host else [host]
+        tokens += [label for label in bare.split('.') if label]
+    return tokens + _WORD.findall(f"{parts.path} {parts.query}".casefold())
+
+
+def document_tokens(title, description, url):
+    return tokenize(title) + tokenize(description) + url_tokens(url)
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over bookmark title, description and URL
+    tokens. Postings map term -> {bookmark_id: term frequency}; a document's
+    terms are kept so it can be removed or replaced in place.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0
+        self.loaded = False
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, bookmark_id):
+        return bookmark_id in self._doc_lengths
+
+    def ids(self):
+        with self._lock:
+            return list(self._doc_lengths)
+
+    def _add(self, bookmark_id, tokens):
+        terms = Counter(tokens)
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[bookmark_id] = tf
+        self._doc_terms[bookmark_id] = tuple(terms)
+        self._doc_lengths[bookmark_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def _discard(self, bookmark_id):
+        terms = self._doc_terms.pop(bookmark_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings[term]
+            del postings[bookmark_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(bookmark_id)
+        return True
+
+    def load(self, docs):
+        """Replace the contents with (bookmark_id, title, description, url) rows."""
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0
+            for bookmark_id, title, description, url in docs:
+                self._add(bookmark_id, document_tokens(title, description, url))
+            self.loaded = True
+            self.generation += 1
+
+    def upsert(self, bookmark_id, title, description, url):
+        tokens = document_tokens(title, description, url)
+        with self._lock:
+            self._discard(bookmark_id)
+            self._add(bookmark_id, tokens)
+            self.generation += 1
+
+    def remove(self, bookmark_id):
+        with self._lock:
+            removed = self._discard(bookmark_id)
+            if removed:
+                self.generation += 1
+            return removed
+
+    def search(self, query, k, allowed=None):
+        """
+        Return up to `k` (bookmark_id, BM25 score) pairs, best first. With an
+        `allowed` bitmap (see FilterIndex) postings of other bookmarks are skipped.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._doc_lengths)
+            if not n or not terms or k <= 0:
+                return []
+            avg_length = self._total_length / n or 1
+            k1, b = self.k1, self.b
+            lengths = self._doc_lengths
+            size = 0 if allowed is None else allowed.shape[0]
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for bookmark_id, tf in postings.items():
+                    if allowed is not None and not (bookmark_id < size and allowed[bookmark_id]):
+                        continue
+                    norm = k1 * (1 - b + b * lengths[bookmark_id] / avg_length)
+                    scores[bookmark_id] = scores.get(bookmark_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, bookmark_id in enumerate(ranking, start=1):
+            scores[bookmark_id] = scores.get(bookmark_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda bookmark_id: -scores[bookmark_id])
@@ -0,0 +1,317 @@
+"""
+In-process metrics rendered in the Prometheus text format, plus per-request
+timing breakdowns for the `Server-Timing` header.
+
+Metrics are process-local: with several gunicorn workers, each one exposes
+its own numbers at /metrics and the scraper sums them per instance.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A gauge whose samples are read from `collect()` at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.collect is not None:
+            samples = self.collect()
+            with self._lock:
+                self._values = {self._key(labels): value for labels, value in samples}
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels):
+        """(count, sum) observed for the labels."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def _samples(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = _format_labels(self.labelnames, key, [('le', _format_number(float(bound)))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time from request start to the last byte of the response.',
+    ('method', 'route', 'status'))
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'SQL statements executed per request.', ('route',), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram(
+    'http_request_db_seconds', 'Total SQL execution time per request.', ('route',))
+DB_QUERY_SECONDS = registry.histogram(
+    'db_query_duration_seconds', 'Execution time of single SQL statements.')
+DB_ACQUIRE_SECONDS = registry.histogram(
+    'db_pool_acquire_seconds', 'Time spent waiting for a pooled connection, including connecting.')
+EMBEDDING_SECONDS = registry.histogram(
+    'embedding_request_duration_seconds', 'Embedding provider call latency.', ('model', 'kind'))
+EMBEDDING_BATCH_SIZE = registry.histogram(
+    'embedding_batch_size', 'Texts per embedding provider call.', ('model', 'kind'), COUNT_BUCKETS)
+SEARCH_SECONDS = registry.histogram(
+    'search_stage_duration_seconds', 'Time spent in each search stage.', ('stage',))
+SERIALIZATION_SECONDS = registry.histogram(
+    'http_request_serialization_seconds', 'Total JSON encoding time per request.', ('route',))
+
+
+# -- per-request timings -----------------------------------------------------
+
+class RequestTimings:
+    """Durations (seconds) and counts accumulated while one request is served."""
+
+    def __init__(self, route):
+        self.route = route
+        self.status = None
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value for the Server-Timing header, in milliseconds."""
+        entries = [f"app;dur={self.elapsed() * 1000:.2f}"]
+        for name, seconds in self.durations.items():
+            count = self.counts[name]
+            desc = f';desc="{count} queries"' if name == 'db' else ''
+            entries.append(f"{name};dur={seconds * 1000:.2f}{desc}")
+        return ', '.join(entries)
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+def begin_request(route):
+    timings = RequestTimings(route)
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Torn down from a different context, e.g. after a streamed body.
+        _current.set(None)
+
+
+def current():
+    return _current.get()
+
+
+def current_route():
+    timings = _current.get()
+    return timings.route if timings is not None else 'none'
+
+
+@contextmanager
+def timed(name, histogram=None, **labels):
+    """Time the block into the current request's `name` entry and, if given, `histogram`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(seconds, **labels)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, seconds)
+
+
+# -- SQLAlchemy ----------------------------------------------------------------
+
+def _pool_samples():
+    samples = []
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        for state, attr in (('size', 'size'), ('checked_out', 'checkedout'), ('checked_in', 'checkedin'),
+                            ('overflow', 'overflow')):
+            reader = getattr(pool, attr, None)
+            if callable(reader):
+                samples.append(({'engine': name, 'state': state}, reader()))
+    return samples
+
+
+_instrumented = weakref.WeakSet()
+_engines = weakref.WeakValueDictionary()
+
+
+def instrument_engine(engine, name='sync'):
+    """Count and time every statement on `engine`, time pool checkouts and export pool state as `name`."""
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['query_started'].pop()
+        DB_QUERY_SECONDS.observe(seconds)
+        timings = _current.get()
+        if timings is not None:
+            timings.add('db', seconds)
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    _engines[name] = engine
+
+
+registry.gauge('db_pool_connections', 'Connection pool state (size, checked_out, checked_in, overflow) per engine.',
+               ('engine', 'state'), collect=_pool_samples)
@@ -0,0 +1,323 @@
+from contextlib import contextmanager
+import fcntl
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend.infra.filter_index import allowed_rows, score_rows
+
+MAGIC = b'BMEMB001'
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('dim', '<u4'),
+    ('superseded', '<u4'),
+    ('capacity', '<u8'),
+    ('count', '<u8'),
+    ('live', '<u8'),
+    ('generation', '<u8'),
+    ('epoch', '<u8'),
+    ('updated_at', '<f8'),
+    ('model', 'S64'),
+])
+HEADER_BYTES = 256
+TOMBSTONE = -1
+
+
+def _layout(capacity, dim):
+    ids_offset = HEADER_BYTES
+    vectors_offset = ids_offset + capacity * 8
+    vectors_offset += -vectors_offset % 64
+    return ids_offset, vectors_offset, vectors_offset + capacity * dim * 4
+
+
+def _open_views(path, mode):
+    mm = np.memmap(path, dtype=np.uint8, mode=mode)
+    header = mm[:HEADER.itemsize].view(HEADER)
+    if header['magic'][0] != MAGIC:
+        raise ValueError(f"{path} is not an embedding store")
+    capacity = int(header['capacity'][0])
+    dim = int(header['dim'][0])
+    ids_offset, vectors_offset, end = _layout(capacity, dim)
+    ids = mm[ids_offset:ids_offset + capacity * 8].view('<i8')
+    vectors = mm[vectors_offset:end].view('<f4').reshape(capacity, dim)
+    return header, ids, vectors
+
+
+class MmapEmbeddingStore:
+    """
+    Embedding matrix and id column in one memory-mapped file shared by every
+    process on the host, so the page cache holds a single copy and opening it
+    costs milliseconds.
+
+    Rows are appended; deletes overwrite the row id with a tombstone and edits
+    overwrite the vector in place. Every write bumps `generation` in the file
+    header, so readers see appends and tombstones without reloading. When the
+    file is full or mostly tombstones, a writer copies the live rows into a
+    new file, swaps it in with os.replace and flags the old one `superseded`;
+    readers notice the flag and remap. Writers serialize on a `.lock` file.
+    Implements the EmbeddingIndex interface.
+    """
+
+    shared = True
+
+    def __init__(self, path=None, initial_capacity=1024, compact_ratio=0.25):
+        self.path = path
+        self._initial_capacity = initial_capacity
+        self._compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._header = None
+        self._ids = None
+        self._vectors = None
+        self._writable = None
+        self._positions = {}
+        self._positions_through = 0
+        self._positions_epoch = None
+
+    @property
+    def loaded(self):
+        return self._header is not None
+
+    @property
+    def dim(self):
+        return int(self._header['dim'][0]) if self.loaded else None
+
+    @property
+    def generation(self):
+        return int(self._header['generation'][0]) if self.loaded else 0
+
+    def __len__(self):
+        with self._lock:
+            self._check_remap()
+            return int(self._header['live'][0]) if self.loaded else 0
+
+    def __contains__(self, bookmark_id):
+        with self._lock:
+            self._check_remap()
+            return self.loaded and self._find(self._ids, bookmark_id) is not None
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    # -- mapping -------------------------------------------------------------
+
+    def _map(self):
+        self._header, self._ids, self._vectors = _open_views(self.path, 'r')
+        self._writable = None
+
+    def _check_remap(self):
+        if self._header is not None and self._header['superseded'][0]:
+            self._map()
+
+    def _find(self, ids, bookmark_id):
+        """Row of `bookmark_id`; the id -> row map is extended with rows appended since the last call."""
+        epoch = int(self._header['epoch'][0])
+        if self._positions_epoch != epoch:
+            self._positions = {}
+            self._positions_through = 0
+            self._positions_epoch = epoch
+        count = int(self._header['count'][0])
+        if self._positions_through < count:
+            appended = ids[self._positions_through:count].tolist()
+            self._positions.update(zip(appended, range(self._positions_through, count)))
+            self._positions_through = count
+        pos = self._positions.get(bookmark_id)
+        if pos is not None and ids[pos] == bookmark_id:
+            return pos
+        return None
+
+    @contextmanager
+    def _writing(self):
+        """Hold the cross-process write lock and yield writable (header, ids, vectors) views."""
+        with self._lock, open(f"{self.path}.lock", 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                if self._header is None:
+                    self._map()
+                self._check_remap()
+            if self._header is not None and self._writable is None:
+                self._writable = _open_views(self.path, 'r+')
+            yield self._writable
+
+    def _touch(self, header):
+        header['generation'] += 1
+        header['updated_at'] = time.time()
+
+    def _write_file(self, ids, matrix, dim, capacity, previous=None, model=b''):
+        """Write a fresh store to a temporary file and swap it in; call with the write lock held."""
+        ids_offset, vectors_offset, end = _layout(capacity, dim)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.truncate(end)
+        mm = np.memmap(tmp, dtype=np.uint8, mode='r+')
+        header = mm[:HEADER.itemsize].view(HEADER)
+        n = len(ids)
+        header[0] = (
+            MAGIC, dim, 0, capacity, n, n,
+            (int(previous['generation'][0]) + 1) if previous is not None else 1,
+            (int(previous['epoch'][0]) + 1) if previous is not None else 1,
+            time.time(),
+            previous['model'][0] if previous is not None else model,
+        )
+        if n:
+            mm[ids_offset:ids_offset + capacity * 8].view('<i8')[:n] = ids
+            mm[vectors_offset:end].view('<f4').reshape(capacity, dim)[:n] = matrix
+        mm.flush()
+        del mm
+        os.replace(tmp, self.path)
+        if previous is not None:
+            previous['superseded'] = 1
+        self._map()
+        self._writable = _open_views(self.path, 'r+')
+        return self._writable
+
+    def _compact(self, header, ids, vectors, capacity=None):
+        count = int(header['count'][0])
+        live = ids[:count] >= 0
+        live_ids = ids[:count][live]
+        capacity = capacity or max(self._initial_capacity, 2 * len(live_ids))
+        return self._write_file(live_ids, vectors[:count][live], int(header['dim'][0]), capacity, previous=header)
+
+    # -- EmbeddingIndex interface --------------------------------------------
+
+    def restore(self, path):
+        """Map an existing store file; returns {'model', 'synced_through'} from its header."""
+        with self._lock:
+            self.path = path
+            self._map()
+            return {
+                'model': self._header['model'][0].decode(),
+                'synced_through': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self._header['updated_at'][0])),
+            }
+
+    def save(self, path, meta=None):
+        """The store is always on disk; record the embedding model it holds."""
+        with self._writing() as views:
+            if views is None:
+                return
+            header = views[0]
+            header['model'] = (meta or {}).get('model', '').encode()
+            self._touch(header)
+
+    def load(self, items):
+        """Replace the store with (bookmark_id, vector) pairs."""
+        ids = []
+        rows = []
+        dim = None
+        for bookmark_id, vector in items:
+            if vector is None:
+                continue
+            vec = self._normalize(vector)
+            if dim is None:
+                dim = vec.shape[0]
+            elif vec.shape[0] != dim:
+                continue
+            ids.append(bookmark_id)
+            rows.append(vec)
+        matrix = np.vstack(rows) if rows else np.empty((0, dim or 0), dtype=np.float32)
+        with self._writing() as views:
+            previous = views[0] if views else None
+            self._write_file(np.asarray(ids, dtype=np.int64), matrix, dim or 0,
+                             max(self._initial_capacity, 2 * len(ids)), previous=previous)
+
+    def upsert(self, bookmark_id, vector):
+        vec = self._normalize(vector)
+        with self._writing() as views:
+            if views is None or not views[0]['dim'][0]:
+                views = self._write_file(np.empty(0, dtype=np.int64), None, vec.shape[0], self._initial_capacity,
+                                         previous=views[0] if views else None)
+            header, ids, vectors = views
+            dim = int(header['dim'][0])
+            if vec.shape[0] != dim:
+                raise ValueError(f"Embedding has dimension {vec.shape[0]}, index expects {dim}")
+            pos = self._find(ids, bookmark_id)
+            if pos is None:
+                count = int(header['count'][0])
+                if count == int(header['capacity'][0]):
+                    header, ids, vectors = self._compact(header, ids, vectors)
+                    count = int(header['count'][0])
+                vectors[count] = vec
+                ids[count] = bookmark_id
+                header['count'] = count + 1
+                header['live'] += 1
+            else:
+                vectors[pos] = vec
+            self._touch(header)
+
+    def contains_vector(self, bookmark_id, vector):
+        with self._lock:
+            if not self.loaded:
+                return False
+            self._check_remap()
+            pos = self._find(self._ids, bookmark_id)
+            if pos is None:
+                return False
+            vec = self._normalize(vector)
+            return vec.shape[0] == self.dim and np.allclose(self._vectors[pos], vec, atol=1e-6)
+
+    def remove(self, bookmark_id):
+        if not self.loaded:
+            return False
+        with self._writing() as (header, ids, vectors):
+            pos = self._find(ids, bookmark_id)
+            if pos is None:
+                return False
+            ids[pos] = TOMBSTONE
+            header['live'] -= 1
+            self._touch(header)
+            count = int(header['count'][0])
+            if count >= self._initial_capacity and count - int(header['live'][0]) > self._compact_ratio * count:
+                self._compact(header, ids, vectors)
+            return True
+
+    def ids(self):
+        with self._lock:
+            if not self.loaded:
+                return []
+            self._check_remap()
+            count = int(self._header['count'][0])
+            ids = self._ids[:count]
+            return ids[ids >= 0].tolist()
+
+    def search(self, query_vector, k, allowed=None):
+        """
+        Return up to `k` (bookmark_id, cosine similarity) pairs, most similar
+        first. `allowed` is a FilterIndex bitmap; only its bookmarks are scored.
+        """
+        with self._lock:
+            if not self.loaded:
+                return []
+            self._check_remap()
+            header, ids, vectors = self._header, self._ids, self._vectors
+        n = int(header['count'][0])
+        if n == 0 or k <= 0:
+            return []
+        query = self._normalize(query_vector)
+        if query.shape[0] != vectors.shape[1]:
+            raise ValueError(f"Query has dimension {query.shape[0]}, index expects {vectors.shape[1]}")
+        if allowed is None:
+            rows = None
+            scores = vectors[:n] @ query
+            scores[ids[:n] < 0] = -np.inf
+        else:
+            rows = allowed_rows(allowed, ids[:n])
+            scores = score_rows(vectors[:n], rows, query)
+            n = rows.shape[0]
+            if n == 0:
+                return []
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        hits = []
+        for i in top:
+            # Re-read the id: a row tombstoned after scoring is skipped rather than returned as -1.
+            bookmark_id = int(ids[i if rows is None else rows[i]])
+            if bookmark_id >= 0 and scores[i] > -np.inf:
+                hits.append((bookmark_id, float(scores[i])))
+        return hits
@@ -0,0 +1,295 @@
+import functools
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from backend.infra.filter_index import allowed_rows
+
+log = logging.getLogger(__name__)
+
+# float32 bytes converted per step of the approximate scan: small enough to stay in cache.
+SCAN_BYTES = 1 << 20
+# Files on these are pages of RAM, so a scratch file there saves no memory.
+MEMORY_FILESYSTEMS = {'tmpfs', 'ramfs'}
+
+
+def memory_backed(path):
+    """True if `path` is on a RAM filesystem according to /proc/mounts; False where that cannot be told."""
+    path = os.path.realpath(path)
+    best, fstype = '', None
+    try:
+        with open('/proc/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace('\\040', ' ')
+                inside = path == mount or path.startswith(mount.rstrip('/') + '/')
+                if inside and len(mount) >= len(best):
+                    best, fstype = mount, fields[2]
+    except OSError:
+        return False
+    return fstype in MEMORY_FILESYSTEMS
+
+
+@functools.lru_cache(maxsize=None)
+def _scratch_in_memory(directory):
+    """memory_backed(directory), warning once per directory when it is."""
+    if not memory_backed(directory):
+        return False
+    log.warning("EMBEDDING_RESCORE_DIR %s is memory-backed; full-precision vectors for rescoring will stay in RAM",
+                directory)
+    return True
+
+
+def default_scratch_dir():
+    """The temp directory, or /var/tmp when the temp directory is held in RAM (as in many containers)."""
+    for candidate in (tempfile.gettempdir(), '/var/tmp'):
+        if os.path.isdir(candidate) and not memory_backed(candidate):
+            return candidate
+    return tempfile.gettempdir()
+
+
+class QuantizedIndex:
+    """
+    Vector index holding int8 codes in memory: each L2-normalized vector is
+    stored as round(v / scale) with its own float32 scale = max|v| / 127, a
+    quarter of the float32 footprint. A search scores every candidate on the
+    codes, then rescores the best `rescore` of them exactly against
+    full-precision vectors kept in an unlinked memory-mapped scratch file,
+    whose pages the OS reads in only for the rows rescored. That file must
+    be on disk: on tmpfs it is RAM too, which is logged and counted in
+    memory_report. rescore=0 ranks on the codes alone.
+    """
+
+    def __init__(self, rescore=None, directory=None, initial_capacity=1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self.rescore = rescore if rescore is not None else int(os.environ.get('EMBEDDING_RESCORE', 200))
+        self.directory = directory or os.environ.get('EMBEDDING_RESCORE_DIR') or default_scratch_dir()
+        self.scratch_in_memory = bool(self.rescore) and _scratch_in_memory(self.directory)
+        self._codes = None
+        self._scales = np.empty(0, dtype=np.float32)
+        self._full = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self.dim = None
+        self.loaded = False
+        self.generation = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, bookmark_id):
+        return bookmark_id in self._positions
+
+    def ids(self):
+        with self._lock:
+            return list(self._positions)
+
+    @staticmethod
+    def _normalize(vector):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    @staticmethod
+    def quantize(matrix):
+        """(int8 codes, float32 per-row scales) of a 2-D float32 matrix."""
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _scratch(self, capacity):
+        """A float32 (capacity, dim) memmap over a file that is gone once the mapping is."""
+        fd, path = tempfile.mkstemp(prefix='vectors-', suffix='.f32', dir=self.directory)
+        try:
+            os.ftruncate(fd, max(1, capacity * self.dim * 4))
+            return np.memmap(path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        finally:
+            os.close(fd)
+            os.unlink(path)
+
+    def _ensure_capacity(self, needed):
+        capacity = 0 if self._codes is None else self._codes.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        codes = np.zeros((new_capacity, self.dim), dtype=np.int8)
+        scales = np.ones(new_capacity, dtype=np.float32)
+        full = self._scratch(new_capacity)
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        if self._size:
+            codes[:self._size] = self._codes[:self._size]
+            scales[:self._size] = self._scales[:self._size]
+            full[:self._size] = self._full[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._codes, self._scales, self._full, self._ids = codes, scales, full, ids
+
+    def load(self, items):
+        """
+        Replace the index contents with an iterable of (bookmark_id, vector)
+        pairs. Vectors are quantized in blocks as they stream in, so loading
+        never holds a float32 copy of the whole library.
+        """
+        fresh = QuantizedIndex(self.rescore, self.directory, self._initial_capacity)
+        block_ids, block = [], []
+        for bookmark_id, vector in items:
+            if vector is None:
+                continue
+            vec = self._normalize(vector)
+            if fresh.dim is None:
+                fresh.dim = vec.shape[0]
+            elif vec.shape[0] != fresh.dim:
+                continue
+            block_ids.append(bookmark_id)
+            block.append(vec)
+            if len(block) == 4096:
+                fresh._append(block_ids, block)
+                block_ids, block = [], []
+        if block:
+            fresh._append(block_ids, block)
+        with self._lock:
+            self._codes, self._scales, self._full = fresh._codes, fresh._scales, fresh._full
+            self._ids, self._positions, self._size = fresh._ids, fresh._positions, fresh._size
+            self.dim = fresh.dim
+            self.loaded = True
+            self.generation += 1
+
+    def _append(self, ids, vectors):
+        start = self._size
+        stop = start + len(ids)
+        self._ensure_capacity(stop)
+        matrix = np.vstack(vectors)
+        self._codes[start:stop], self._scales[start:stop] = self.quantize(matrix)
+        self._full[start:stop] = matrix
+        self._ids[start:stop] = ids
+        self._positions.update((bookmark_id, pos) for pos, bookmark_id in enumerate(ids, start))
+        self._size = stop
+
+    def upsert(self, bookmark_id, vector):
+        """Insert or replace the vector for one bookmark."""
+        vec = self._normalize(vector)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+            if vec.shape[0] != self.dim:
+                raise ValueError(f"Embedding has dimension {vec.shape[0]}, index expects {self.dim}")
+            pos = self._positions.get(bookmark_id)
+            if pos is None:
+                self._ensure_capacity(self._size + 1)
+                pos = self._size
+                self._ids[pos] = bookmark_id
+                self._positions[bookmark_id] = pos
+                self._size += 1
+            codes, scales = self.quantize(vec[None, :])
+            self._codes[pos], self._scales[pos] = codes[0], scales[0]
+            self._full[pos] = vec
+            self.generation += 1
+
+    def contains_vector(self, bookmark_id, vector):
+        """True if the bookmark is indexed with (a scaled copy of) this vector."""
+        with self._lock:
+            pos = self._positions.get(bookmark_id)
+            if pos is None:
+                return False
+            vec = self._normalize(vector)
+            return vec.shape[0] == self.dim and np.allclose(self._full[pos], vec, atol=1e-6)
+
+    def remove(self, bookmark_id):
+        """Drop a bookmark from the index; the last row is moved into its slot."""
+        with self._lock:
+            pos = self._positions.pop(bookmark_id, None)
+            if pos is None:
+                return False
+            last = self._size - 1
+            if pos != last:
+                moved_id = int(self._ids[last])
+                self._codes[pos] = self._codes[last]
+                self._scales[pos] = self._scales[last]
+                self._full[pos] = self._full[last]
+                self._ids[pos] = moved_id
+                self._positions[moved_id] = pos
+            self._ids[last] = -1
+            self._size = last
+            self.generation += 1
+            return True
+
+    def _approximate(self, rows, query):
+        """Scores of the given rows (all of the first `rows` when an int) from their int8 codes."""
+        count = rows if isinstance(rows, int) else rows.shape[0]
+        step = max(16, SCAN_BYTES // (self.dim * 4))
+        scores = np.empty(count, dtype=np.float32)
+        buffer = np.empty((min(step, count), self.dim), dtype=np.float32)
+        for start in range(0, count, step):
+            stop = min(start + step, count)
+            chunk = self._codes[start:stop] if isinstance(rows, int) else self._codes[rows[start:stop]]
+            np.copyto(buffer[:stop - start], chunk, casting='unsafe')
+            scores[start:stop] = buffer[:stop - start] @ query
+        scale = self._scales[:count] if isinstance(rows, int) else self._scales[rows]
+        return scores * scale
+
+    def search(self, query_vector, k, allowed=None):
+        """
+        Return up to `k` (bookmark_id, cosine similarity) pairs, most similar
+        first. `allowed` is a FilterIndex bitmap; only its bookmarks are scored.
+        """
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            query = self._normalize(query_vector)
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Query has dimension {query.shape[0]}, index expects {self.dim}")
+            rows = np.arange(n) if allowed is None else allowed_rows(allowed, self._ids[:n])
+            if rows.shape[0] == 0:
+                return []
+            scores = self._approximate(n if allowed is None else rows, query)
+            depth = min(max(k, self.rescore), rows.shape[0])
+            if depth < rows.shape[0]:
+                top = np.argpartition(-scores, depth - 1)[:depth]
+            else:
+                top = np.arange(rows.shape[0])
+            candidates = rows[top]
+            if self.rescore:
+                # Sorted positions keep the reads from the scratch file sequential.
+                order = np.argsort(candidates)
+                candidates = candidates[order]
+                scores = self._full[candidates] @ query
+            else:
+                scores = scores[top]
+            best = np.argsort(-scores, kind='stable')[:k]
+            return [(int(self._ids[candidates[i]]), float(scores[i])) for i in best]
+
+    def memory_report(self):
+        """
+        Bytes held in RAM by the codes versus a float32 matrix of the same
+        vectors. The scratch file of full-precision vectors counts as
+        resident when it is on a memory-backed filesystem.
+        """
+        with self._lock:
+            n, dim = self._size, self.dim or 0
+            scratch = 0 if self._full is None else self._full.shape[0] * dim * 4
+        resident = n * dim + n * 4 + n * 8
+        if self.scratch_in_memory:
+            resident += scratch
+        float32 = n * dim * 4 + n * 8
+        return {
+            'vectors': n,
+            'dim': dim,
+            'resident_bytes': resident,
+            'float32_bytes': float32,
+            'saved_bytes': float32 - resident,
+            'ratio': round(float32 / resident, 2) if resident else None,
+            'scratch_bytes': scratch,
+            'scratch_in_memory': self.scratch_in_memory,
+        }
@@ -0,0 +1,50 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Query parameters that only track where a click came from.
+TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'yclid'})
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    A key under which saves of the same page compare equal: scheme dropped
+    (http and https are the same page), host lower-cased without `www.` or a
+    default port, trailing slashes and `utm_*`/click-id parameters removed,
+    the remaining parameters sorted. Fragments are dropped unless they look
+    like an app route (`#/...`, `#!...`). Other schemes (mailto:, file:) are
+    kept as given.
+
+        normalize_url("HTTPS://www.Example.com/a/?utm_source=x&b=2&a=1#top") == "example.com/a?a=1&b=2"
+    """
+    if not url:
+        return ''
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if not parts.netloc and (not scheme or '.' in scheme):
+        # A bare "example.com/page" (urlsplit reads "example.com:8080" as a scheme).
+        parts = urlsplit(f"//{url}")
+        scheme = ''
+    elif scheme not in DEFAULT_PORTS:
+        # mailto:, file:, app links: nothing to normalize.
+        return url
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip('/')
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    normalized = host + path
+    if params:
+        normalized += '?' + urlencode(params)
+    if parts.fragment.startswith(('/', '!')):
+        normalized += '#' + parts.fragment
+    return normalized
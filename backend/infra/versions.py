@@ -0,0 +1,116 @@
+"""
+Per-resource version counters shared by every process on the host through
+a small memory-mapped file. Services bump a resource after each committed
+write; HTTP handlers derive ETags from the counters, so a conditional GET
+can be answered without touching the database.
+
+The file also holds a random epoch. If the file is recreated, counters
+restart from zero under a new epoch, and ETags handed out earlier can
+never match again.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# 'memberships' moves when a bookmark is added, removed, moved, tagged or
+# (un)favorited: everything search filters match on, see FilterIndex.
+RESOURCES = ('bookmarks', 'collections', 'tags', 'memberships')
+MAGIC = b'BMVER002'
+_LAYOUT = np.dtype([
+    ('magic', 'S8'),
+    ('epoch', '<u8'),
+    ('versions', '<u8', (len(RESOURCES),)),
+    ('updated_at', '<f8', (len(RESOURCES),)),
+])
+
+
+def _default_path():
+    # One file per database, so processes serving the same data share counters.
+    key = hashlib.sha256(os.environ.get('DATABASE_URL', '').encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"bookmark-manager-versions-{key}")
+
+
+def etag_variant(full_path, accept=''):
+    """What besides the data selects a representation: path, query string and Accept header."""
+    return f"{full_path}\n{accept}"
+
+
+class VersionCounters:
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+        self._inode = None
+
+    def open(self, path=None):
+        """(Re)open the counter file, creating it with a fresh epoch if needed."""
+        path = path or self.path or os.environ.get('VERSION_COUNTERS_PATH') or _default_path()
+        with self._lock:
+            with open(f"{path}.lock", 'a+') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self._valid(path):
+                    tmp = f"{path}.tmp"
+                    data = np.zeros(1, dtype=_LAYOUT)
+                    data['magic'] = MAGIC
+                    data['epoch'] = int.from_bytes(os.urandom(8), 'little') >> 1
+                    data.tofile(tmp)
+                    os.replace(tmp, path)
+            self.path = path
+            self._data = np.memmap(path, dtype=_LAYOUT, mode='r+', shape=(1,))
+            self._inode = os.stat(path).st_ino
+        return self
+
+    @staticmethod
+    def _valid(path):
+        try:
+            if os.path.getsize(path) != _LAYOUT.itemsize:
+                return False
+            with open(path, 'rb') as fh:
+                return fh.read(len(MAGIC)) == MAGIC
+        except OSError:
+            return False
+
+    def _mapped(self):
+        # Another process recreates the file if it went missing; follow it there.
+        try:
+            current = os.stat(self.path).st_ino if self._data is not None else None
+        except OSError:
+            current = None
+        if current is None or current != self._inode:
+            self.open()
+        return self._data
+
+    def bump(self, *resources):
+        """Advance each resource's counter; returns (epoch, (new version, ...)) like snapshot()."""
+        data = self._mapped()
+        slots = [RESOURCES.index(resource) for resource in resources]
+        with self._lock, open(f"{self.path}.lock", 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            now = time.time()
+            for slot in slots:
+                data['versions'][0, slot] += 1
+                data['updated_at'][0, slot] = now
+            return int(data['epoch'][0]), tuple(int(data['versions'][0, slot]) for slot in slots)
+
+    def snapshot(self, *resources):
+        """(epoch, (version, ...)) for the given resources."""
+        data = self._mapped()
+        return int(data['epoch'][0]), tuple(int(data['versions'][0, RESOURCES.index(r)]) for r in resources)
+
+    def last_modified(self, *resources):
+        data = self._mapped()
+        return max(float(data['updated_at'][0, RESOURCES.index(r)]) for r in resources)
+
+    def etag(self, resources, variant=''):
+        """Strong entity tag (unquoted) for a representation of `resources`; `variant` is e.g. the request path and query."""
+        epoch, numbers = self.snapshot(*resources)
+        digest = hashlib.blake2b(variant.encode('utf-8'), digest_size=6).hexdigest()
+        return f"{epoch:x}-{'.'.join(map(str, numbers))}-{digest}"
+
+
+versions = VersionCounters()
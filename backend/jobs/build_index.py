@@ -0,0 +1,22 @@
+"""
+Build the embedding search index from the database and save it to EMBEDDING_INDEX_PATH.
+
+    EMBEDDING_INDEX_PATH=/var/lib/bookmarks/index.npz python -m backend.jobs.build_index
+
+App processes load the saved file at startup and sync vectors stored since.
+"""
+import os
+import sys
+import time
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import app, bookmark_service
+
+if __name__ == '__main__':
+    if not bookmark_service.index_path:
+        sys.exit("EMBEDDING_INDEX_PATH is not set")
+    started = time.perf_counter()
+    with app.app_context():
+        size = bookmark_service.build_index()
+    print(f"indexed {size} embeddings in {time.perf_counter() - started:.1f}s -> {bookmark_service.index_path}")
@@ -0,0 +1,26 @@
+"""
+Rebuild every bookmark's "related bookmarks" list served by GET /bookmarks/<id>/similar.
+
+    python -m backend.jobs.build_neighbors [--workers 8] [--chunk-size 256]
+
+Stored vectors are scored against each other in chunks of rows on a pool
+of threads; each chunk's lists are committed as it finishes, so the
+endpoint keeps answering throughout. Between rebuilds the lists are kept
+up to date as bookmarks are embedded and deleted.
+"""
+import argparse
+import json
+import os
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import app, bookmark_service
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, help='scoring threads (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, help='rows scored per task (default: ~64 MB of scores)')
+    args = parser.parse_args()
+    with app.app_context():
+        report = bookmark_service.neighbors.rebuild(chunk_size=args.chunk_size, workers=args.workers)
+    print(json.dumps(report, indent=2))
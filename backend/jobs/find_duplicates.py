@@ -0,0 +1,26 @@
+"""
+Find bookmarks saved more than once and store the clusters served by GET /bookmarks/duplicates.
+
+Bookmarks are grouped by normalized URL and by near-identical embeddings.
+
+    python -m backend.jobs.find_duplicates [--threshold 0.95] [--block-size 2048]
+
+Embeddings are compared by blocked float32 matrix multiplication, so memory
+stays at block-size² scores however large the library is.
+"""
+import argparse
+import json
+import os
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import app, duplicate_service
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threshold', type=float, help='cosine similarity for a content duplicate (default DUPLICATE_THRESHOLD or 0.95)')
+    parser.add_argument('--block-size', type=int, help='rows per matmul block (default DUPLICATE_BLOCK_SIZE or 2048)')
+    args = parser.parse_args()
+    with app.app_context():
+        report = duplicate_service.scan(threshold=args.threshold, block_size=args.block_size)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,38 @@
+"""
+Re-embed every bookmark with another model, then switch search over to it in one step.
+
+    python -m backend.jobs.migrate_embeddings --model text-embedding-3-small \
+        [--batch-size 256] [--max-rows-per-second 50] [--max-tokens-per-minute 900000] [--no-switch]
+
+New vectors are staged next to the current ones while search keeps serving
+the current model. Progress is checkpointed after every batch: after an
+interruption, run the same command again to resume. Every process follows
+the switch within EMBEDDING_INDEX_SYNC_INTERVAL; set EMBEDDING_PROVIDER and
+EMBEDDING_MODEL to the new model before the next deploy. Models are named as
+the providers name them: an OpenAI model, local-hashing-<dim> or fake-<dim>.
+"""
+import argparse
+import json
+import os
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import app, bookmark_service
+from backend.infra.embedding_providers import provider_for_model
+from backend.services.embedding_migration_service import EmbeddingMigrationService
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', required=True, help='embedding model to migrate to')
+    parser.add_argument('--batch-size', type=int, help='texts per provider call and per checkpoint (default 256)')
+    parser.add_argument('--max-rows-per-second', type=float, help='throttle (default EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND, 0 = none)')
+    parser.add_argument('--max-tokens-per-minute', type=float, help='throttle on estimated tokens (default EMBEDDING_MIGRATION_MAX_TOKENS_PER_MINUTE, 0 = none)')
+    parser.add_argument('--no-switch', action='store_true', help='stage vectors only; a later run switches')
+    args = parser.parse_args()
+    migration = EmbeddingMigrationService(
+        bookmark_service, provider_for_model(args.model), batch_size=args.batch_size,
+        max_rows_per_second=args.max_rows_per_second, max_tokens_per_minute=args.max_tokens_per_minute,
+    )
+    with app.app_context():
+        report = migration.run(switch=not args.no_switch)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,21 @@
+"""
+Recompute Collection.count and Tag.count from the bookmark tables and report drift.
+
+    python -m backend.jobs.reconcile_counters [--dry-run]
+"""
+import argparse
+import json
+import os
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import app
+from backend.services.counter_service import CounterService
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report drift without correcting it')
+    args = parser.parse_args()
+    with app.app_context():
+        report = CounterService().reconcile(fix=not args.dry_run)
+    print(json.dumps(report, indent=2))
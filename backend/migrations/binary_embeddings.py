@@ -0,0 +1,116 @@
+"""
+Convert `bookmark.embedding` from JSON text to packed binary vectors.
+
+The legacy column is renamed to `embedding_json`, the binary `embedding`,
+`embedding_dim` and `embedding_model` columns are added, and rows are
+converted in id-ordered batches, one transaction per batch. Rows that
+already have a binary embedding are skipped, so the job can be stopped and
+re-run safely.
+
+    python -m backend.migrations.binary_embeddings --batch-size 500 --dtype float16
+"""
+import argparse
+import json
+
+import sqlalchemy as sa
+
+from backend.infra import embedding_codec
+from backend.migrations.schema import engine_from_env
+
+LEGACY_MODEL = "text-embedding-ada-002"
+
+
+def _columns(engine):
+    return {col['name'] for col in sa.inspect(engine).get_columns('bookmark')}
+
+
+def upgrade_schema(engine):
+    """Rename the JSON column and add the binary columns; no-op once applied."""
+    columns = _columns(engine)
+    if 'embedding_dim' in columns:
+        return False
+    binary_type = sa.LargeBinary().compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        if 'embedding' in columns:
+            conn.execute(sa.text('ALTER TABLE bookmark RENAME COLUMN embedding TO embedding_json'))
+        conn.execute(sa.text(f'ALTER TABLE bookmark ADD COLUMN embedding {binary_type}'))
+        conn.execute(sa.text('ALTER TABLE bookmark ADD COLUMN embedding_dim INTEGER'))
+        conn.execute(sa.text('ALTER TABLE bookmark ADD COLUMN embedding_model VARCHAR(64)'))
+    return True
+
+
+def _decode_legacy(raw):
+    # Old writes stored json.dumps(list) inside a JSON column, so the value
+    # may come back as a list or as a JSON string that still needs parsing.
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode('utf-8')
+    while isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw
+
+
+def convert_rows(engine, batch_size=500, dtype='float32', log=print):
+    """Pack every remaining JSON embedding; returns (converted, skipped)."""
+    if 'embedding_json' not in _columns(engine):
+        return 0, 0
+    bookmark = sa.Table('bookmark', sa.MetaData(), autoload_with=engine)
+    pending = sa.select(bookmark.c.id, bookmark.c.embedding_json).where(
+        bookmark.c.embedding_json.isnot(None),
+        bookmark.c.embedding.is_(None),
+    ).order_by(bookmark.c.id).limit(batch_size)
+    write = bookmark.update().where(bookmark.c.id == sa.bindparam('b_id')).values(
+        embedding=sa.bindparam('b_embedding'),
+        embedding_dim=sa.bindparam('b_dim'),
+        embedding_model=sa.bindparam('b_model'),
+    )
+    converted = skipped = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(pending.where(bookmark.c.id > last_id)).all()
+            if not rows:
+                break
+            params = []
+            for bm_id, raw in rows:
+                try:
+                    vector = _decode_legacy(raw)
+                except (TypeError, ValueError):
+                    vector = None
+                if not vector:
+                    skipped += 1
+                    continue
+                params.append({
+                    'b_id': bm_id,
+                    'b_embedding': embedding_codec.pack(vector, dtype),
+                    'b_dim': len(vector),
+                    'b_model': LEGACY_MODEL,
+                })
+            if params:
+                conn.execute(write, params)
+            converted += len(params)
+            last_id = rows[-1][0]
+        log(f"converted {converted} embeddings (last id {last_id}, skipped {skipped})")
+    return converted, skipped
+
+
+def drop_legacy_column(engine):
+    if 'embedding_json' in _columns(engine):
+        with engine.begin() as conn:
+            conn.execute(sa.text('ALTER TABLE bookmark DROP COLUMN embedding_json'))
+
+
+def migrate(engine, batch_size=500, dtype='float32', drop_legacy=False, log=print):
+    upgrade_schema(engine)
+    result = convert_rows(engine, batch_size=batch_size, dtype=dtype, log=log)
+    if drop_legacy:
+        drop_legacy_column(engine)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dtype', choices=sorted(embedding_codec.DTYPES), default='float32')
+    parser.add_argument('--drop-legacy', action='store_true', help='drop embedding_json once every row is converted')
+    args = parser.parse_args()
+    migrate(engine_from_env(), args.batch_size, args.dtype, args.drop_legacy)
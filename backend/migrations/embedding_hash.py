@@ -0,0 +1,54 @@
+"""
+Add `bookmark.embedding_hash` and backfill it for bookmarks whose stored
+vector matches their current text (status `ready`), so unchanged edits and
+duplicate texts can reuse those vectors. Runs in id-ordered batches and can
+be re-run.
+
+    python -m backend.migrations.embedding_hash --batch-size 1000
+"""
+import argparse
+
+import sqlalchemy as sa
+
+from backend.infra.embedding_providers import content_hash
+from backend.migrations.schema import add_missing_columns, engine_from_env
+from backend.models.bookmark import Bookmark, EMBEDDING_READY
+from backend.services.bookmark_service import BookmarkService
+
+
+def backfill(engine, batch_size=1000, log=print):
+    table = Bookmark.__table__
+    pending = sa.select(table.c.id, table.c.title, table.c.description, table.c.embedding_model).where(
+        table.c.embedding_hash.is_(None),
+        table.c.embedding_status == EMBEDDING_READY,
+        table.c.embedding.isnot(None),
+        table.c.embedding_model.isnot(None),
+    ).order_by(table.c.id).limit(batch_size)
+    write = table.update().where(table.c.id == sa.bindparam('b_id')).values(embedding_hash=sa.bindparam('b_hash'))
+    total = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(pending.where(table.c.id > last_id)).all()
+            if not rows:
+                break
+            conn.execute(write, [{
+                'b_id': bm_id,
+                'b_hash': content_hash(model, BookmarkService.embedding_text(title, description)),
+            } for bm_id, title, description, model in rows])
+            total += len(rows)
+            last_id = rows[-1][0]
+        log(f"hashed {total} embeddings (last id {last_id})")
+    return total
+
+
+def migrate(engine, batch_size=1000, log=print):
+    add_missing_columns(engine, Bookmark.__table__, log=log)
+    return backfill(engine, batch_size=batch_size, log=log)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    migrate(engine_from_env(), args.batch_size)
@@ -0,0 +1,27 @@
+"""
+Add the embedding queue columns and backfill them: rows that already have
+a vector become `ready`, rows without one become `pending` so the
+embedding worker picks them up.
+
+    python -m backend.migrations.embedding_status
+"""
+import sqlalchemy as sa
+
+from backend.migrations.schema import add_missing_columns, engine_from_env
+from backend.models.bookmark import Bookmark, EMBEDDING_PENDING, EMBEDDING_READY
+
+
+def migrate(engine, log=print):
+    add_missing_columns(engine, Bookmark.__table__, log=log)
+    with engine.begin() as conn:
+        result = conn.execute(sa.text(
+            "UPDATE bookmark SET embedding_status = CASE WHEN embedding IS NULL "
+            "THEN :pending ELSE :ready END, embedding_attempts = 0 "
+            "WHERE embedding_status IS NULL"
+        ), {'pending': EMBEDDING_PENDING, 'ready': EMBEDDING_READY})
+    log(f"backfilled embedding_status on {result.rowcount} bookmarks")
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    migrate(engine_from_env())
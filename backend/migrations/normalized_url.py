@@ -0,0 +1,46 @@
+"""
+Add `bookmark.normalized_url` and backfill it, so duplicate URLs are found
+on create and by the duplicates job. Runs in id-ordered batches and can be
+re-run.
+
+    python -m backend.migrations.normalized_url --batch-size 1000
+"""
+import argparse
+
+import sqlalchemy as sa
+
+from backend.infra.urls import normalize_url
+from backend.migrations.schema import add_missing_columns, engine_from_env
+from backend.models.bookmark import Bookmark
+
+
+def backfill(engine, batch_size=1000, log=print):
+    table = Bookmark.__table__
+    pending = sa.select(table.c.id, table.c.url).where(
+        table.c.normalized_url.is_(None),
+    ).order_by(table.c.id).limit(batch_size)
+    write = table.update().where(table.c.id == sa.bindparam('b_id')).values(normalized_url=sa.bindparam('b_url'))
+    total = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(pending.where(table.c.id > last_id)).all()
+            if not rows:
+                break
+            conn.execute(write, [{'b_id': bm_id, 'b_url': normalize_url(url)} for bm_id, url in rows])
+            total += len(rows)
+            last_id = rows[-1][0]
+        log(f"normalized {total} urls (last id {last_id})")
+    return total
+
+
+def migrate(engine, batch_size=1000, log=print):
+    add_missing_columns(engine, Bookmark.__table__, log=log)
+    return backfill(engine, batch_size=batch_size, log=log)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    migrate(engine_from_env(), args.batch_size)
@@ -0,0 +1,50 @@
+"""
+Add columns and indexes that the models define but an existing database
+was created without. `db.create_all()` only creates missing
+tables, so new columns on existing tables go through here.
+
+    python -m backend.migrations.schema
+"""
+import os
+
+import sqlalchemy as sa
+from dotenv import load_dotenv
+
+
+def engine_from_env():
+    """Engine for DATABASE_URL, without importing (and starting) the web app."""
+    load_dotenv()
+    return sa.create_engine(os.environ['DATABASE_URL'])
+
+
+def add_missing_columns(engine, table, log=print):
+    """ALTER TABLE ... ADD COLUMN for every column of `table` missing in the database, then create missing indexes."""
+    existing = {col['name'] for col in sa.inspect(engine).get_columns(table.name)}
+    added = [column for column in table.columns if column.name not in existing]
+    with engine.begin() as conn:
+        for column in added:
+            col_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(sa.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            log(f"added {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    return [column.name for column in added]
+
+
+def upgrade(engine, log=print):
+    from backend.infra.db import db
+    import backend.models.bookmark  # noqa: F401 register tables
+    import backend.models.collection  # noqa: F401
+    import backend.models.tags  # noqa: F401
+    import backend.models.duplicate  # noqa: F401
+    import backend.models.neighbor  # noqa: F401
+    import backend.models.embedding_migration  # noqa: F401
+    import backend.models.membership_change  # noqa: F401
+
+    db.metadata.create_all(engine)
+    for table in db.metadata.sorted_tables:
+        add_missing_columns(engine, table, log=log)
+
+
+if __name__ == '__main__':
+    upgrade(engine_from_env())
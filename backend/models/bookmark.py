@@ -2,6 +2,11 @@ from datetime import datetime
 from backend.infra.db import db
 # import pytz
 
+EMBEDDING_PENDING = 'pending'
+EMBEDDING_PROCESSING = 'processing'
+EMBEDDING_READY = 'ready'
+EMBEDDING_FAILED = 'failed'
+
 
 bookmark_tags = db.Table('bookmark_tags',
     db.Column('bookmark_id', db.Integer, db.ForeignKey('bookmark.id'), primary_key=True),
@@ -10,16 +15,35 @@ bookmark_tags = db.Table('bookmark_tags',
 
 
 class Bookmark(db.Model):
+    __table_args__ = (
+        # Keyset pagination order, see BookmarkService.list_page
+        db.Index('ix_bookmark_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     url = db.Column(db.String(512), nullable=False)
+    # backend.infra.urls.normalize_url(url): saves of the same page share it.
+    normalized_url = db.Column(db.String(1024), index=True)
     description = db.Column(db.Text, nullable=False)
-    collection_id = db.Column(db.Integer, db.ForeignKey('collection.id'), nullable=False)
-    tags = db.relationship('Tag', secondary=bookmark_tags, backref=db.backref('bookmarks', lazy='dynamic'))
+    collection_id = db.Column(db.Integer, db.ForeignKey('collection.id'), nullable=False, index=True)
+    # selectin: tags for a whole result set load in one extra IN query instead of one per bookmark
+    tags = db.relationship('Tag', secondary=bookmark_tags, lazy='selectin', backref=db.backref('bookmarks', lazy='dynamic'))
     created_at = db.Column(db.DateTime, default=datetime.now())
+    # Last change to title/url/description; other processes sync their lexical index from it.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_favorite = db.Column(db.Boolean, default=False)
     has_dark_icon = db.Column(db.Boolean, default=False)
-    embedding = db.Column(db.JSON)
+    # Packed float32/float16 bytes, see backend.infra.embedding_codec
+    embedding = db.Column(db.LargeBinary)
+    embedding_dim = db.Column(db.Integer)
+    embedding_model = db.Column(db.String(64))
+    # content_hash(model, text) of the text the vector was computed from; equal hashes share a vector.
+    embedding_hash = db.Column(db.String(64), index=True)
+    embedding_status = db.Column(db.String(16), default=EMBEDDING_PENDING, index=True)
+    embedding_attempts = db.Column(db.Integer, default=0)
+    embedding_claimed_at = db.Column(db.DateTime)
+    embedded_at = db.Column(db.DateTime, index=True)
 
     def to_dict(self):
         return {
@@ -31,5 +55,6 @@ class Bookmark(db.Model):
             'tags': [tag.name for tag in self.tags],
             'createdAt': self.created_at.isoformat(),
             'isFavorite': self.is_favorite,
-            'hasDarkIcon': self.has_dark_icon
+            'hasDarkIcon': self.has_dark_icon,
+            'embeddingStatus': self.embedding_status
         }
\ No newline at end of file
@@ -15,5 +15,5 @@ class Collection(db.Model):
             'name': self.name,
             'icon': self.icon,
             'color': self.color,
-            'count': len(self.bookmarks)
+            'count': self.count or 0
         }
\ No newline at end of file
@@ -0,0 +1,19 @@
+from backend.infra.db import db
+
+
+class DuplicateMember(db.Model):
+    """
+    One bookmark's membership in a duplicate cluster found by the last
+    DuplicateService.scan(). Rows are replaced wholesale by each scan; a
+    bookmark deleted since simply drops out when the clusters are read.
+    """
+    __tablename__ = 'duplicate_member'
+
+    cluster_id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: bookmark deletes must not have to touch scan results.
+    bookmark_id = db.Column(db.Integer, primary_key=True, index=True)
+    # 'url', 'content' or 'url,content': why the cluster's members were grouped.
+    reasons = db.Column(db.String(32), nullable=False)
+    # Highest cosine similarity between two members, None for URL-only clusters.
+    score = db.Column(db.Float)
+    scanned_at = db.Column(db.DateTime, nullable=False)
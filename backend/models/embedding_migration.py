@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from backend.infra.db import db
+
+MIGRATION_RUNNING = 'running'
+MIGRATION_SWITCHED = 'switched'
+
+
+class EmbeddingMigration(db.Model):
+    """
+    One re-embedding of the library into `target_model`, see
+    EmbeddingMigrationService. `last_id` is the checkpoint a resumed run
+    continues after. The most recently switched migration names the model
+    every process embeds and searches with.
+    """
+    __tablename__ = 'embedding_migration'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_model = db.Column(db.String(64))
+    target_model = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=MIGRATION_RUNNING, index=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    # Estimated at four characters per token; the embeddings API does not return counts per text.
+    tokens_done = db.Column(db.BigInteger, nullable=False, default=0)
+    seconds = db.Column(db.Float, nullable=False, default=0.0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    switched_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sourceModel': self.source_model,
+            'targetModel': self.target_model,
+            'status': self.status,
+            'lastId': self.last_id,
+            'rows': self.rows_done,
+            'tokens': self.tokens_done,
+            'seconds': round(self.seconds, 3),
+            'rowsPerSecond': round(self.rows_done / self.seconds, 1) if self.seconds else None,
+            'tokensPerSecond': round(self.tokens_done / self.seconds, 1) if self.seconds else None,
+            'switchedAt': self.switched_at.isoformat() if self.switched_at else None,
+        }
+
+
+class StagedEmbedding(db.Model):
+    """
+    A bookmark's vector under a migration's target model, kept next to the
+    one in `bookmark.embedding` that search keeps serving until the switch.
+    """
+    __tablename__ = 'staged_embedding'
+
+    bookmark_id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(64), primary_key=True)
+    # Packed like Bookmark.embedding, see backend.infra.embedding_codec
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    embedding_dim = db.Column(db.Integer, nullable=False)
+    embedding_hash = db.Column(db.String(64))
+    # Compared with bookmark.updated_at: text edited since needs embedding again.
+    embedded_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from backend.infra.db import db
+
+
+class MembershipChange(db.Model):
+    """
+    A bookmark whose search filter attributes (existence, collection,
+    favorite, tags) a write changed, logged under the (epoch, version) the
+    write took the shared 'memberships' counter to. Other processes refresh
+    just these bookmarks in their FilterIndex; a version missing from the
+    log (a write that lists no bookmarks, or rows already pruned) makes them
+    reload it instead.
+    """
+    __tablename__ = 'membership_change'
+    __table_args__ = (db.Index('ix_membership_change_epoch_version', 'epoch', 'version'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    epoch = db.Column(db.BigInteger, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)
+    # NULL when the write touched no bookmark; the row still accounts for its version.
+    bookmark_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def rows(stamp, bookmark_ids, changed_at=None):
+        """Insert parameters logging `bookmark_ids` under the counter value `stamp`."""
+        epoch, version = stamp
+        changed_at = changed_at or datetime.utcnow()
+        return [{'epoch': epoch, 'version': version, 'bookmark_id': bm_id, 'changed_at': changed_at}
+                for bm_id in bookmark_ids or [None]]
@@ -0,0 +1,15 @@
+from backend.infra.db import db
+
+
+class BookmarkNeighbor(db.Model):
+    """
+    One entry of a bookmark's precomputed "related bookmarks" list, see
+    NeighborService. Each bookmark keeps its top NEIGHBOR_COUNT entries.
+    """
+    __tablename__ = 'bookmark_neighbor'
+
+    bookmark_id = db.Column(db.Integer, primary_key=True)
+    # No foreign keys: reads join the live bookmarks, so deletes never have to wait on these rows.
+    neighbor_id = db.Column(db.Integer, primary_key=True, index=True)
+    # Cosine similarity of the two stored embeddings.
+    score = db.Column(db.Float, nullable=False)
@@ -0,0 +1,96 @@
+import asyncio
+
+from sqlalchemy import insert, select
+
+from backend.infra import metrics
+from backend.infra.versions import versions
+from backend.models.bookmark import Bookmark
+from backend.models.membership_change import MembershipChange
+
+
+class AsyncBookmarkService:
+    """
+    Async versions of the hot BookmarkService paths for the ASGI app. The
+    indexes, caches and search settings stay on the wrapped BookmarkService,
+    so both serving modes in a process share them. Rows are read and
+    written through an AsyncSession. Index syncs, which use the Flask
+    session, go through `run_sync`, which runs a callable on a thread
+    inside an app context.
+    """
+
+    def __init__(self, service, sessions, run_sync):
+        self.service = service
+        self.sessions = sessions
+        self.run_sync = run_sync
+
+    async def search_by_query(self, query, limit=15, mode=None, filters=None):
+        """Same ranking and caching as BookmarkService.search_by_query, awaiting the query embedding."""
+        service = self.service
+        mode, normalized = service._search_args(query, mode)
+        if not normalized:
+            return []
+        filters = service._search_filters(filters)
+        allowed = await self.run_sync(service._prepare_search, mode, filters)
+        result_key = service._result_key(mode, normalized, limit, filters)
+        bookmark_ids = service.result_cache.get(result_key)
+        if bookmark_ids is None:
+            wanted, cacheable = service._embedding_plan(mode)
+            embedding = None
+            if wanted:
+                try:
+                    embedding = await self._embed_query(normalized, service._embedding_timeout(mode))
+                except Exception:
+                    if mode == 'semantic':
+                        raise
+                    service._embedding_failed()
+                    cacheable = False
+            # Scoring is numpy work that releases the GIL; keep it off the event loop.
+            bookmark_ids = await asyncio.to_thread(service._rank_ids, mode, normalized, limit, embedding, allowed)
+            if cacheable:
+                service.result_cache.set(result_key, bookmark_ids)
+        return await self.get_many_ordered(bookmark_ids)
+
+    async def _embed_query(self, normalized_query, timeout=None):
+        service = self.service
+        key = (service.embedding_model, normalized_query)
+        embedding = service.query_cache.get(key)
+        if embedding is None:
+            labels = {'model': service.embedding_model, 'kind': 'query'}
+            metrics.EMBEDDING_BATCH_SIZE.observe(1, **labels)
+            with metrics.timed('embed', metrics.EMBEDDING_SECONDS, **labels):
+                pending = service.embedder.embed_async(normalized_query, timeout=timeout)
+                embedding = await (asyncio.wait_for(pending, timeout) if timeout else pending)
+            service.query_cache.set(key, embedding)
+        return embedding
+
+    async def get_by_id(self, bookmark_id):
+        async with self.sessions() as session:
+            return await session.get(Bookmark, bookmark_id)
+
+    async def get_many_ordered(self, bookmark_ids):
+        if not bookmark_ids:
+            return []
+        async with self.sessions() as session:
+            rows = (await session.scalars(select(Bookmark).where(Bookmark.id.in_(bookmark_ids)))).all()
+        found = {bm.id: bm for bm in rows}
+        return [found[bm_id] for bm_id in bookmark_ids if bm_id in found]
+
+    async def set_favorite(self, bookmark_id, is_favorite):
+        """The updated bookmark, or None if it does not exist."""
+        async with self.sessions() as session:
+            bm = await session.get(Bookmark, bookmark_id)
+            if bm is None:
+                return None
+            changed = bm.is_favorite != is_favorite
+            bm.is_favorite = is_favorite
+            await session.commit()
+        if changed:
+            # As BookmarkService.publish: bump, log the change for other processes, apply it here.
+            epoch, numbers = versions.bump('bookmarks', 'memberships')
+            async with self.sessions() as session:
+                await session.execute(insert(MembershipChange), MembershipChange.rows((epoch, numbers[-1]), [bookmark_id]))
+                await session.commit()
+            self.service.filters.apply((epoch, numbers[-1]), lambda filters: filters.set_favorite([bookmark_id], is_favorite))
+        else:
+            versions.bump('bookmarks')
+        return bm
@@ -0,0 +1,170 @@
+import os
+
+from sqlalchemy import delete, exists, insert, select, true, update
+
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark, bookmark_tags
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.tag_service import tag_cache
+
+OK = 'ok'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+
+
+class BatchError(ValueError):
+    """A batch request that cannot run at all: bad ids, or an unknown collection or tag."""
+
+
+class BatchService:
+    """
+    Favorite, move, tag and delete many bookmarks in one transaction. Each
+    call issues a fixed number of set-based statements however many ids it
+    is given, adjusts the collection and tag counters in the same
+    transaction, and returns {id: 'ok' | 'unchanged' | 'not_found'}.
+    """
+
+    def __init__(self, bookmark_service, max_ids=None):
+        self.bookmark_service = bookmark_service
+        self.max_ids = max_ids or int(os.environ.get('BATCH_MAX_IDS', 1000))
+
+    def check_ids(self, ids, name='ids'):
+        """`ids` deduplicated in request order; BatchError unless it is a non-empty list of integers."""
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise BatchError(f"{name} must be a list of integer ids")
+        if name == 'ids' and not ids:
+            raise BatchError("ids must not be empty")
+        if len(ids) > self.max_ids:
+            raise BatchError(f"at most {self.max_ids} {name} per request")
+        return list(dict.fromkeys(ids))
+
+    @staticmethod
+    def _rows(ids, *columns):
+        """The existing bookmarks among `ids`, locked for the rest of the transaction on Postgres."""
+        table = Bookmark.__table__
+        return db.session.execute(
+            select(table.c.id, *columns).where(table.c.id.in_(ids)).with_for_update()
+        ).all()
+
+    @staticmethod
+    def _results(ids, found, changed):
+        return {
+            bm_id: OK if bm_id in changed else UNCHANGED if bm_id in found else NOT_FOUND
+            for bm_id in ids
+        }
+
+    def set_favorite(self, ids, is_favorite):
+        ids = self.check_ids(ids)
+        table = Bookmark.__table__
+        rows = self._rows(ids, table.c.is_favorite)
+        changed = [row.id for row in rows if bool(row.is_favorite) != is_favorite]
+        if changed:
+            db.session.execute(update(table).where(table.c.id.in_(changed)).values(is_favorite=is_favorite))
+        db.session.commit()
+        if changed:
+            self.bookmark_service.publish(
+                'bookmarks', filter_change=lambda filters: filters.set_favorite(changed, is_favorite))
+        return self._results(ids, {row.id for row in rows}, set(changed))
+
+    def move(self, ids, collection_id):
+        ids = self.check_ids(ids)
+        if not isinstance(collection_id, int) or isinstance(collection_id, bool):
+            raise BatchError("collection_id must be an integer")
+        if db.session.get(Collection, collection_id) is None:
+            raise BatchError(f"unknown collection_id {collection_id}")
+        table = Bookmark.__table__
+        rows = self._rows(ids, table.c.collection_id)
+        moved = [row for row in rows if row.collection_id != collection_id]
+        if moved:
+            db.session.execute(
+                update(table).where(table.c.id.in_([row.id for row in moved])).values(collection_id=collection_id)
+            )
+            counters = self.bookmark_service.counters
+            counters.adjust(collections={
+                **counters.deltas((row.collection_id for row in moved), -1),
+                collection_id: len(moved),
+            })
+        db.session.commit()
+        if moved:
+            self.bookmark_service.publish('bookmarks', 'collections', filter_change=lambda filters: filters.move(
+                [row.id for row in moved], collection_id))
+            self.bookmark_service.generation += 1
+        return self._results(ids, {row.id for row in rows}, {row.id for row in moved})
+
+    def set_tags(self, ids, add=None, remove=None):
+        """Add the `add` tags to and remove the `remove` tags from every bookmark in `ids`."""
+        ids = self.check_ids(ids)
+        add = self.check_ids(add if add is not None else [], 'add')
+        remove = self.check_ids(remove if remove is not None else [], 'remove')
+        if not add and not remove:
+            raise BatchError("give tag ids to add and/or remove")
+        if set(add) & set(remove):
+            raise BatchError("a tag cannot be both added and removed")
+        unknown = set(add + remove) - set(tag_cache.existing_ids(add + remove))
+        if unknown:
+            raise BatchError(f"unknown tag ids {sorted(unknown)}")
+        rows = self._rows(ids)
+        found = [row.id for row in rows]
+        added = removed = []
+        if found and add:
+            bookmarks, tags = Bookmark.__table__, Tag.__table__
+            pairs = select(bookmarks.c.id, tags.c.id).select_from(bookmarks.join(tags, true())).where(
+                bookmarks.c.id.in_(found),
+                tags.c.id.in_(add),
+                ~exists().where(bookmark_tags.c.bookmark_id == bookmarks.c.id, bookmark_tags.c.tag_id == tags.c.id),
+            )
+            added = db.session.execute(
+                insert(bookmark_tags).from_select(['bookmark_id', 'tag_id'], pairs)
+                .returning(bookmark_tags.c.bookmark_id, bookmark_tags.c.tag_id)
+            ).all()
+        if found and remove:
+            removed = db.session.execute(
+                delete(bookmark_tags).where(
+                    bookmark_tags.c.bookmark_id.in_(found),
+                    bookmark_tags.c.tag_id.in_(remove),
+                ).returning(bookmark_tags.c.bookmark_id, bookmark_tags.c.tag_id)
+            ).all()
+        counters = self.bookmark_service.counters
+        counters.adjust(tags={
+            **counters.deltas(tag_id for _, tag_id in added),
+            **counters.deltas((tag_id for _, tag_id in removed), -1),
+        })
+        db.session.commit()
+        if added or removed:
+            self.bookmark_service.publish('bookmarks', 'tags', filter_change=lambda filters: (
+                filters.add_tags(added),
+                filters.remove_tags(removed),
+            ))
+            self.bookmark_service.generation += 1
+        return self._results(ids, set(found), {bm_id for bm_id, _ in added + removed})
+
+    def delete(self, ids):
+        ids = self.check_ids(ids)
+        table = Bookmark.__table__
+        rows = self._rows(ids, table.c.collection_id)
+        found = [row.id for row in rows]
+        if found:
+            tag_pairs = db.session.execute(
+                delete(bookmark_tags).where(bookmark_tags.c.bookmark_id.in_(found))
+                .returning(bookmark_tags.c.bookmark_id, bookmark_tags.c.tag_id)
+            ).all()
+            db.session.execute(delete(table).where(table.c.id.in_(found)))
+            self.bookmark_service.neighbors.forget(found)
+            counters = self.bookmark_service.counters
+            counters.adjust(
+                collections=counters.deltas((row.collection_id for row in rows), -1),
+                tags=counters.deltas((tag_id for _, tag_id in tag_pairs), -1),
+            )
+        db.session.commit()
+        if found:
+            service = self.bookmark_service
+            service.publish('bookmarks', 'collections', 'tags', filter_change=lambda filters: (
+                filters.remove(found),
+                filters.remove_tags(tag_pairs),
+            ))
+            for bm_id in found:
+                service.index.remove(bm_id)
+                service.lexical_index.remove(bm_id)
+            service.generation += 1
+        return self._results(ids, set(found), set(found))
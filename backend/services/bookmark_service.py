@@ -1,128 +1,860 @@
 from backend.infra.db import db
-from backend.models.bookmark import Bookmark
-from backend.models.tags import Tag
-from openai import OpenAI
-from flask import current_app, json
-from datetime import datetime
+from backend.models.bookmark import Bookmark, bookmark_tags, EMBEDDING_PENDING, EMBEDDING_PROCESSING, EMBEDDING_READY, EMBEDDING_FAILED
+from backend.models.embedding_migration import EmbeddingMigration, MIGRATION_SWITCHED
+from backend.models.membership_change import MembershipChange
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.filter_index import FilterChanges, FilterIndex, SEARCH_FILTERS
+from backend.infra.ivf_index import IVFIndex
+from backend.infra.mmap_store import MmapEmbeddingStore
+from backend.infra.quantized_index import QuantizedIndex
+from backend.infra import metrics
+from backend.infra.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from backend.infra.embedding_providers import content_hash, provider_for_model, provider_from_env
+from backend.infra import embedding_codec
+from backend.infra.cache import LRUCache
+from backend.infra.urls import normalize_url
+from backend.infra.versions import versions
+from backend.services.counter_service import CounterService
+from backend.services.neighbor_service import NeighborService
+from backend.services.tag_service import tag_cache
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, delete, insert, or_, update
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import base64
+import logging
 import os
-import math
+import threading
+import time
+import zipfile
 
+import numpy as np
 
+log = logging.getLogger(__name__)
+
+SEARCH_MODES = ('hybrid', 'semantic', 'lexical')
+# Further behind than this many membership versions, a FilterIndex is reloaded rather than refreshed.
+MAX_REPLAYED_VERSIONS = 5000
+
+
+class DuplicateBookmarkError(ValueError):
+    """A bookmark with the same normalized URL is already saved; it is `existing`."""
+
+    def __init__(self, existing):
+        super().__init__(f"{existing.url} is already saved as bookmark {existing.id}")
+        self.existing = existing
 
 
 class BookmarkService:
     load_dotenv()
 
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get('API_KEY'))
+        # Chosen by EMBEDDING_PROVIDER; see backend.infra.embedding_providers.
+        self.embedder = provider_from_env()
+        self.embedding_dtype = os.environ.get('EMBEDDING_STORAGE_DTYPE', 'float32')
+        # A saved index lets a process start serving search without re-reading every vector.
+        self.index_path = os.environ.get('EMBEDDING_INDEX_PATH') or None
+        self.index_kind = os.environ.get('EMBEDDING_INDEX', 'ivf')
+        self.index = self._make_index(self.index_kind, self.index_path)
+        self.lexical_index = LexicalIndex()
+        # Collection, tag, favorite and date columns that scope filtered searches.
+        self.filters = FilterIndex()
+        # Membership changes are logged for other processes' FilterIndex and pruned after this many seconds.
+        self.membership_log_retention = float(os.environ.get('MEMBERSHIP_LOG_RETENTION', 3600))
+        self._last_membership_prune = 0.0
+        self.counters = CounterService()
+        # Precomputed "related bookmarks" lists, updated as vectors are stored.
+        self.neighbors = NeighborService(self)
+        # hybrid fuses BM25 and vector rankings and falls back to BM25 alone
+        # while the embedding provider is failing or slower than the timeout.
+        self.search_mode = os.environ.get('SEARCH_MODE', 'hybrid')
+        self.query_embedding_timeout = float(os.environ.get('SEARCH_EMBEDDING_TIMEOUT', 2.0))
+        self.embedding_cooldown = float(os.environ.get('SEARCH_EMBEDDING_COOLDOWN', 30))
+        self._embedding_down_until = 0.0
+        # Bumped by every bookmark write so cached search results never outlive the data they ranked.
+        self.generation = 0
+        self.query_cache = LRUCache(
+            maxsize=int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048)),
+            ttl=float(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 24 * 3600)),
+        )
+        self.result_cache = LRUCache(
+            maxsize=int(os.environ.get('SEARCH_RESULT_CACHE_SIZE', 1024)),
+            ttl=float(os.environ.get('SEARCH_RESULT_CACHE_TTL', 300)),
+        )
+        # Vectors written by other processes are picked up by polling `embedded_at`.
+        self.index_sync_interval = float(os.environ.get('EMBEDDING_INDEX_SYNC_INTERVAL', 1.0))
+        self._index_synced_through = None
+        self._last_index_sync = 0.0
+        self._lexical_synced_through = None
+        self._last_lexical_sync = 0.0
+        # The memberships counter values whose deletes the vector and lexical indexes reflect.
+        self._index_membership_stamp = None
+        self._lexical_membership_stamp = None
+        # Polled like the index: another process may finish an embedding migration.
+        self._last_model_check = 0.0
+        self._claim_lock = threading.Lock()
+        # Embedding calls avoided (unchanged text, reused stored vectors, repeats
+        # within a batch) versus texts actually sent to the provider.
+        self.embedding_counts = {'unchanged': 0, 'reused': 0, 'deduplicated': 0, 'embedded': 0}
+        self._counts_lock = threading.Lock()
+        # Set by the app to an EmbeddingWorker; woken whenever rows become pending.
+        self.worker = None
+
+    @property
+    def embedding_model(self):
+        return self.embedder.model
+
+    def use_model(self, model, embedder=None):
+        """Embed and search with `model` from now on; the vector index is reloaded with its stored vectors."""
+        self.embedder = embedder or provider_for_model(model)
+        self.index = self._make_index(self.index_kind, self.index_path)
+        self._index_synced_through = None
+        self.generation += 1
+        log.info("Switched embedding model to %s", model)
+
+    def _follow_model_switch(self):
+        """Adopt the target model of the latest switched EmbeddingMigration, see EmbeddingMigrationService."""
+        now = time.monotonic()
+        if now - self._last_model_check < self.index_sync_interval:
+            return
+        self._last_model_check = now
+        model = db.session.query(EmbeddingMigration.target_model).filter(
+            EmbeddingMigration.status == MIGRATION_SWITCHED,
+        ).order_by(EmbeddingMigration.switched_at.desc(), EmbeddingMigration.id.desc()).limit(1).scalar()
+        if model and model != self.embedding_model:
+            self.use_model(model)
+
+    @staticmethod
+    def _make_index(kind, path=None):
+        if kind == 'flat':
+            return EmbeddingIndex()
+        if kind == 'ivf':
+            return IVFIndex()
+        if kind == 'int8':
+            return QuantizedIndex()
+        if kind == 'mmap':
+            if not path:
+                raise ValueError("EMBEDDING_INDEX=mmap needs EMBEDDING_INDEX_PATH")
+            return MmapEmbeddingStore(path)
+        raise ValueError(f"Unknown EMBEDDING_INDEX {kind!r}; expected 'ivf', 'flat', 'int8' or 'mmap'")
 
     def get_all(self):
         return Bookmark.query.all()
 
+    def query_filtered(self, collection_id=None, tag_id=None, favorite=None, created_after=None, created_before=None):
+        """Bookmarks matching the list filters, newest first (keyset order: created_at, id)."""
+        query = Bookmark.query
+        if collection_id is not None:
+            query = query.filter(Bookmark.collection_id == collection_id)
+        if tag_id is not None:
+            tagged = db.session.query(bookmark_tags.c.bookmark_id).filter(bookmark_tags.c.tag_id == tag_id)
+            query = query.filter(Bookmark.id.in_(tagged))
+        if favorite is not None:
+            query = query.filter(Bookmark.is_favorite.is_(favorite))
+        if created_after is not None:
+            query = query.filter(Bookmark.created_at >= created_after)
+        if created_before is not None:
+            query = query.filter(Bookmark.created_at < created_before)
+        return query.order_by(Bookmark.created_at.desc(), Bookmark.id.desc())
+
+    @staticmethod
+    def encode_cursor(bm):
+        raw = f"{bm.created_at.isoformat()}|{bm.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Raises ValueError for a cursor that was not produced by encode_cursor."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            created_at, bm_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(bm_id)
+        except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+            raise ValueError("invalid cursor")
+
+    def list_page(self, limit=50, cursor=None, **filters):
+        """One keyset page: (bookmarks, cursor for the next page or None)."""
+        query = self.query_filtered(**filters)
+        if cursor:
+            created_at, bm_id = self.decode_cursor(cursor)
+            query = query.filter(or_(
+                Bookmark.created_at < created_at,
+                and_(Bookmark.created_at == created_at, Bookmark.id < bm_id),
+            ))
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            return rows[:limit], self.encode_cursor(rows[limit - 1])
+        return rows, None
+
+    def iter_filtered(self, batch_size=500, **filters):
+        """Stream every matching bookmark from a server-side cursor, `batch_size` rows at a time."""
+        return self.query_filtered(**filters).yield_per(batch_size)
+
     def get_by_id(self, bookmark_id):
         return Bookmark.query.get(bookmark_id)
 
-    def create(self, title, url, description, collection_id, tag_ids, is_favorite=False):
-        text = f"{title} {description}"
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        embedding = response.data[0].embedding
+    def find_by_url(self, url):
+        """The oldest bookmark saved under the same normalized URL, or None."""
+        return Bookmark.query.filter_by(normalized_url=normalize_url(url)).order_by(Bookmark.id).first()
 
+    def create(self, title, url, description, collection_id, tag_ids, is_favorite=False, reject_duplicate=False):
+        """With `reject_duplicate`, raises DuplicateBookmarkError if the URL is already saved."""
+        if reject_duplicate:
+            existing = self.find_by_url(url)
+            if existing is not None:
+                raise DuplicateBookmarkError(existing)
         bm = Bookmark(
             title=title,
             url=url,
+            normalized_url=normalize_url(url),
             description=description,
             collection_id=collection_id,
             is_favorite=is_favorite,
-            embedding=json.dumps(embedding),
-            created_at=datetime.utcnow()
+            embedding_status=EMBEDDING_PENDING,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
         )
-        for tag_id in tag_ids:
-            tag = Tag.query.get(tag_id)
-            if tag:
-                bm.tags.append(tag)
+        tag_ids = tag_cache.existing_ids(tag_ids or [])
         db.session.add(bm)
+        db.session.flush()
+        self._apply_tag_diff(bm.id, added=tag_ids)
+        self.counters.adjust(
+            collections={collection_id: 1},
+            tags=self.counters.deltas(tag_ids),
+        )
+        text = (bm.id, title, description, url)
+        row = (bm.id, collection_id, is_favorite, bm.created_at)
         db.session.commit()
+        self.publish('bookmarks', 'collections', 'tags', filter_change=lambda filters: (
+            filters.upsert(*row),
+            filters.add_tags((row[0], tag_id) for tag_id in tag_ids),
+        ))
+        self.index_text([text])
+        self.generation += 1
+        self._notify_worker()
         return bm
 
     def update(self, bookmark_id, title=None, url=None, description=None, collection_id=None, tag_ids=None, is_favorite=None):
         bm = Bookmark.query.get(bookmark_id)
         if not bm:
             return None
+        old_collection_id = bm.collection_id
+        old_is_favorite = bm.is_favorite
+        old_tag_ids = [tag.id for tag in bm.tags]
+        added = removed = []
+        old_text_hash = self.text_hash(bm.title, bm.description)
         if title:
             bm.title = title
         if url:
             bm.url = url
+            bm.normalized_url = normalize_url(url)
         if description:
             bm.description = description
         if collection_id:
             bm.collection_id = collection_id
         if is_favorite is not None:
             bm.is_favorite = is_favorite
+        if bm.collection_id != old_collection_id:
+            self.counters.adjust(collections={old_collection_id: -1, bm.collection_id: 1})
         if tag_ids is not None:
-            bm.tags = []
-            for tag_id in tag_ids:
-                tag = Tag.query.get(tag_id)
-                if tag:
-                    bm.tags.append(tag)
-        # Regenerate embedding if title or description changed
+            new_tag_ids = tag_cache.existing_ids(tag_ids)
+            added = [tag_id for tag_id in new_tag_ids if tag_id not in old_tag_ids]
+            removed = [tag_id for tag_id in old_tag_ids if tag_id not in new_tag_ids]
+            self._apply_tag_diff(bm.id, added, removed)
+            self.counters.adjust(tags={**self.counters.deltas(added), **self.counters.deltas(removed, -1)})
+        # Queue a new embedding only if the text actually changed; the old
+        # vector keeps serving search until the worker replaces it. Editing
+        # back to the text of the stored vector needs no call at all.
+        reembed = False
         if title or description:
-            text = f"{bm.title} {bm.description}"
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            bm.embedding = json.dumps(response.data[0].embedding)
+            new_text_hash = self.text_hash(bm.title, bm.description)
+            if new_text_hash == old_text_hash:
+                self.count_embeddings(unchanged=1)
+            elif new_text_hash == bm.embedding_hash and bm.embedding_model == self.embedding_model:
+                bm.embedding_status = EMBEDDING_READY
+                self.count_embeddings(unchanged=1)
+            else:
+                bm.embedding_status = EMBEDDING_PENDING
+                bm.embedding_attempts = 0
+                reembed = True
+        text_changed = bool(title or description or url)
+        if text_changed:
+            bm.updated_at = datetime.utcnow()
+            text = (bm.id, bm.title, bm.description, bm.url)
+        filter_change = None
+        if bm.collection_id != old_collection_id or bm.is_favorite != old_is_favorite or added or removed:
+            row = (bm.id, bm.collection_id, bm.is_favorite, bm.created_at)
+
+            def filter_change(filters):
+                filters.upsert(*row)
+                filters.add_tags((row[0], tag_id) for tag_id in added)
+                filters.remove_tags((row[0], tag_id) for tag_id in removed)
         db.session.commit()
+        self.publish('bookmarks', 'collections', 'tags', filter_change=filter_change)
+        if text_changed:
+            self.index_text([text])
+        self.generation += 1
+        if reembed:
+            self._notify_worker()
         return bm
 
+    @staticmethod
+    def _apply_tag_diff(bookmark_id, added=(), removed=()):
+        """Insert only the added and delete only the removed bookmark_tags rows."""
+        if added:
+            db.session.execute(insert(bookmark_tags), [
+                {'bookmark_id': bookmark_id, 'tag_id': tag_id} for tag_id in added
+            ])
+        if removed:
+            db.session.execute(delete(bookmark_tags).where(
+                bookmark_tags.c.bookmark_id == bookmark_id,
+                bookmark_tags.c.tag_id.in_(removed),
+            ))
+
     def delete(self, bookmark_id):
         bm = Bookmark.query.get(bookmark_id)
         if not bm:
             return False
+        tag_ids = [tag.id for tag in bm.tags]
+        self.counters.adjust(
+            collections={bm.collection_id: -1},
+            tags=self.counters.deltas(tag_ids, -1),
+        )
         db.session.delete(bm)
+        self.neighbors.forget([bookmark_id])
+        db.session.commit()
+        self.publish('bookmarks', 'collections', 'tags', filter_change=lambda filters: (
+            filters.remove([bookmark_id]),
+            filters.remove_tags((bookmark_id, tag_id) for tag_id in tag_ids),
+        ))
+        self.index.remove(bookmark_id)
+        self.lexical_index.remove(bookmark_id)
+        self.generation += 1
+        return True
+
+    def publish(self, *resources, filter_change=None):
+        """
+        Bump the version counters of `resources` after a commit. A write that
+        changes what search filters match passes `filter_change(filters)`, which
+        is applied to this process's FilterIndex. The bookmarks it touches are
+        logged under the new 'memberships' version, from which other
+        processes refresh theirs.
+        """
+        if filter_change is None:
+            versions.bump(*resources)
+            return
+        changes = FilterChanges()
+        filter_change(changes)
+        epoch, numbers = versions.bump(*resources, 'memberships')
+        self._log_membership_change((epoch, numbers[-1]), changes.bookmark_ids())
+        self.filters.apply((epoch, numbers[-1]), changes.replay)
+
+    def _log_membership_change(self, stamp, bookmark_ids):
+        now = datetime.utcnow()
+        db.session.execute(insert(MembershipChange), MembershipChange.rows(stamp, bookmark_ids, now))
+        if time.monotonic() - self._last_membership_prune > 60:
+            self._last_membership_prune = time.monotonic()
+            db.session.execute(delete(MembershipChange).where(
+                MembershipChange.changed_at < now - timedelta(seconds=self.membership_log_retention)))
         db.session.commit()
+
+    def _ensure_filters(self):
+        """
+        Bring the filter columns up to date with bookmark memberships changed
+        by any process: refresh just the bookmarks logged since, or reload
+        everything when the log does not cover every version in between.
+        """
+        epoch, (version,) = versions.snapshot('memberships')
+        stamp = self.filters.stamp
+        if stamp == (epoch, version):
+            return
+        if (self.filters.loaded and stamp is not None and stamp[0] == epoch
+                and self._replay_membership_changes(epoch, stamp[1], version)):
+            return
+        rows = db.session.query(Bookmark.id, Bookmark.collection_id, Bookmark.is_favorite, Bookmark.created_at).yield_per(5000)
+        pairs = db.session.query(bookmark_tags.c.bookmark_id, bookmark_tags.c.tag_id).yield_per(5000)
+        self.filters.load(rows, pairs, stamp=(epoch, version))
+
+    @staticmethod
+    def _logged_membership_ids(epoch, since, through):
+        """Sorted ids of the bookmarks logged for versions since..through; None if a version is missing from the log."""
+        if not 0 < through - since <= MAX_REPLAYED_VERSIONS:
+            return None
+        logged = db.session.query(MembershipChange.version, MembershipChange.bookmark_id).filter(
+            MembershipChange.epoch == epoch,
+            MembershipChange.version > since,
+            MembershipChange.version <= through,
+        ).all()
+        if len({version for version, _ in logged}) != through - since:
+            return None
+        return sorted({bm_id for _, bm_id in logged if bm_id is not None})
+
+    def _replay_membership_changes(self, epoch, since, through):
+        """Refresh the bookmarks logged for versions since..through; False if a version is missing from the log."""
+        ids = self._logged_membership_ids(epoch, since, through)
+        if ids is None:
+            return False
+        rows, pairs = [], []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows += db.session.query(Bookmark.id, Bookmark.collection_id, Bookmark.is_favorite, Bookmark.created_at).filter(
+                Bookmark.id.in_(chunk)).all()
+            pairs += db.session.query(bookmark_tags.c.bookmark_id, bookmark_tags.c.tag_id).filter(
+                bookmark_tags.c.bookmark_id.in_(chunk)).all()
+        self.filters.refresh((epoch, through), ids, [tuple(row) for row in rows], pairs)
         return True
 
+    def index_text(self, rows):
+        """Update the lexical index with committed (id, title, description, url) rows, once it is loaded."""
+        if self.lexical_index.loaded:
+            for bm_id, title, description, url in rows:
+                self.lexical_index.upsert(bm_id, title, description, url)
+
     @staticmethod
-    def _cosine_similarity(a, b):
-        """Cosine similarity between two vectors (lists of floats)."""
-        if not a or not b or len(a) != len(b):
-            return 0.0
-        dot = sum(x * y for x, y in zip(a, b))
-        norm_a = math.sqrt(sum(x * x for x in a))
-        norm_b = math.sqrt(sum(x * x for x in b))
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
-        return dot / (norm_a * norm_b)
-
-    def search_by_query(self, query, limit=15):
+    def embedding_text(title, description):
+        return f"{title} {description}"
+
+    def text_hash(self, title, description):
+        return content_hash(self.embedding_model, self.embedding_text(title, description))
+
+    def stored_vectors(self, text_hashes):
+        """{text_hash: vector} for hashes some bookmark already has a vector for under the current model."""
+        if not text_hashes:
+            return {}
+        rows = db.session.query(Bookmark.embedding_hash, Bookmark.embedding, Bookmark.embedding_dim).filter(
+            Bookmark.embedding_hash.in_(list(text_hashes)),
+            Bookmark.embedding_model == self.embedding_model,
+            Bookmark.embedding.isnot(None),
+        )
+        return {text_hash: embedding_codec.unpack(blob, dim) for text_hash, blob, dim in rows}
+
+    def stored_vector(self, bookmark_id):
+        """The bookmark's stored vector under the current model, or None."""
+        row = db.session.query(Bookmark.embedding, Bookmark.embedding_dim).filter(
+            Bookmark.id == bookmark_id,
+            Bookmark.embedding.isnot(None),
+            Bookmark.embedding_model == self.embedding_model,
+        ).first()
+        return embedding_codec.unpack(*row) if row else None
+
+    def stored_matrix(self):
+        """(ids, matrix): every stored vector of the current model as a unit-length float32 row, in id order."""
+        rows = db.session.query(Bookmark.id, Bookmark.embedding, Bookmark.embedding_dim).filter(
+            Bookmark.embedding.isnot(None),
+            Bookmark.embedding_model == self.embedding_model,
+        ).order_by(Bookmark.id).yield_per(1000)
+        ids, vectors = [], []
+        for bm_id, blob, dim in rows:
+            ids.append(bm_id)
+            vectors.append(embedding_codec.unpack(blob, dim))
+        if not vectors:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        matrix = np.vstack(vectors).astype(np.float32, copy=False)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return np.asarray(ids, dtype=np.int64), matrix
+
+    def count_embeddings(self, **deltas):
+        with self._counts_lock:
+            for key, delta in deltas.items():
+                self.embedding_counts[key] += delta
+
+    def _notify_worker(self):
+        if self.worker is not None:
+            self.worker.wake()
+
+    def claim_pending(self, batch_size, lease_seconds=300):
         """
-        Vector search: embed the query, compare to stored bookmark embeddings,
-        return top `limit` bookmarks ordered by similarity (most to least).
+        Mark up to `batch_size` pending bookmarks as processing and return their
+        (id, title, description). Claims older than `lease_seconds` are treated as
+        abandoned and handed out again.
         """
-        if not query or not query.strip():
-            return []
-        bookmarks_with_embedding = Bookmark.query.filter(
-            Bookmark.embedding.isnot(None)
+        self._follow_model_switch()
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=lease_seconds)
+        with self._claim_lock:
+            rows = db.session.query(Bookmark.id, Bookmark.title, Bookmark.description).filter(
+                or_(
+                    Bookmark.embedding_status == EMBEDDING_PENDING,
+                    and_(Bookmark.embedding_status == EMBEDDING_PROCESSING, Bookmark.embedding_claimed_at < expired),
+                )
+            ).order_by(Bookmark.id).limit(batch_size).with_for_update(skip_locked=True).all()
+            if rows:
+                Bookmark.query.filter(Bookmark.id.in_([row.id for row in rows])).update({
+                    Bookmark.embedding_status: EMBEDDING_PROCESSING,
+                    Bookmark.embedding_claimed_at: now,
+                    Bookmark.embedding_attempts: Bookmark.embedding_attempts + 1,
+                }, synchronize_session=False)
+            db.session.commit()
+            if rows:
+                versions.bump('bookmarks')
+        return rows
+
+    def apply_embeddings(self, embeddings, text_hashes=None):
+        """
+        Store (bookmark_id, vector) pairs produced for claimed rows, with the
+        {bookmark_id: text_hash} they were computed from. Rows edited again or
+        deleted since they were claimed are left alone.
+        """
+        text_hashes = text_hashes or {}
+        embeddings = list(embeddings)
+        if not embeddings:
+            return 0
+        now = datetime.utcnow()
+        table = Bookmark.__table__
+        stmt = update(table).where(
+            table.c.id == bindparam('b_id'),
+            table.c.embedding_status == EMBEDDING_PROCESSING,
+        ).values(
+            embedding=bindparam('b_embedding'),
+            embedding_dim=bindparam('b_dim'),
+            embedding_model=self.embedding_model,
+            embedding_hash=bindparam('b_hash'),
+            embedding_status=EMBEDDING_READY,
+            embedded_at=now,
+        )
+        db.session.execute(stmt, [{
+            'b_id': bm_id,
+            'b_embedding': embedding_codec.pack(vector, self.embedding_dtype),
+            'b_dim': len(vector),
+            'b_hash': text_hashes.get(bm_id),
+        } for bm_id, vector in embeddings])
+        stored = {bm_id for (bm_id,) in db.session.query(Bookmark.id).filter(
+            Bookmark.id.in_([bm_id for bm_id, _ in embeddings]),
+            Bookmark.embedded_at == now,
+        )}
+        db.session.commit()
+        versions.bump('bookmarks')
+        stored_vectors = [(bm_id, vector) for bm_id, vector in embeddings if bm_id in stored]
+        for bm_id, vector in stored_vectors:
+            self.index.upsert(bm_id, vector)
+        self.generation += 1
+        self.neighbors.refresh(stored_vectors)
+        return len(stored)
+
+    def release_claims(self, bookmark_ids, max_attempts):
+        """Return claimed rows to the queue after a failed batch, or give up on them."""
+        Bookmark.query.filter(
+            Bookmark.id.in_(bookmark_ids),
+            Bookmark.embedding_status == EMBEDDING_PROCESSING,
+        ).update({
+            Bookmark.embedding_status: case(
+                (Bookmark.embedding_attempts >= max_attempts, EMBEDDING_FAILED),
+                else_=EMBEDDING_PENDING,
+            ),
+        }, synchronize_session=False)
+        db.session.commit()
+        versions.bump('bookmarks')
+
+    def _ensure_index(self):
+        """Build the in-memory index once per process, then keep it in sync."""
+        if self.index.loaded and self._index_synced_through is not None:
+            self._sync_index()
+        elif not self._restore_index():
+            self._load_index()
+        self._maybe_rebuild_index()
+
+    def warm_index(self):
+        self._follow_model_switch()
+        self._ensure_index()
+
+    def _load_index(self):
+        self._index_synced_through = datetime.utcnow()
+        self._last_index_sync = time.monotonic()
+        self._index_membership_stamp = self._membership_stamp()
+        # Vectors from another embedding model live in a different space and are never mixed in.
+        rows = db.session.query(Bookmark.id, Bookmark.embedding, Bookmark.embedding_dim).filter(
+            Bookmark.embedding.isnot(None),
+            Bookmark.embedding_model == self.embedding_model,
+        ).yield_per(1000)
+        self.index.load((bm_id, embedding_codec.unpack(blob, dim)) for bm_id, blob, dim in rows)
+        if getattr(self.index, 'shared', False):
+            self._save_index(self.index)
+
+    def _restore_index(self):
+        """
+        Load the index saved at `index_path`, drop bookmarks deleted since it
+        was written and sync vectors stored since. A shared store is kept
+        current by every process, so only the sync is needed. False if there
+        is no usable file.
+        """
+        if not self.index_path or not hasattr(self.index, 'restore') or not os.path.exists(self.index_path):
+            return False
+        try:
+            meta = self.index.restore(self.index_path)
+            synced_through = datetime.fromisoformat(meta['synced_through'])
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            log.warning("Ignoring unreadable embedding index at %s", self.index_path, exc_info=True)
+            return False
+        if meta.get('model') != self.embedding_model:
+            return False
+        if not getattr(self.index, 'shared', False):
+            live = {bm_id for (bm_id,) in db.session.query(Bookmark.id).filter(
+                Bookmark.embedding.isnot(None),
+                Bookmark.embedding_model == self.embedding_model,
+            )}
+            for bm_id in self.index.ids():
+                if bm_id not in live:
+                    self.index.remove(bm_id)
+        self._index_synced_through = synced_through
+        self._index_membership_stamp = self._membership_stamp()
+        self._last_index_sync = float('-inf')
+        self._sync_index()
+        return True
+
+    def _maybe_rebuild_index(self):
+        """Repartition an ANN index in the background once it has outgrown its training."""
+        needs_rebuild = getattr(self.index, 'needs_rebuild', None)
+        if needs_rebuild is not None and needs_rebuild():
+            self.index.rebuild_async(on_done=self._save_index)
+
+    def _save_index(self, index):
+        if self.index_path and hasattr(index, 'save'):
+            index.save(self.index_path, meta={
+                'model': self.embedding_model,
+                'synced_through': self._index_synced_through.isoformat(),
+            })
+
+    def build_index(self):
+        """Load every stored vector, partition the index and save it to `index_path`."""
+        self._load_index()
+        if hasattr(self.index, 'rebuild'):
+            self.index.rebuild()
+        self._save_index(self.index)
+        return len(self.index)
+
+    def _sync_index(self):
+        """Upsert vectors stored since the last sync, e.g. by a worker in another process."""
+        now = time.monotonic()
+        if now - self._last_index_sync < self.index_sync_interval:
+            return
+        self._last_index_sync = now
+        started = datetime.utcnow()
+        # Overlap the window so rows committed late with an earlier timestamp are not missed.
+        since = self._index_synced_through - timedelta(seconds=30)
+        rows = db.session.query(Bookmark.id, Bookmark.embedding, Bookmark.embedding_dim).filter(
+            Bookmark.embedded_at > since,
+            Bookmark.embedding.isnot(None),
+            Bookmark.embedding_model == self.embedding_model,
         ).all()
-        if not bookmarks_with_embedding:
+        changed = False
+        for bm_id, blob, dim in rows:
+            vector = embedding_codec.unpack(blob, dim)
+            if bm_id not in self.index or not self.index.contains_vector(bm_id, vector):
+                self.index.upsert(bm_id, vector)
+                changed = True
+        self._index_synced_through = started
+        # A shared store already has other processes' deletes.
+        if not getattr(self.index, 'shared', False):
+            removed, self._index_membership_stamp = self._deleted_since(self._index_membership_stamp, self.index.ids)
+            for bm_id in removed:
+                self.index.remove(bm_id)
+            changed = changed or bool(removed)
+        if changed:
+            self.generation += 1
+
+    def _ensure_lexical_index(self):
+        """Build the BM25 index once per process, then pick up text other processes changed."""
+        now = time.monotonic()
+        if not self.lexical_index.loaded:
+            self._lexical_synced_through = datetime.utcnow()
+            self._last_lexical_sync = now
+            self._lexical_membership_stamp = self._membership_stamp()
+            rows = db.session.query(Bookmark.id, Bookmark.title, Bookmark.description, Bookmark.url).yield_per(2000)
+            self.lexical_index.load(rows)
+            return
+        if now - self._last_lexical_sync < self.index_sync_interval:
+            return
+        self._last_lexical_sync = now
+        started = datetime.utcnow()
+        rows = db.session.query(Bookmark.id, Bookmark.title, Bookmark.description, Bookmark.url).filter(
+            Bookmark.updated_at > self._lexical_synced_through - timedelta(seconds=30)
+        ).all()
+        for row in rows:
+            self.lexical_index.upsert(*row)
+        self._lexical_synced_through = started
+        if self._sync_lexical_removals() or rows:
+            self.generation += 1
+
+    def _sync_lexical_removals(self):
+        """Drop bookmarks other processes deleted from the BM25 index; True if anything was removed."""
+        removed, self._lexical_membership_stamp = self._deleted_since(self._lexical_membership_stamp, self.lexical_index.ids)
+        for bm_id in removed:
+            self.lexical_index.remove(bm_id)
+        return bool(removed)
+
+    @staticmethod
+    def _membership_stamp():
+        epoch, (version,) = versions.snapshot('memberships')
+        return epoch, version
+
+    def _deleted_since(self, stamp, indexed_ids):
+        """
+        (ids, new stamp): bookmarks deleted since the memberships counter was at
+        `stamp`. Candidates are the logged membership changes or, when the log
+        does not cover every version since, all of `indexed_ids()`; those no
+        longer in the table are returned.
+        """
+        current = self._membership_stamp()
+        if stamp == current:
+            return [], current
+        candidates = None
+        if stamp is not None and stamp[0] == current[0]:
+            candidates = self._logged_membership_ids(current[0], stamp[1], current[1])
+        if candidates is None:
+            candidates = sorted(indexed_ids())
+        live = set()
+        for start in range(0, len(candidates), 500):
+            chunk = candidates[start:start + 500]
+            live.update(bm_id for (bm_id,) in db.session.query(Bookmark.id).filter(Bookmark.id.in_(chunk)))
+        return [bm_id for bm_id in candidates if bm_id not in live], current
+
+    def _get_many_ordered(self, bookmark_ids):
+        """Fetch bookmarks by id, preserving the order of `bookmark_ids`."""
+        if not bookmark_ids:
             return []
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=query.strip()
-        )
-        query_embedding = response.data[0].embedding
-        scored = []
-        for bm in bookmarks_with_embedding:
-            try:
-                emb = json.loads(bm.embedding) if isinstance(bm.embedding, str) else bm.embedding
-            except (TypeError, ValueError):
-                continue
-            sim = self._cosine_similarity(query_embedding, emb)
-            scored.append((sim, bm))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [bm for _, bm in scored[:limit]]
\ No newline at end of file
+        found = {bm.id: bm for bm in Bookmark.query.filter(Bookmark.id.in_(bookmark_ids)).all()}
+        return [found[bm_id] for bm_id in bookmark_ids if bm_id in found]
+
+    @staticmethod
+    def _normalize_query(query):
+        return " ".join(query.split()).casefold() if query else ""
+
+    def _embed_query(self, normalized_query, timeout=None):
+        key = (self.embedding_model, normalized_query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            labels = {'model': self.embedding_model, 'kind': 'query'}
+            metrics.EMBEDDING_BATCH_SIZE.observe(1, **labels)
+            with metrics.timed('embed', metrics.EMBEDDING_SECONDS, **labels):
+                embedding = self.embedder.embed(normalized_query, timeout=timeout)
+            self.query_cache.set(key, embedding)
+        return embedding
+
+    def cache_stats(self):
+        stats = {
+            'queryEmbeddings': self.query_cache.stats(),
+            'searchResults': self.result_cache.stats(),
+            'embeddings': dict(self.embedding_counts),
+        }
+        if hasattr(self.index, 'memory_report'):
+            stats['indexMemory'] = self.index.memory_report()
+        return stats
+
+    def search_by_query(self, query, limit=15, mode=None, filters=None):
+        """
+        Rank bookmarks for `query`, best first. `mode` (default SEARCH_MODE):
+
+        - semantic: embed the query and score it against the embedding index.
+          Bookmarks still waiting for their first embedding are not ranked;
+          edited ones rank by their previous vector until the new one is stored.
+        - lexical: BM25 over title, description and URL tokens; no network call.
+        - hybrid: reciprocal-rank fusion of both. If embedding the query fails
+          or times out, lexical results are returned and the provider is
+          skipped for `embedding_cooldown` seconds.
+
+        `filters` (collection_id, tag_id, favorite, created_after,
+        created_before, as for the bookmark list) scope the search: both
+        indexes score only the bookmarks the FilterIndex bitmap allows.
+
+        Query embeddings and ranked ids are cached; the ranked ids are keyed by
+        the write generation.
+        """
+        mode, normalized = self._search_args(query, mode)
+        if not normalized:
+            return []
+        filters = self._search_filters(filters)
+        allowed = self._prepare_search(mode, filters)
+        result_key = self._result_key(mode, normalized, limit, filters)
+        bookmark_ids = self.result_cache.get(result_key)
+        if bookmark_ids is None:
+            wanted, cacheable = self._embedding_plan(mode)
+            embedding = None
+            if wanted:
+                try:
+                    embedding = self._embed_query(normalized, self._embedding_timeout(mode))
+                except Exception:
+                    if mode == 'semantic':
+                        raise
+                    self._embedding_failed()
+                    cacheable = False
+            bookmark_ids = self._rank_ids(mode, normalized, limit, embedding, allowed)
+            if cacheable:
+                self.result_cache.set(result_key, bookmark_ids)
+        return self._get_many_ordered(bookmark_ids)
+
+    # The steps of search_by_query, shared with the async search in backend.api.asgi.
+
+    def _search_args(self, query, mode):
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {', '.join(SEARCH_MODES)}")
+        return mode, self._normalize_query(query)
+
+    @staticmethod
+    def _search_filters(filters):
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        unknown = set(filters) - set(SEARCH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown search filters: {', '.join(sorted(unknown))}")
+        return filters
+
+    def _prepare_search(self, mode, filters=None):
+        """Bring the indexes up to date; returns the FilterIndex bitmap for `filters`, or None."""
+        if mode != 'lexical':
+            self._follow_model_switch()
+            self._ensure_index()
+        if mode != 'semantic':
+            self._ensure_lexical_index()
+        if not filters:
+            return None
+        self._ensure_filters()
+        return self.filters.mask(**filters)
+
+    def _result_key(self, mode, normalized, limit, filters=None):
+        # The index generation covers writes other processes made to a shared store.
+        key = (mode, normalized, limit, self.generation, self.index.generation)
+        if filters:
+            key += (tuple(sorted(filters.items())), self.filters.generation)
+        return key
+
+    def _embedding_plan(self, mode):
+        """(embed the query?, cache the ranking?). Hybrid skips the provider while it is cooling down."""
+        if mode == 'lexical' or not len(self.index):
+            return False, True
+        if mode == 'hybrid' and time.monotonic() < self._embedding_down_until:
+            return False, False
+        return True, True
+
+    def _embedding_timeout(self, mode):
+        return self.query_embedding_timeout if mode == 'hybrid' else None
+
+    def _embedding_failed(self):
+        log.warning("Query embedding failed; serving lexical results for %ds", self.embedding_cooldown, exc_info=True)
+        self._embedding_down_until = time.monotonic() + self.embedding_cooldown
+
+    def _rank_ids(self, mode, normalized, limit, query_embedding, allowed=None):
+        """Ranked bookmark ids, among those set in `allowed` if given; hybrid without a query embedding is lexical only."""
+        if allowed is not None and not allowed.any():
+            return []
+        if mode == 'semantic':
+            return self._semantic_ids(query_embedding, limit, allowed)
+        if mode == 'lexical':
+            return self._lexical_ids(normalized, limit, allowed)
+        depth = max(limit * 4, 50)
+        lexical = self._lexical_ids(normalized, depth, allowed)
+        if query_embedding is None:
+            return lexical[:limit]
+        semantic = self._semantic_ids(query_embedding, depth, allowed)
+        with metrics.timed('fusion', metrics.SEARCH_SECONDS, stage='fusion'):
+            return reciprocal_rank_fusion([semantic, lexical])[:limit]
+
+    def _semantic_ids(self, query_embedding, limit, allowed=None):
+        if query_embedding is None:
+            return []
+        with metrics.timed('semantic', metrics.SEARCH_SECONDS, stage='semantic'):
+            return [bm_id for bm_id, _ in self.index.search(query_embedding, limit, allowed=allowed)]
+
+    def _lexical_ids(self, normalized, limit, allowed=None):
+        with metrics.timed('lexical', metrics.SEARCH_SECONDS, stage='lexical'):
+            return [bm_id for bm_id, _ in self.lexical_index.search(normalized, limit, allowed=allowed)]
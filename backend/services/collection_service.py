@@ -1,5 +1,6 @@
 import random
 from backend.infra.db import db
+from backend.infra.versions import versions
 from backend.models.collection import Collection
 
 icons=[
@@ -50,6 +51,7 @@ class CollectionService:
         col = Collection(name=name, icon=icon, color=color)
         db.session.add(col)
         db.session.commit()
+        versions.bump('collections')
         return col
 
     def update(self, collection_id, name=None, icon=None, color=None):
@@ -63,6 +65,7 @@ class CollectionService:
         if color:
             col.color = color
         db.session.commit()
+        versions.bump('collections')
         return col
 
     def delete(self, collection_id):
@@ -71,4 +74,5 @@ class CollectionService:
             return False
         db.session.delete(col)
         db.session.commit()
+        versions.bump('collections', 'bookmarks', 'memberships')
         return True
\ No newline at end of file
@@ -0,0 +1,69 @@
+from collections import Counter
+
+from sqlalchemy import bindparam, func, select, update
+
+from backend.infra.db import db
+from backend.infra.versions import versions
+from backend.models.bookmark import Bookmark, bookmark_tags
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+
+
+class CounterService:
+    """
+    Keeps the denormalized `Collection.count` and `Tag.count` columns in step
+    with bookmark writes. Adjustments are issued in the caller's transaction,
+    so they commit (or roll back) together with the write that caused them.
+    """
+
+    def adjust(self, collections=None, tags=None):
+        """Apply {id: delta} maps, e.g. adjust(collections={3: 1}, tags={5: 1, 7: -1})."""
+        self._apply(Collection.__table__, collections)
+        self._apply(Tag.__table__, tags)
+
+    @staticmethod
+    def _apply(table, deltas):
+        params = [{'b_id': key, 'b_delta': delta} for key, delta in (deltas or {}).items() if key is not None and delta]
+        if not params:
+            return
+        stmt = update(table).where(table.c.id == bindparam('b_id')).values(
+            count=func.coalesce(table.c.count, 0) + bindparam('b_delta')
+        )
+        db.session.execute(stmt, params)
+
+    @staticmethod
+    def deltas(ids, sign=1):
+        """{id: sign * occurrences} for an iterable of ids."""
+        return {key: sign * n for key, n in Counter(ids).items()}
+
+    def reconcile(self, fix=True):
+        """
+        Recompute both counters with set-based SQL and report rows whose stored
+        value had drifted, as {'collections': [...], 'tags': [...]} of
+        {'id', 'stored', 'actual'}. With fix=True the drifted rows are corrected.
+        """
+        report = {
+            'collections': self._reconcile(Collection.__table__, Bookmark.__table__.c.collection_id, fix),
+            'tags': self._reconcile(Tag.__table__, bookmark_tags.c.tag_id, fix),
+        }
+        if fix:
+            db.session.commit()
+            if report['collections'] or report['tags']:
+                versions.bump('collections', 'tags')
+        return report
+
+    @staticmethod
+    def _reconcile(table, foreign_key, fix):
+        actual = select(func.count()).select_from(foreign_key.table).where(
+            foreign_key == table.c.id
+        ).scalar_subquery()
+        drifted = db.session.execute(
+            select(table.c.id, table.c.count, actual.label('actual')).where(
+                func.coalesce(table.c.count, -1) != actual
+            ).order_by(table.c.id)
+        ).all()
+        if fix and drifted:
+            db.session.execute(
+                update(table).where(table.c.id.in_([row.id for row in drifted])).values(count=actual)
+            )
+        return [{'id': row.id, 'stored': row.count, 'actual': row.actual} for row in drifted]
@@ -0,0 +1,169 @@
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+
+from backend.infra.db import db
+from backend.infra.versions import versions
+from backend.models.bookmark import Bookmark
+from backend.models.duplicate import DuplicateMember
+
+URL = 'url'
+CONTENT = 'content'
+
+
+def similar_pairs(matrix, threshold, block_size=2048):
+    """
+    (rows_a, rows_b, scores) for every pair of rows a < b of the unit-length
+    float32 `matrix` whose cosine similarity is at least `threshold`. The
+    upper triangle of matrix @ matrix.T is computed block by block, so memory
+    stays at block_size² scores and every comparison happens inside matmul.
+    """
+    n = matrix.shape[0]
+    found_a, found_b, found_scores = [], [], []
+    for start in range(0, n, block_size):
+        block = matrix[start:start + block_size]
+        for other in range(start, n, block_size):
+            scores = block @ matrix[other:other + block_size].T
+            hits = scores >= threshold
+            if other == start:
+                hits = np.triu(hits, k=1)
+            a, b = np.nonzero(hits)
+            if a.size:
+                found_a.append(a + start)
+                found_b.append(b + other)
+                found_scores.append(scores[a, b])
+    if not found_a:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_scores)
+
+
+def _components(edges):
+    """Connected components of the bookmark-id graph `edges`, as lists of ids."""
+    parent = {}
+
+    def root(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in edges:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for node in parent:
+        groups.setdefault(root(node), []).append(node)
+    return list(groups.values())
+
+
+class DuplicateService:
+    """
+    Groups bookmarks that are the same page: saved under the same normalized
+    URL, or with embeddings at least `threshold` cosine-similar. scan() is a
+    batch job (backend.jobs.find_duplicates) that stores the clusters in
+    `duplicate_member`; clusters() serves the stored result.
+    """
+
+    def __init__(self, bookmark_service, threshold=None, block_size=None):
+        self.bookmark_service = bookmark_service
+        self.threshold = threshold or float(os.environ.get('DUPLICATE_THRESHOLD', 0.95))
+        self.block_size = block_size or int(os.environ.get('DUPLICATE_BLOCK_SIZE', 2048))
+
+    @staticmethod
+    def url_pairs():
+        """(id, id) pairs chaining together the bookmarks of each normalized URL saved more than once."""
+        table = Bookmark.__table__
+        repeated = select(table.c.normalized_url).where(table.c.normalized_url.isnot(None)).group_by(
+            table.c.normalized_url).having(func.count() > 1)
+        rows = db.session.execute(
+            select(table.c.normalized_url, table.c.id).where(table.c.normalized_url.in_(repeated))
+            .order_by(table.c.normalized_url, table.c.id)
+        ).all()
+        return [(a.id, b.id) for a, b in zip(rows, rows[1:]) if a.normalized_url == b.normalized_url]
+
+    def content_pairs(self, threshold=None, block_size=None):
+        """(id, id, score) for stored embeddings of the current model at least `threshold` similar."""
+        ids, matrix = self.bookmark_service.stored_matrix()
+        if len(ids) < 2:
+            return []
+        a, b, scores = similar_pairs(matrix, threshold or self.threshold, block_size or self.block_size)
+        return list(zip(ids[a].tolist(), ids[b].tolist(), scores.tolist()))
+
+    def scan(self, threshold=None, block_size=None):
+        """Recompute every cluster and replace the stored ones in one transaction."""
+        started = time.perf_counter()
+        url_pairs = self.url_pairs()
+        content_pairs = self.content_pairs(threshold, block_size)
+        reasons, best = {}, {}
+        for a, b in url_pairs:
+            reasons.setdefault(a, set()).add(URL)
+        for a, b, score in content_pairs:
+            reasons.setdefault(a, set()).add(CONTENT)
+            best[a] = max(best.get(a, score), score)
+        clusters = _components(url_pairs + [(a, b) for a, b, _ in content_pairs])
+        # Largest clusters first, then oldest bookmark; cluster ids follow that order.
+        clusters = sorted((sorted(members) for members in clusters), key=lambda members: (-len(members), members[0]))
+        scanned_at = datetime.utcnow()
+        rows = []
+        for cluster_id, members in enumerate(clusters, start=1):
+            why = set().union(*(reasons.get(bm_id, ()) for bm_id in members))
+            scores = [best[bm_id] for bm_id in members if bm_id in best]
+            rows.extend({
+                'cluster_id': cluster_id,
+                'bookmark_id': bm_id,
+                'reasons': ','.join(sorted(why, key=[URL, CONTENT].index)),
+                'score': max(scores) if scores else None,
+                'scanned_at': scanned_at,
+            } for bm_id in members)
+        db.session.execute(delete(DuplicateMember))
+        if rows:
+            db.session.execute(insert(DuplicateMember), rows)
+        db.session.commit()
+        versions.bump('bookmarks')
+        return {
+            'clusters': len(clusters),
+            'bookmarks': len(rows),
+            'url_pairs': len(url_pairs),
+            'content_pairs': len(content_pairs),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def clusters(self, limit=50, after=0):
+        """
+        Up to `limit` stored clusters with id above `after`, each with the
+        members that still exist; clusters left with fewer than two are
+        skipped. Returns (clusters, next_after or None).
+        """
+        members = DuplicateMember.__table__
+        bookmarks = Bookmark.__table__
+        live = members.join(bookmarks, bookmarks.c.id == members.c.bookmark_id)
+        cluster_ids = db.session.execute(
+            select(members.c.cluster_id).select_from(live).where(members.c.cluster_id > after)
+            .group_by(members.c.cluster_id).having(func.count() > 1)
+            .order_by(members.c.cluster_id).limit(limit + 1)
+        ).scalars().all()
+        has_more = len(cluster_ids) > limit
+        cluster_ids = cluster_ids[:limit]
+        if not cluster_ids:
+            return [], None
+        rows = db.session.query(DuplicateMember, Bookmark).join(
+            Bookmark, Bookmark.id == DuplicateMember.bookmark_id
+        ).filter(DuplicateMember.cluster_id.in_(cluster_ids)).order_by(
+            DuplicateMember.cluster_id, Bookmark.id
+        ).all()
+        clusters = {}
+        for member, bm in rows:
+            cluster = clusters.setdefault(member.cluster_id, {
+                'id': member.cluster_id,
+                'reasons': member.reasons.split(','),
+                'score': member.score,
+                'scannedAt': member.scanned_at.isoformat(),
+                'bookmarks': [],
+            })
+            cluster['bookmarks'].append(bm.to_dict())
+        return list(clusters.values()), cluster_ids[-1] if has_more else None
@@ -0,0 +1,189 @@
+from datetime import datetime
+import os
+import time
+
+from sqlalchemy import and_, case, delete, exists, insert, or_, select, update
+
+from backend.infra import embedding_codec
+from backend.infra.db import db
+from backend.infra.embedding_providers import content_hash
+from backend.infra.versions import versions
+from backend.models.bookmark import Bookmark, EMBEDDING_PENDING, EMBEDDING_READY
+from backend.models.embedding_migration import EmbeddingMigration, StagedEmbedding, MIGRATION_RUNNING, MIGRATION_SWITCHED
+from backend.models.neighbor import BookmarkNeighbor
+
+# Rough size of a text in provider tokens; only used for throttling and reporting.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class EmbeddingMigrationService:
+    """
+    Re-embeds every bookmark with the `target` provider while search keeps
+    serving the current model. New vectors are staged in `staged_embedding`
+    next to the old ones, batch by batch, each batch committed together with
+    the migration's checkpoint so an interrupted run resumes after the last
+    committed id. Rows edited meanwhile are re-staged by catch-up passes;
+    then one transaction moves every staged vector into `bookmark` and
+    marks the migration switched, which every process polls for and follows.
+    Throughput is throttled to `max_rows_per_second` and
+    `max_tokens_per_minute` (0 for no limit).
+    """
+
+    def __init__(self, bookmark_service, target, batch_size=None, max_rows_per_second=None,
+                 max_tokens_per_minute=None, clock=time.monotonic, sleep=time.sleep):
+        self.bookmark_service = bookmark_service
+        self.target = target
+        self.batch_size = batch_size or int(os.environ.get('EMBEDDING_MIGRATION_BATCH_SIZE', 256))
+        self.max_rows_per_second = max_rows_per_second if max_rows_per_second is not None else float(
+            os.environ.get('EMBEDDING_MIGRATION_MAX_ROWS_PER_SECOND', 0))
+        self.max_tokens_per_minute = max_tokens_per_minute if max_tokens_per_minute is not None else float(
+            os.environ.get('EMBEDDING_MIGRATION_MAX_TOKENS_PER_MINUTE', 0))
+        self.clock = clock
+        self.sleep = sleep
+
+    @property
+    def model(self):
+        return self.target.model
+
+    def start(self):
+        """The running migration to the target model, resumed, or a new one."""
+        running = db.session.query(EmbeddingMigration).filter(
+            EmbeddingMigration.status == MIGRATION_RUNNING,
+        ).order_by(EmbeddingMigration.id).all()
+        for migration in running:
+            if migration.target_model != self.model:
+                raise ValueError(f"A migration to {migration.target_model} is still running")
+            return migration
+        if self.model == self.bookmark_service.embedding_model:
+            raise ValueError(f"{self.model} is already the embedding model")
+        migration = EmbeddingMigration(source_model=self.bookmark_service.embedding_model, target_model=self.model)
+        db.session.add(migration)
+        db.session.commit()
+        return migration
+
+    def run(self, switch=True, max_catch_up=3, log=print):
+        """
+        Stage every bookmark from the checkpoint on, then re-stage rows edited
+        since they were staged (at most `max_catch_up` full scans), then
+        switch. Returns the migration's report.
+        """
+        migration = self.start()
+        self._started, self._run_rows, self._run_tokens = self.clock(), 0, 0
+        if migration.last_id:
+            log(f"resuming migration to {self.model} after bookmark {migration.last_id}")
+        self._stage(migration, migration.last_id, checkpoint=True, log=log)
+        for _ in range(max_catch_up):
+            if not self._stage(migration, 0, checkpoint=False, log=log):
+                break
+        if switch:
+            self.switch(migration, log=log)
+        return migration.to_dict()
+
+    def _stage(self, migration, after_id, checkpoint, log):
+        """Embed, batch by batch, bookmarks past `after_id` whose staged vector is missing or stale."""
+        table, staged = Bookmark.__table__, StagedEmbedding.__table__
+        scan = select(table.c.id, table.c.title, table.c.description, staged.c.embedding_hash).outerjoin(
+            staged, and_(staged.c.bookmark_id == table.c.id, staged.c.model == self.model),
+        ).order_by(table.c.id).limit(self.batch_size)
+        total = db.session.query(Bookmark.id).count()
+        embedded = 0
+        while True:
+            rows = db.session.execute(scan.where(table.c.id > after_id)).all()
+            if not rows:
+                return embedded
+            after_id = rows[-1].id
+            batch_started = self.clock()
+            texts = {}
+            stale = []
+            for bm_id, title, description, staged_hash in rows:
+                text = self.bookmark_service.embedding_text(title, description)
+                text_hash = content_hash(self.model, text)
+                if text_hash != staged_hash:
+                    stale.append((bm_id, text_hash))
+                    texts.setdefault(text_hash, text)
+            tokens = sum(estimate_tokens(text) for text in texts.values())
+            vectors = dict(zip(texts, self.target.embed_many(list(texts.values())))) if texts else {}
+            now = datetime.utcnow()
+            if stale:
+                ids = [bm_id for bm_id, _ in stale]
+                db.session.execute(delete(staged).where(staged.c.model == self.model, staged.c.bookmark_id.in_(ids)))
+                db.session.execute(insert(staged), [{
+                    'bookmark_id': bm_id,
+                    'model': self.model,
+                    'embedding': embedding_codec.pack(vectors[text_hash], self.bookmark_service.embedding_dtype),
+                    'embedding_dim': len(vectors[text_hash]),
+                    'embedding_hash': text_hash,
+                    'embedded_at': now,
+                } for bm_id, text_hash in stale])
+            if checkpoint:
+                migration.last_id = after_id
+            self._throttle(len(stale), tokens)
+            migration.rows_done += len(stale)
+            migration.tokens_done += tokens
+            migration.seconds += self.clock() - batch_started
+            migration.updated_at = now
+            db.session.commit()
+            embedded += len(stale)
+            if stale:
+                report = migration.to_dict()
+                log(f"{'staged' if checkpoint else 'caught up'} through bookmark {after_id} of {total} rows: "
+                    f"{report['rows']} rows, {report['rowsPerSecond']} rows/s, ~{report['tokensPerSecond']} tokens/s")
+
+    def _throttle(self, rows, tokens):
+        """Sleep until this run's average rates are back under the limits."""
+        self._run_rows += rows
+        self._run_tokens += tokens
+        wait = 0.0
+        if self.max_rows_per_second:
+            wait = self._run_rows / self.max_rows_per_second
+        if self.max_tokens_per_minute:
+            wait = max(wait, self._run_tokens * 60 / self.max_tokens_per_minute)
+        wait -= self.clock() - self._started
+        if wait > 0:
+            self.sleep(wait)
+
+    def switch(self, migration, log=print):
+        """
+        In one transaction, replace every bookmark's vector with its staged
+        one and queue the rest (created or edited since staging) for the
+        worker, which then embeds with the new model. Related-bookmark lists
+        scored in the old space are dropped; /similar answers from the index
+        until backend.jobs.build_neighbors runs again.
+        """
+        table, staged = Bookmark.__table__, StagedEmbedding.__table__
+        match = and_(staged.c.bookmark_id == table.c.id, staged.c.model == self.model)
+
+        def staged_value(column):
+            return select(column).where(match).scalar_subquery()
+
+        now = datetime.utcnow()
+        moved = db.session.execute(update(table).where(exists().where(match)).values(
+            embedding=staged_value(staged.c.embedding),
+            embedding_dim=staged_value(staged.c.embedding_dim),
+            embedding_hash=staged_value(staged.c.embedding_hash),
+            embedding_model=self.model,
+            embedding_status=case(
+                (table.c.updated_at > staged_value(staged.c.embedded_at), EMBEDDING_PENDING),
+                else_=EMBEDDING_READY,
+            ),
+            embedding_attempts=0,
+            embedded_at=now,
+        ).execution_options(synchronize_session=False)).rowcount
+        db.session.execute(update(table).where(
+            or_(table.c.embedding_model != self.model, table.c.embedding_model.is_(None)),
+        ).values(embedding_status=EMBEDDING_PENDING, embedding_attempts=0).execution_options(synchronize_session=False))
+        db.session.execute(delete(staged).where(staged.c.model == self.model))
+        db.session.execute(delete(BookmarkNeighbor.__table__))
+        migration.status = MIGRATION_SWITCHED
+        migration.switched_at = now
+        db.session.commit()
+        versions.bump('bookmarks')
+        self.bookmark_service.use_model(self.model, self.target)
+        pending = db.session.query(Bookmark.id).filter(Bookmark.embedding_status == EMBEDDING_PENDING).count()
+        log(f"switched to {self.model}: {moved} vectors moved, {pending} bookmarks queued for the worker")
+        self.bookmark_service._notify_worker()
+        return moved
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import random
+import threading
+
+from openai import AuthenticationError
+
+from backend.infra import metrics
+
+log = logging.getLogger(__name__)
+
+
+class EmbeddingWorker:
+    """
+    Background pipeline that drains bookmarks marked pending by BookmarkService
+    and embeds them many texts per `embed_many` call.
+    """
+
+    def __init__(self, app, bookmark_service, batch_size=None, concurrency=None, max_retries=None,
+                 backoff=None, max_backoff=None, max_attempts=None, poll_interval=None, lease_seconds=None):
+        self.app = app
+        self.service = bookmark_service
+        self.batch_size = batch_size or int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+        self.concurrency = concurrency or int(os.environ.get('EMBEDDING_CONCURRENCY', 2))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('EMBEDDING_MAX_RETRIES', 4))
+        self.backoff = backoff if backoff is not None else float(os.environ.get('EMBEDDING_BACKOFF', 0.5))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.environ.get('EMBEDDING_MAX_BACKOFF', 30))
+        self.max_attempts = max_attempts or int(os.environ.get('EMBEDDING_MAX_ATTEMPTS', 5))
+        self.poll_interval = poll_interval or float(os.environ.get('EMBEDDING_POLL_INTERVAL', 5))
+        self.lease_seconds = lease_seconds or int(os.environ.get('EMBEDDING_LEASE_SECONDS', 300))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='embedding-worker', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='embedding-batch') as pool:
+            while not self._stop.is_set():
+                try:
+                    self.drain(pool)
+                except Exception:
+                    log.exception("Embedding worker pass failed")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def drain(self, pool=None):
+        """Process batches until no pending bookmarks are left; returns how many were embedded."""
+        total = 0
+        while not self._stop.is_set():
+            if pool is None:
+                done = [self.process_batch()]
+            else:
+                done = [f.result() for f in [pool.submit(self.process_batch) for _ in range(self.concurrency)]]
+            total += sum(done)
+            # A short or failed batch means the queue is drained (or the provider is down).
+            if min(done) < self.batch_size:
+                break
+        return total
+
+    def process_batch(self):
+        with self.app.app_context():
+            rows = self.service.claim_pending(self.batch_size, self.lease_seconds)
+            if not rows:
+                return 0
+            ids = [row.id for row in rows]
+            hashes = [self.service.text_hash(row.title, row.description) for row in rows]
+            # Texts that already have a stored vector, or repeat within the batch, are embedded once.
+            vectors = self.service.stored_vectors(set(hashes))
+            reused = sum(1 for text_hash in hashes if text_hash in vectors)
+            todo = {}
+            for row, text_hash in zip(rows, hashes):
+                if text_hash not in vectors and text_hash not in todo:
+                    todo[text_hash] = self.service.embedding_text(row.title, row.description)
+            try:
+                if todo:
+                    vectors.update(zip(todo, self._embed_with_retry(list(todo.values()))))
+            except Exception:
+                log.exception("Embedding %d bookmarks failed; releasing claims", len(ids))
+                self.service.release_claims(ids, self.max_attempts)
+                return 0
+            self.service.count_embeddings(reused=reused, deduplicated=len(ids) - reused - len(todo), embedded=len(todo))
+            self.service.apply_embeddings(
+                [(bm_id, vectors[text_hash]) for bm_id, text_hash in zip(ids, hashes)],
+                text_hashes=dict(zip(ids, hashes)),
+            )
+            return len(ids)
+
+    def _embed_with_retry(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                labels = {'model': self.service.embedding_model, 'kind': 'batch'}
+                metrics.EMBEDDING_BATCH_SIZE.observe(len(texts), **labels)
+                with metrics.timed('embed', metrics.EMBEDDING_SECONDS, **labels):
+                    return self.service.embedder.embed_many(texts)
+            except AuthenticationError:
+                raise
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                log.warning("Embedding batch failed (attempt %d), retrying in %.1fs", attempt + 1, delay)
+                if self._stop.wait(delay * random.uniform(0.8, 1.2)):
+                    raise
@@ -0,0 +1,142 @@
+import calendar
+import csv
+from datetime import datetime
+import html
+import io
+import json
+import os
+
+from sqlalchemy import select
+
+from backend.infra import embedding_codec, heartbeat
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark, bookmark_tags
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv', 'html')
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'html': 'text/html',
+}
+CSV_COLUMNS = ('title', 'url', 'description', 'collection', 'tags', 'isFavorite', 'createdAt')
+EMBEDDING_COLUMNS = ('embedding', 'embeddingModel')
+
+
+class ExportService:
+    """
+    Streams the whole library as JSON, NDJSON, CSV or a Netscape bookmark
+    file, in records that POST /bookmarks/import reads back. Rows come from a
+    server-side cursor `batch_size` at a time, with one tag query per batch,
+    so memory stays flat however large the library is.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    def records(self, embeddings=False):
+        """Every bookmark as an export record, grouped by collection, in id order within one."""
+        collections = dict(db.session.execute(select(Collection.id, Collection.name)).all())
+        table = Bookmark.__table__
+        columns = [table.c.id, table.c.title, table.c.url, table.c.description, table.c.collection_id,
+                   table.c.is_favorite, table.c.created_at]
+        if embeddings:
+            columns += [table.c.embedding, table.c.embedding_dim, table.c.embedding_model]
+        result = db.session.execute(
+            select(*columns).order_by(table.c.collection_id, table.c.id),
+            execution_options={'yield_per': self.batch_size},
+        )
+        for rows in result.partitions():
+            tags = {}
+            for bm_id, name in db.session.execute(
+                select(bookmark_tags.c.bookmark_id, Tag.name).join(Tag, Tag.id == bookmark_tags.c.tag_id)
+                .where(bookmark_tags.c.bookmark_id.in_([row.id for row in rows]))
+                .order_by(bookmark_tags.c.bookmark_id, Tag.name)
+            ):
+                tags.setdefault(bm_id, []).append(name)
+            for row in rows:
+                record = {
+                    'title': row.title,
+                    'url': row.url,
+                    'description': row.description,
+                    'collection': collections.get(row.collection_id),
+                    'tags': tags.get(row.id, []),
+                    'isFavorite': bool(row.is_favorite),
+                    'createdAt': row.created_at.isoformat() if row.created_at else None,
+                }
+                if embeddings:
+                    vector = embedding_codec.unpack(row.embedding, row.embedding_dim)
+                    record['embedding'] = vector.tolist() if vector is not None else None
+                    record['embeddingModel'] = row.embedding_model if vector is not None else None
+                yield record
+            heartbeat.beat()
+
+    def stream(self, fmt, embeddings=False):
+        """The export document in `fmt` as a generator of text pieces."""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        if fmt == 'html' and embeddings:
+            raise ValueError("embeddings cannot be exported as html")
+        records = self.records(embeddings)
+        if fmt == 'csv':
+            return self._csv(records, CSV_COLUMNS + (EMBEDDING_COLUMNS if embeddings else ()))
+        return getattr(self, f'_{fmt}')(records)
+
+    @staticmethod
+    def _json(records):
+        yield '['
+        for i, record in enumerate(records):
+            yield (',\n' if i else '\n') + json.dumps(record)
+        yield '\n]\n'
+
+    @staticmethod
+    def _ndjson(records):
+        for record in records:
+            yield json.dumps(record) + '\n'
+
+    @staticmethod
+    def _csv(records, columns):
+        """One row per bookmark; tags comma-joined, embeddings as a JSON array."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        for record in records:
+            record['tags'] = ','.join(record['tags'])
+            record['isFavorite'] = 'true' if record['isFavorite'] else 'false'
+            if record.get('embedding') is not None:
+                record['embedding'] = json.dumps(record['embedding'])
+            writer.writerow(record)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    @staticmethod
+    def _html(records):
+        escape = html.escape
+        yield (
+            '<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+            '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+            '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n'
+        )
+        folder = missing = object()
+        for record in records:
+            if record['collection'] != folder:
+                if folder is not missing:
+                    yield '    </DL><p>\n'
+                folder = record['collection']
+                yield f'    <DT><H3>{escape(folder or "")}</H3>\n    <DL><p>\n'
+            attrs = f'HREF="{escape(record["url"])}"'
+            if record['createdAt']:
+                created_at = datetime.fromisoformat(record['createdAt'])
+                attrs += f' ADD_DATE="{calendar.timegm(created_at.utctimetuple())}"'
+            if record['tags']:
+                attrs += f' TAGS="{escape(",".join(record["tags"]))}"'
+            yield f'        <DT><A {attrs}>{escape(record["title"])}</A>\n'
+            if record['description']:
+                yield f'        <DD>{escape(record["description"])}\n'
+        if folder is not missing:
+            yield '    </DL><p>\n'
+        yield '</DL><p>\n'
@@ -1,8 +1,13 @@
 from backend.infra.db import db
+from backend.infra.versions import versions
 from backend.models.bookmark import Bookmark
 
 
 class FavoriteService:
+    def __init__(self, bookmark_service=None):
+        # When given, toggles update its search FilterIndex in place instead of forcing a reload.
+        self.bookmark_service = bookmark_service
+
     def get_all(self):
         return Bookmark.query.filter_by(is_favorite=True).all()
 
@@ -12,6 +17,7 @@ class FavoriteService:
             return None
         bm.is_favorite = True
         db.session.commit()
+        self._publish(bookmark_id, True)
         return bm
 
     def remove(self, bookmark_id):
@@ -20,4 +26,11 @@ class FavoriteService:
             return False
         bm.is_favorite = False
         db.session.commit()
-        return True
\ No newline at end of file
+        self._publish(bookmark_id, False)
+        return True
+
+    def _publish(self, bookmark_id, is_favorite):
+        if self.bookmark_service is None:
+            versions.bump('bookmarks', 'memberships')
+        else:
+            self.bookmark_service.publish('bookmarks', filter_change=lambda filters: filters.set_favorite([bookmark_id], is_favorite))
@@ -0,0 +1,502 @@
+import codecs
+import json
+import random
+from datetime import datetime
+from html.parser import HTMLParser
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.infra import heartbeat
+from backend.infra.db import db
+from backend.infra.urls import normalize_url
+from backend.models.bookmark import Bookmark, bookmark_tags, EMBEDDING_PENDING
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services import collection_service, tag_service
+
+FORMATS = ('html', 'json', 'ndjson')
+CHUNK_SIZE = 64 * 1024
+DEFAULT_COLLECTION = "Imported"
+
+
+class ImportRecordError(ValueError):
+    """A problem with one record (or with the whole upload when raised from a parser)."""
+
+
+class _NetscapeParser(HTMLParser):
+    """
+    Incremental parser for the Netscape bookmark file format exported by browsers:
+    <DT><H3>folder</H3><DL> ... <DT><A HREF=.. ADD_DATE=.. TAGS=..>title</A><DD>description
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._folders = []
+        self._next_folder = None
+        self._in_folder_title = False
+        self._anchor = None
+        self._last = None
+        self._in_description = False
+
+    def _flush(self):
+        if self._last is not None:
+            self._last['description'] = self._last['description'].strip()
+            self.records.append(self._last)
+            self._last = None
+        self._in_description = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('dt', 'dl', 'h3', 'a'):
+            self._flush()
+        if tag == 'h3':
+            self._in_folder_title = True
+            self._next_folder = ''
+        elif tag == 'dl':
+            self._folders.append(self._next_folder)
+            self._next_folder = None
+        elif tag == 'a':
+            attrs = dict(attrs)
+            folder = next((name for name in reversed(self._folders) if name), None)
+            tags = attrs.get('tags') or ''
+            self._anchor = {
+                'url': attrs.get('href'),
+                'title': '',
+                'description': '',
+                'collection': folder,
+                'tags': [t for t in tags.split(',') if t.strip()],
+                'created_at': attrs.get('add_date'),
+            }
+        elif tag == 'dd':
+            self._in_description = self._last is not None
+
+    def handle_endtag(self, tag):
+        if tag == 'h3':
+            self._in_folder_title = False
+        elif tag == 'dl':
+            self._flush()
+            if self._folders:
+                self._folders.pop()
+        elif tag == 'a' and self._anchor is not None:
+            self._anchor['title'] = self._anchor['title'].strip()
+            self._last, self._anchor = self._anchor, None
+
+    def handle_data(self, data):
+        if self._in_folder_title:
+            self._next_folder += data
+        elif self._anchor is not None:
+            self._anchor['title'] += data
+        elif self._in_description:
+            self._last['description'] += data
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _text_chunks(stream, chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def parse_netscape(chunks):
+    parser = _NetscapeParser()
+    for text in chunks:
+        parser.feed(text)
+        yield from parser.records
+        parser.records = []
+    parser.close()
+    yield from parser.records
+
+
+def parse_ndjson(chunks):
+    """Yields one record per line; a malformed line yields an ImportRecordError instead."""
+    buffer = ''
+    line_no = 0
+    for text in chunks:
+        buffer += text
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            line_no += 1
+            yield _decode_line(line, line_no)
+    if buffer.strip():
+        yield _decode_line(buffer, line_no + 1)
+
+
+def _decode_line(line, line_no):
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ImportRecordError(f"line {line_no}: invalid JSON ({e.msg})")
+
+
+def parse_json(chunks):
+    """Streams the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    chunks = iter(chunks)
+    exhausted = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != '[':
+                raise ImportRecordError("JSON import must be an array of bookmark objects")
+            started = True
+            pos += 1
+            continue
+        if started and pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                value = None
+            # The element may be cut off at the chunk boundary; only trust it if more text follows.
+            if value is not None and (end < len(buffer) or exhausted):
+                yield value
+                pos = end
+                continue
+            if exhausted:
+                raise ImportRecordError(f"invalid JSON near character {pos}")
+        if exhausted:
+            if not started:
+                raise ImportRecordError("JSON import must be an array of bookmark objects")
+            raise ImportRecordError("unterminated JSON array")
+        buffer = buffer[pos:]
+        pos = 0
+        text = next(chunks, None)
+        if text is None:
+            exhausted = True
+        else:
+            buffer += text
+
+
+PARSERS = {
+    'html': parse_netscape,
+    'json': parse_json,
+    'ndjson': parse_ndjson,
+}
+
+
+def detect_format(filename=None, content_type=None, first_text=''):
+    name = (filename or '').lower()
+    for ext, fmt in (('.html', 'html'), ('.htm', 'html'), ('.ndjson', 'ndjson'), ('.jsonl', 'ndjson'), ('.json', 'json')):
+        if name.endswith(ext):
+            return fmt
+    content_type = (content_type or '').lower()
+    if 'html' in content_type:
+        return 'html'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    head = first_text.lstrip()
+    if head.startswith('<'):
+        return 'html'
+    if head.startswith('['):
+        return 'json'
+    if head.startswith('{'):
+        return 'ndjson'
+    raise ImportRecordError("could not detect the import format; pass ?format=html|json|ndjson")
+
+
+def _parse_created_at(value):
+    if value in (None, ''):
+        return datetime.utcnow()
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        try:
+            seconds = int(value)
+            if seconds > 10 ** 11:  # milliseconds
+                seconds //= 1000
+            return datetime.utcfromtimestamp(seconds)
+        except (OverflowError, OSError, ValueError):
+            raise ImportRecordError(f"invalid created_at: {value!r}")
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ImportRecordError(f"invalid created_at: {value!r}")
+
+
+def _text(raw, *keys):
+    """The first of `keys` present in `raw` with a value, stripped; '' if none is."""
+    for key in keys:
+        value = raw.get(key)
+        if value in (None, ''):
+            continue
+        if not isinstance(value, str):
+            raise ImportRecordError(f"'{key}' must be a string")
+        return value.strip()
+    return ''
+
+
+_TRUE = {'true', '1', 'yes', 'on'}
+_FALSE = {'false', '0', 'no', 'off', ''}
+
+
+def _parse_bool(value, name):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+        return value.strip().lower() in _TRUE
+    raise ImportRecordError(f"invalid {name}: {value!r}")
+
+
+def normalize_record(raw):
+    """Validate one parsed record and map it onto Bookmark columns."""
+    if not isinstance(raw, dict):
+        raise ImportRecordError("record must be an object")
+    url = _text(raw, 'url', 'href')
+    if not url:
+        raise ImportRecordError("missing 'url'")
+    if len(url) > 512:
+        raise ImportRecordError("'url' is longer than 512 characters")
+    title = (_text(raw, 'title') or url)[:255]
+    tags = raw.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    tags = sorted({str(t).strip()[:255] for t in tags if str(t).strip()})
+    collection = raw.get('collection')
+    if isinstance(collection, dict):
+        collection = collection.get('name')
+    collection_id = raw.get('collection_id', raw.get('collectionId'))
+    return {
+        'title': title,
+        'url': url,
+        'description': _text(raw, 'description'),
+        'collection': collection.strip()[:255] if isinstance(collection, str) and collection.strip() else None,
+        'collection_id': int(collection_id) if collection_id not in (None, '') else None,
+        'tags': tags,
+        'is_favorite': _parse_bool(raw.get('is_favorite', raw.get('isFavorite')), 'is_favorite'),
+        'created_at': _parse_created_at(raw.get('created_at', raw.get('createdAt'))),
+    }
+
+
+class ImportService:
+    """
+    Bulk import: stream-parses an upload, inserts bookmarks in batched
+    transactions, resolves or creates tags and collections by name in bulk,
+    and leaves embeddings pending for the EmbeddingWorker to batch.
+    """
+
+    def __init__(self, bookmark_service, batch_size=500):
+        self.bookmark_service = bookmark_service
+        self.batch_size = batch_size
+
+    def start(self, stream, fmt=None, filename=None, content_type=None, default_collection_id=None):
+        """
+        Check the upload and return a generator of progress events: one
+        'progress' event per committed batch (with that batch's row errors)
+        and a final 'done' event. Raises ImportRecordError up front when the
+        format or default collection is unusable.
+        """
+        chunks = _text_chunks(stream)
+        first = next(chunks, '')
+        fmt = fmt or detect_format(filename, content_type, first)
+        if fmt not in PARSERS:
+            raise ImportRecordError(f"unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        if default_collection_id is not None and not Collection.query.get(default_collection_id):
+            raise ImportRecordError(f"unknown collection_id {default_collection_id}")
+
+        def replay():
+            if first:
+                yield first
+            yield from chunks
+
+        return self._run(PARSERS[fmt](replay()), fmt, default_collection_id)
+
+    def _run(self, records, fmt, default_collection_id):
+        job = _ImportJob(default_collection_id)
+        batch = []
+        row = 0
+        try:
+            for raw in records:
+                if raw is None:
+                    continue
+                row += 1
+                try:
+                    if isinstance(raw, ImportRecordError):
+                        raise raw
+                    batch.append((row, normalize_record(raw)))
+                except (ImportRecordError, TypeError, ValueError) as e:
+                    job.errors.append({'row': row, 'error': str(e)})
+                if len(batch) >= self.batch_size:
+                    yield self._flush(job, batch, row)
+                    batch = []
+        except ImportRecordError as e:
+            job.errors.append({'row': row + 1, 'error': str(e)})
+            job.aborted = True
+        if batch or job.errors:
+            yield self._flush(job, batch, row)
+        yield {
+            'event': 'done',
+            'format': fmt,
+            'processed': row,
+            'imported': job.imported,
+            'failed': job.failed,
+            'aborted': job.aborted,
+        }
+
+    def _flush(self, job, batch, row):
+        batch = self._check_collection_ids(job, batch)
+        if batch:
+            try:
+                self._insert_batch(job, [record for _, record in batch])
+                job.imported += len(batch)
+            except (ImportRecordError, SQLAlchemyError) as e:
+                db.session.rollback()
+                job.forget_unsaved()
+                job.errors.extend({'row': n, 'error': str(e).splitlines()[0]} for n, _ in batch)
+            self.bookmark_service.generation += 1
+            self.bookmark_service._notify_worker()
+            heartbeat.beat()
+        errors, job.errors = job.errors, []
+        job.failed += len(errors)
+        return {
+            'event': 'progress',
+            'processed': row,
+            'imported': job.imported,
+            'failed': job.failed,
+            'errors': errors,
+        }
+
+    def _insert_batch(self, job, records):
+        collection_ids = self._resolve_collections(job, records)
+        tag_ids = self._resolve_tags(job, records)
+        rows = [{
+            'title': r['title'],
+            'url': r['url'],
+            'normalized_url': normalize_url(r['url']),
+            'description': r['description'],
+            'collection_id': collection_ids[i],
+            'is_favorite': r['is_favorite'],
+            'created_at': r['created_at'],
+            'embedding_status': EMBEDDING_PENDING,
+            'embedding_attempts': 0,
+        } for i, r in enumerate(records)]
+        new_ids = db.session.execute(
+            insert(Bookmark).returning(Bookmark.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        pairs = [
+            {'bookmark_id': bm_id, 'tag_id': tag_ids[name]}
+            for bm_id, record in zip(new_ids, records) for name in record['tags']
+        ]
+        if pairs:
+            db.session.execute(insert(bookmark_tags), pairs)
+        counters = self.bookmark_service.counters
+        counters.adjust(
+            collections=counters.deltas(row['collection_id'] for row in rows),
+            tags=counters.deltas(pair['tag_id'] for pair in pairs),
+        )
+        db.session.commit()
+
+        def filter_change(filters):
+            for bm_id, row in zip(new_ids, rows):
+                filters.upsert(bm_id, row['collection_id'], row['is_favorite'], row['created_at'])
+            filters.add_tags((pair['bookmark_id'], pair['tag_id']) for pair in pairs)
+        self.bookmark_service.publish('bookmarks', 'collections', 'tags', filter_change=filter_change)
+        job.commit_pending()
+        self.bookmark_service.index_text(
+            (bm_id, r['title'], r['description'], r['url']) for bm_id, r in zip(new_ids, records)
+        )
+        return new_ids
+
+    def _check_collection_ids(self, job, batch):
+        """Drop (and report) rows that name a collection_id that does not exist."""
+        unchecked = {r['collection_id'] for _, r in batch if r['collection_id']} - job.valid_collection_ids
+        if unchecked:
+            job.valid_collection_ids |= {
+                cid for (cid,) in db.session.query(Collection.id).filter(Collection.id.in_(unchecked))
+            }
+        valid = []
+        for n, record in batch:
+            if record['collection_id'] and record['collection_id'] not in job.valid_collection_ids:
+                job.errors.append({'row': n, 'error': f"unknown collection_id {record['collection_id']}"})
+            else:
+                valid.append((n, record))
+        return valid
+
+    def _resolve_collections(self, job, records):
+        """Collection id per record: explicit id, folder/collection name, or the default collection."""
+        wanted = {r['collection'] for r in records if r['collection'] and r['collection'] not in job.collections}
+        needs_default = any(not r['collection'] and not r['collection_id'] for r in records) and job.default_collection_id is None
+        if needs_default:
+            wanted.add(DEFAULT_COLLECTION)
+        if wanted:
+            for col_id, name in db.session.query(Collection.id, Collection.name).filter(Collection.name.in_(wanted)):
+                job.collections.setdefault(name, col_id)
+            missing = sorted(wanted - set(job.collections))
+            if missing:
+                created = db.session.execute(
+                    insert(Collection).returning(Collection.id, sort_by_parameter_order=True),
+                    [{'name': name, 'icon': random.choice(collection_service.icons),
+                      'color': random.choice(collection_service.DEFAULT_COLORS), 'count': 0} for name in missing],
+                ).scalars().all()
+                job.collections.update(zip(missing, created))
+                job.unsaved_collections.update(missing)
+        if needs_default:
+            job.default_collection_id = job.collections[DEFAULT_COLLECTION]
+        return [
+            r['collection_id'] or (job.collections[r['collection']] if r['collection'] else job.default_collection_id)
+            for r in records
+        ]
+
+    def _resolve_tags(self, job, records):
+        wanted = {name for r in records for name in r['tags'] if name not in job.tags}
+        if wanted:
+            job.tags.update(tag_service.tag_cache.ids_for_names(wanted))
+            missing = sorted(wanted - set(job.tags))
+            if missing:
+                created = db.session.execute(
+                    insert(Tag).returning(Tag.id, sort_by_parameter_order=True),
+                    [{'name': name, 'color': random.choice(tag_service.DEFAULT_COLORS), 'count': 0} for name in missing],
+                ).scalars().all()
+                job.tags.update(zip(missing, created))
+                job.unsaved_tags.update(missing)
+        return job.tags
+
+
+class _ImportJob:
+    """Per-upload state: name -> id caches so each tag or collection is resolved once."""
+
+    def __init__(self, default_collection_id=None):
+        self.default_collection_id = default_collection_id
+        self.collections = {}
+        self.valid_collection_ids = set()
+        self.tags = {}
+        self.unsaved_collections = set()
+        self.unsaved_tags = set()
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.aborted = False
+        if default_collection_id is not None:
+            self.valid_collection_ids.add(default_collection_id)
+
+    def commit_pending(self):
+        self.unsaved_collections.clear()
+        self.unsaved_tags.clear()
+
+    def forget_unsaved(self):
+        """Drop ids of rows created in a batch that was rolled back."""
+        for name in self.unsaved_collections:
+            self.collections.pop(name, None)
+            if name == DEFAULT_COLLECTION:
+                self.default_collection_id = None
+        for name in self.unsaved_tags:
+            self.tags.pop(name, None)
+        self.commit_pending()
@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import numpy as np
+from sqlalchemy import delete, insert, or_, select
+
+from backend.infra.db import db
+from backend.infra.versions import versions
+from backend.models.bookmark import Bookmark
+from backend.models.neighbor import BookmarkNeighbor
+
+
+def top_neighbors(matrix, start, stop, k):
+    """
+    (rows, scores), each (stop - start, k): the k rows of the unit-length
+    `matrix` most similar to rows start..stop, best first, never the row
+    itself. k must be below the row count.
+    """
+    scores = matrix[start:stop] @ matrix.T
+    scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class NeighborService:
+    """
+    Precomputed "related bookmarks" lists: the top `k` bookmarks by cosine
+    similarity of their stored embeddings, kept in `bookmark_neighbor`.
+    Lists are updated incrementally as vectors are stored or bookmarks
+    deleted, and rebuilt exactly by backend.jobs.build_neighbors. NEIGHBOR_COUNT=0
+    turns the incremental updates off.
+    """
+
+    def __init__(self, bookmark_service, k=None):
+        self.bookmark_service = bookmark_service
+        self.k = k if k is not None else int(os.environ.get('NEIGHBOR_COUNT', 20))
+
+    def similar(self, bookmark_id, limit=10):
+        """
+        [(bookmark, score)] best first, or None if the bookmark does not
+        exist. A bookmark without a stored list yet (embedded before the
+        first rebuild) is answered from the search index with its stored
+        vector; neither path calls the embedding provider.
+        """
+        if db.session.get(Bookmark, bookmark_id) is None:
+            return None
+        rows = db.session.query(Bookmark, BookmarkNeighbor.score).join(
+            BookmarkNeighbor, BookmarkNeighbor.neighbor_id == Bookmark.id
+        ).filter(BookmarkNeighbor.bookmark_id == bookmark_id).order_by(
+            BookmarkNeighbor.score.desc(), Bookmark.id
+        ).limit(limit).all()
+        if rows:
+            return [(bm, score) for bm, score in rows]
+        vector = self.bookmark_service.stored_vector(bookmark_id)
+        if vector is None:
+            return []
+        hits = self._search(bookmark_id, vector, limit)
+        by_id = {bm.id: bm for bm in Bookmark.query.filter(Bookmark.id.in_([bm_id for bm_id, _ in hits]))}
+        return [(by_id[bm_id], score) for bm_id, score in hits if bm_id in by_id]
+
+    def _search(self, bookmark_id, vector, k):
+        service = self.bookmark_service
+        service._ensure_index()
+        return [(bm_id, score) for bm_id, score in service.index.search(vector, k + 1) if bm_id != bookmark_id][:k]
+
+    def refresh(self, vectors):
+        """
+        Update the lists after the (bookmark_id, vector) pairs were stored:
+        each bookmark gets its top k from the search index, and joins the
+        lists of those neighbours if it beats their weakest entry. Lists that
+        pointed at an old vector of these bookmarks drop that entry until the
+        next rebuild.
+        """
+        if not self.k or not vectors:
+            return
+        own = {bm_id: self._search(bm_id, vector, self.k) for bm_id, vector in vectors}
+        table = BookmarkNeighbor.__table__
+        candidates = {neighbor_id for hits in own.values() for neighbor_id, _ in hits} - set(own)
+        # Neighbours without a list yet are left to the rebuild (and to similar()'s fallback).
+        lists = {}
+        for row in db.session.execute(select(table).where(table.c.bookmark_id.in_(candidates))):
+            entries = lists.setdefault(row.bookmark_id, {})
+            if row.neighbor_id not in own:
+                entries[row.neighbor_id] = row.score
+        for bm_id, hits in own.items():
+            for neighbor_id, score in hits:
+                if neighbor_id in lists:
+                    lists[neighbor_id][bm_id] = score
+        lists.update((bm_id, dict(hits)) for bm_id, hits in own.items())
+        rows = [
+            {'bookmark_id': bm_id, 'neighbor_id': neighbor_id, 'score': score}
+            for bm_id, entries in lists.items()
+            for neighbor_id, score in sorted(entries.items(), key=lambda entry: -entry[1])[:self.k]
+        ]
+        db.session.execute(delete(table).where(or_(
+            table.c.bookmark_id.in_(list(lists)),
+            table.c.neighbor_id.in_(list(own)),
+        )))
+        if rows:
+            db.session.execute(insert(table), rows)
+        db.session.commit()
+        versions.bump('bookmarks')
+
+    @staticmethod
+    def forget(bookmark_ids):
+        """Drop the deleted bookmarks' lists and their entries in other lists; part of the caller's transaction."""
+        table = BookmarkNeighbor.__table__
+        db.session.execute(delete(table).where(or_(
+            table.c.bookmark_id.in_(bookmark_ids),
+            table.c.neighbor_id.in_(bookmark_ids),
+        )))
+
+    def rebuild(self, chunk_size=None, workers=None, log=print):
+        """
+        Recompute every list exactly. Rows are scored against the whole
+        matrix in chunks on `workers` threads (matmul and argpartition run
+        outside the GIL); each chunk's lists are replaced in their own
+        transaction, so reads keep being served throughout.
+        """
+        started = time.perf_counter()
+        ids, matrix = self.bookmark_service.stored_matrix()
+        n = len(ids)
+        k = min(self.k, n - 1)
+        table = BookmarkNeighbor.__table__
+        # Enough rows per chunk for a ~64 MB score block.
+        chunk_size = chunk_size or max(1, min(1024, (16 << 20) // max(n, 1)))
+        workers = workers or os.cpu_count() or 1
+        written = 0
+        if k > 0:
+            chunks = range(0, n, chunk_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='neighbors') as pool:
+                results = pool.map(lambda start: (start, *top_neighbors(matrix, start, min(start + chunk_size, n), k)), chunks)
+                for start, top, scores in results:
+                    chunk_ids = ids[start:start + top.shape[0]]
+                    db.session.execute(delete(table).where(table.c.bookmark_id.in_(chunk_ids.tolist())))
+                    db.session.execute(insert(table), [
+                        {'bookmark_id': bm_id, 'neighbor_id': neighbor_id, 'score': score}
+                        for bm_id, neighbor_ids, neighbor_scores in zip(chunk_ids.tolist(), ids[top].tolist(), scores.tolist())
+                        for neighbor_id, score in zip(neighbor_ids, neighbor_scores)
+                    ])
+                    db.session.commit()
+                    written += top.size
+                    log(f"neighbors for {start + top.shape[0]}/{n} bookmarks")
+        # Lists of bookmarks deleted, or left without a current vector, since.
+        embedded = select(Bookmark.id).where(
+            Bookmark.embedding.isnot(None),
+            Bookmark.embedding_model == self.bookmark_service.embedding_model,
+        )
+        db.session.execute(delete(table).where(table.c.bookmark_id.notin_(embedded)))
+        db.session.commit()
+        versions.bump('bookmarks')
+        return {'bookmarks': n, 'neighbors': written, 'seconds': round(time.perf_counter() - started, 3)}
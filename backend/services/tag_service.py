@@ -1,7 +1,10 @@
 
 
 from backend.infra.db import db
+from backend.infra.cache import LRUCache
+from backend.infra.versions import versions
 from backend.models.tags import Tag
+import os
 import random
 
 DEFAULT_COLORS = [
@@ -23,6 +26,62 @@ DEFAULT_COLORS = [
 ]
 
 
+class TagCache:
+    """
+    Process-wide id -> name and name -> id lookups for tags. Misses are
+    resolved with a single IN query; TagService writes clear the cache, and
+    the TTL bounds how long a rename or delete made by another process can
+    go unnoticed.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        maxsize = maxsize or int(os.environ.get('TAG_CACHE_SIZE', 4096))
+        ttl = ttl if ttl is not None else float(os.environ.get('TAG_CACHE_TTL', 30))
+        self._by_id = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._by_name = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def _remember(self, tag_id, name):
+        self._by_id.set(tag_id, name)
+        self._by_name.set(name, tag_id)
+
+    def existing_ids(self, tag_ids):
+        """The ids in `tag_ids` that belong to a tag, deduplicated, in request order."""
+        wanted = list(dict.fromkeys(tag_id for tag_id in tag_ids if tag_id is not None))
+        found = {tag_id for tag_id in wanted if self._by_id.get(tag_id) is not None}
+        missing = [tag_id for tag_id in wanted if tag_id not in found]
+        if missing:
+            for tag_id, name in db.session.query(Tag.id, Tag.name).filter(Tag.id.in_(missing)):
+                self._remember(tag_id, name)
+                found.add(tag_id)
+        return [tag_id for tag_id in wanted if tag_id in found]
+
+    def ids_for_names(self, names):
+        """{name: id} for the names that belong to a tag."""
+        found = {}
+        missing = []
+        for name in dict.fromkeys(names):
+            tag_id = self._by_name.get(name)
+            if tag_id is None:
+                missing.append(name)
+            else:
+                found[name] = tag_id
+        if missing:
+            for tag_id, name in db.session.query(Tag.id, Tag.name).filter(Tag.name.in_(missing)):
+                self._remember(tag_id, name)
+                found[name] = tag_id
+        return found
+
+    def invalidate(self):
+        self._by_id.clear()
+        self._by_name.clear()
+
+    def stats(self):
+        return {'ids': self._by_id.stats(), 'names': self._by_name.stats()}
+
+
+tag_cache = TagCache()
+
+
 class TagService:
     def get_all(self):
         return Tag.query.all()
@@ -38,6 +97,8 @@ class TagService:
         tag = Tag(name=name, color=color)
         db.session.add(tag)
         db.session.commit()
+        tag_cache.invalidate()
+        versions.bump('tags')
         return tag
 
     def update(self, tag_id, name=None, color=None):
@@ -49,6 +110,9 @@ class TagService:
         if color:
             tag.color = color
         db.session.commit()
+        tag_cache.invalidate()
+        # Bookmarks list their tags by name.
+        versions.bump('tags', 'bookmarks')
         return tag
 
     def delete(self, tag_id):
@@ -57,4 +121,6 @@ class TagService:
             return False
         db.session.delete(tag)
         db.session.commit()
+        tag_cache.invalidate()
+        versions.bump('tags', 'bookmarks', 'memberships')
         return True
\ No newline at end of file
@@ -1,17 +1,37 @@
 # tests/conftest.py
+import hashlib
+import os
+from contextlib import contextmanager
+from types import SimpleNamespace
 from typing import Collection
+
+# Never talk to a real database, OpenAI or a background thread from tests.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('API_KEY', 'test-key')
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+
+import numpy as np
+from sqlalchemy import event
 from backend.infra.db import db
+from backend.infra.embedding_providers import OpenAIEmbeddings
+from backend.infra.versions import versions
 from backend.models.bookmark import Bookmark
 from backend.models.tags import Tag
 from backend.services.bookmark_service import BookmarkService
 from backend.services.collection_service import CollectionService
 from backend.services.collection_service import CollectionService
 from backend.services.favorite_service import FavoriteService
-from backend.services.tag_service import TagService
+from backend.services.tag_service import TagService, tag_cache
+from backend.services.import_service import ImportService
+from backend.services.batch_service import BatchService
+from backend.services.duplicate_service import DuplicateService
 import pytest
 from mockito import mock, when, verify, unstub, ANY
 from datetime import datetime
 
+# The mock_session fixture swaps db.session out; app-backed tests put this back.
+_real_session = db.session
+
 @pytest.fixture
 def mock_session():
     """Mock SQLAlchemy session for all services"""
@@ -49,7 +69,7 @@ def mock_openai_client():
 @pytest.fixture
 def bookmark_service(mock_session, mock_openai_client):
     service = BookmarkService()
-    service.openai_client = mock_openai_client
+    service.embedder = OpenAIEmbeddings(client=mock_openai_client)
     db.session = mock_session  
     yield service
     unstub()
@@ -96,4 +116,93 @@ def sample_collection():
 
 @pytest.fixture
 def sample_tag():
-    return Tag(id=5, name="python", color="blue-500")
\ No newline at end of file
+    return Tag(id=5, name="python", color="blue-500")
+
+
+class FakeEmbeddings:
+    """Stands in for `OpenAI().embeddings`: deterministic vectors, one per input text."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+        self.failures = []
+
+    def vector(self, text):
+        seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=self.dim).tolist()
+
+    def create(self, model, input, timeout=None):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.calls.append(texts)
+        if self.failures:
+            raise self.failures.pop(0)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=self.vector(text)) for i, text in enumerate(texts)
+        ])
+
+
+@pytest.fixture
+def fake_embeddings():
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path, fake_embeddings):
+    """The real Flask app on a fresh in-memory SQLite database with a fresh BookmarkService."""
+    from backend.api import app as app_module
+    from backend.services.embedding_worker import EmbeddingWorker
+
+    service = BookmarkService()
+    service.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=fake_embeddings))
+    worker = EmbeddingWorker(app_module.app, service, batch_size=64, concurrency=1, backoff=0)
+    service.worker = worker
+    monkeypatch.setattr(app_module, 'bookmark_service', service)
+    monkeypatch.setattr(app_module, 'embedding_worker', worker)
+    # Services that write bookmarks keep their indexes in step through the BookmarkService.
+    monkeypatch.setattr(app_module, 'favorite_service', FavoriteService(service))
+    monkeypatch.setattr(app_module, 'import_service', ImportService(service))
+    monkeypatch.setattr(app_module, 'batch_service', BatchService(service))
+    monkeypatch.setattr(app_module, 'duplicate_service', DuplicateService(service))
+    monkeypatch.setattr(db, 'session', _real_session)
+    tag_cache.invalidate()
+    versions.open(str(tmp_path / 'versions'))
+
+    with app_module.app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app_module.app
+        db.session.remove()
+
+
+@pytest.fixture
+def reading_service(app):
+    """The app's BookmarkService with one collection, "Reading" (id 1), to save bookmarks into."""
+    from backend.api import app as app_module
+    from backend.models.collection import Collection
+
+    db.session.add(Collection(name="Reading", icon="rocket", color="#3B82F6"))
+    db.session.commit()
+    return app_module.bookmark_service
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """`with count_queries() as statements:` records every SQL statement sent to the database."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return counter
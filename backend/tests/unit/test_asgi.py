@@ -0,0 +1,194 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from backend.api import app as app_module
+from backend.api import asgi
+from backend.infra.async_db import async_database_url, create_session_factory
+from backend.infra.db import db
+from backend.infra.embedding_providers import OpenAIEmbeddings
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.services.async_bookmark_service import AsyncBookmarkService
+
+
+class _FlaskSessions:
+    """async_sessionmaker stand-in over the test's Flask session, so the async paths run without an async driver."""
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, ident):
+        return db.session.get(model, ident)
+
+    async def scalars(self, statement):
+        return db.session.scalars(statement)
+
+    async def execute(self, statement, params=None):
+        return db.session.execute(statement, params)
+
+    async def commit(self):
+        db.session.commit()
+
+
+class _AsyncEmbeddings:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    async def create(self, **kwargs):
+        return self.embeddings.create(**kwargs)
+
+
+async def _inline(fn, *args):
+    return fn(*args)
+
+
+def _call(app, method, path, query='', headers=()):
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('test', 80), 'client': ('test', 1), 'root_path': '',
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    headers = {name.decode(): value.decode() for name, value in start['headers']}
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], headers, body
+
+
+def _native_app():
+    app = asgi.AsyncApp(app_module.app, wsgi_threads=2)
+    app.routes = asgi.app.routes
+    service = app_module.bookmark_service
+    service.embedder = OpenAIEmbeddings(client=service.embedder.client, async_client=SimpleNamespace(
+        embeddings=_AsyncEmbeddings(service.embedder.client.embeddings)))
+    app.bookmarks = AsyncBookmarkService(app_module.bookmark_service, _FlaskSessions(), _inline)
+    return app
+
+
+def _seed():
+    db.session.add(Collection(name="c", icon="rocket", color="#3B82F6"))
+    db.session.commit()
+    service = app_module.bookmark_service
+    for title in ("python asyncio guide", "sourdough bread", "python packaging"):
+        service.create(title, f"https://example.com/{title.replace(' ', '-')}", "", 1, [])
+    app_module.embedding_worker.drain()
+
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert async_database_url("sqlite:////tmp/x.db") == "sqlite+aiosqlite:////tmp/x.db"
+    assert async_database_url("postgresql+asyncpg://h/db") == "postgresql+asyncpg://h/db"
+
+
+def test_native_search_matches_the_flask_route(app, client, monkeypatch):
+    _seed()
+    native = _native_app()
+    for mode in ('lexical', 'semantic', 'hybrid'):
+        status, headers, body = _call(native, 'GET', '/bookmarks/search', f'q=python&mode={mode}')
+        assert status == 200
+        assert 'app;dur=' in headers['server-timing']
+        expected = client.get(f'/bookmarks/search?q=python&mode={mode}').get_json()
+        assert json.loads(body) == expected
+    assert _call(native, 'GET', '/bookmarks/search', 'q=python&mode=nope')[0] == 400
+
+
+def test_native_search_takes_filters(app, client, monkeypatch):
+    _seed()
+    db.session.add(Collection(name="d", icon="rocket", color="#3B82F6"))
+    db.session.commit()
+    app_module.bookmark_service.create("python in collection d", "https://example.com/d", "", 2, [])
+    native = _native_app()
+    for query in ('q=python&mode=lexical&collection_id=2', 'q=python&mode=hybrid&favorite=false&collection_id=1'):
+        status, _, body = _call(native, 'GET', '/bookmarks/search', query)
+        assert status == 200
+        assert json.loads(body) == client.get(f'/bookmarks/search?{query}').get_json()
+    titles = [bm['title'] for bm in json.loads(body)]
+    assert "python in collection d" not in titles and {"python asyncio guide", "python packaging"} <= set(titles)
+    assert _call(native, 'GET', '/bookmarks/search', 'q=python&created_after=yesterday')[0] == 400
+
+
+def test_native_search_falls_back_to_lexical_when_embedding_times_out(app, monkeypatch):
+    _seed()
+    native = _native_app()
+    service = app_module.bookmark_service
+    service.query_embedding_timeout = 0.01
+
+    async def slow(text, timeout=None):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(service.embedder, 'embed_async', slow)
+    status, _, body = _call(native, 'GET', '/bookmarks/search', 'q=bread&mode=hybrid')
+    assert status == 200
+    assert [bm['title'] for bm in json.loads(body)] == ["sourdough bread"]
+    assert service._embedding_down_until > 0
+
+
+def test_native_bookmark_read_shares_etags_with_flask(app, client, monkeypatch):
+    _seed()
+    native = _native_app()
+    status, headers, body = _call(native, 'GET', '/bookmarks/1')
+    assert status == 200
+    assert json.loads(body)['title'] == "python asyncio guide"
+    flask_etag = client.get('/bookmarks/1').headers['ETag']
+    assert headers['etag'] == flask_etag
+    assert _call(native, 'GET', '/bookmarks/1', headers=[('If-None-Match', flask_etag)])[0] == 304
+    assert _call(native, 'GET', '/bookmarks/99')[0] == 404
+
+
+def test_native_favorites_and_wsgi_fallback(app, client, monkeypatch):
+    _seed()
+    native = _native_app()
+    status, headers, body = _call(native, 'POST', '/favorites/2', headers=[('Origin', 'http://localhost:3000')])
+    assert status == 200 and json.loads(body)['isFavorite'] is True
+    assert headers['access-control-allow-origin'] == 'http://localhost:3000'
+    assert [bm['id'] for bm in client.get('/favorites').get_json()] == [2]
+
+    # Routes without a native handler are served by the Flask app.
+    status, _, body = _call(native, 'GET', '/collections')
+    assert status == 200
+    assert json.loads(body)[0]['count'] == 3
+    assert _call(native, 'DELETE', '/favorites/2')[0] == 200
+    assert _call(native, 'DELETE', '/favorites/99')[0] == 404
+
+
+def test_async_sessions_read_and_write(tmp_path):
+    pytest.importorskip('aiosqlite')
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Collection.__table__).values(id=1, name="c", icon="rocket", color="#3B82F6"))
+        conn.execute(insert(Bookmark.__table__).values(id=1, title="t", url="https://t", description="", collection_id=1))
+
+    async def scenario():
+        async_engine, sessions = create_session_factory(url)
+        service = AsyncBookmarkService(app_module.bookmark_service, sessions, None)
+        try:
+            assert (await service.get_by_id(1)).to_dict()['tags'] == []
+            assert (await service.set_favorite(1, True)).is_favorite is True
+            assert await service.set_favorite(2, True) is None
+            return [bm.id for bm in await service.get_many_ordered([3, 1])]
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(scenario()) == [1]
+    with engine.connect() as conn:
+        assert conn.execute(Bookmark.__table__.select()).one().is_favorite is True
@@ -0,0 +1,111 @@
+import pytest
+
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.counter_service import CounterService
+
+
+def _seed(n):
+    db.session.add_all([
+        Collection(name="a", icon="rocket", color="#3B82F6"),
+        Collection(name="b", icon="rocket", color="#3B82F6"),
+        Tag(name="x", color="#3B82F6"),
+        Tag(name="y", color="#3B82F6"),
+    ])
+    db.session.commit()
+    service = app_module.bookmark_service
+    return [service.create(f"b{i}", f"https://example.com/{i}", "", 1, [1] if i % 2 else []).id for i in range(n)]
+
+
+def _drift():
+    report = CounterService().reconcile(fix=False)
+    return report['collections'] + report['tags']
+
+
+@pytest.mark.parametrize('n', [3, 60])
+def test_statement_count_does_not_grow_with_ids(client, count_queries, n):
+    ids = _seed(n)
+    calls = [
+        ('/bookmarks/batch/favorite', {'ids': ids}),
+        ('/bookmarks/batch/move', {'ids': ids, 'collection_id': 2}),
+        ('/bookmarks/batch/tags', {'ids': ids, 'add': [2], 'remove': [1]}),
+        ('/bookmarks/batch/delete', {'ids': ids}),
+    ]
+    for path, body in calls:
+        with count_queries() as statements:
+            response = client.post(path, json=body)
+        assert response.status_code == 200
+        assert response.get_json()['counts'] == {'ok': n}
+        assert len(statements) <= 8, (path, statements)
+
+
+def test_results_report_each_id(client):
+    ids = _seed(3)
+    response = client.post('/bookmarks/batch/favorite', json={'ids': [ids[0], 99, ids[0]]})
+    assert response.get_json() == {'results': {str(ids[0]): 'ok', '99': 'not_found'}, 'counts': {'ok': 1, 'not_found': 1}}
+    results = client.post('/bookmarks/batch/favorite', json={'ids': ids}).get_json()['results']
+    assert results == {str(ids[0]): 'unchanged', str(ids[1]): 'ok', str(ids[2]): 'ok'}
+    assert sorted(bm['id'] for bm in client.get('/favorites').get_json()) == ids
+
+    results = client.post('/bookmarks/batch/unfavorite', json={'ids': ids[:2]}).get_json()['results']
+    assert set(results.values()) == {'ok'}
+    assert sorted(bm['id'] for bm in client.get('/favorites').get_json()) == ids[2:]
+
+
+def test_moves_and_tags_keep_counters(client):
+    ids = _seed(4)
+    results = client.post('/bookmarks/batch/move', json={'ids': ids[:3], 'collection_id': 2}).get_json()['results']
+    assert set(results.values()) == {'ok'}
+    assert client.post('/bookmarks/batch/move', json={'ids': ids, 'collection_id': 2}).get_json()['counts'] == {
+        'ok': 1, 'unchanged': 3}
+    assert _drift() == []
+
+    # Bookmarks 2 and 4 already carry tag 1; only the others gain it.
+    results = client.post('/bookmarks/batch/tags', json={'ids': ids, 'add': [1, 2]}).get_json()['results']
+    assert set(results.values()) == {'ok'}
+    results = client.post('/bookmarks/batch/tags', json={'ids': ids[:2], 'remove': [2]}).get_json()['results']
+    assert set(results.values()) == {'ok'}
+    assert client.post('/bookmarks/batch/tags', json={'ids': ids[:2], 'remove': [2]}).get_json()['counts'] == {
+        'unchanged': 2}
+    assert _drift() == []
+    db.session.expire_all()
+    assert {bm.id: sorted(tag.name for tag in bm.tags) for bm in Bookmark.query.all()} == {
+        ids[0]: ['x'], ids[1]: ['x'], ids[2]: ['x', 'y'], ids[3]: ['x', 'y']}
+
+
+def test_delete_updates_counters_and_search(client):
+    ids = _seed(4)
+    service = app_module.bookmark_service
+    assert [bm.id for bm in service.search_by_query("b1", mode='lexical')][:1] == [ids[1]]
+    results = client.post('/bookmarks/batch/delete', json={'ids': [ids[1], ids[2], 99]}).get_json()['results']
+    assert results == {str(ids[1]): 'ok', str(ids[2]): 'ok', '99': 'not_found'}
+    assert _drift() == []
+    assert ids[1] not in [bm.id for bm in service.search_by_query("b1", mode='lexical')]
+    assert sorted(bm['id'] for bm in client.get('/bookmarks').get_json()) == [ids[0], ids[3]]
+    db.session.expire_all()
+    assert {c.name: c.count for c in Collection.query.all()} == {'a': 2, 'b': 0}
+
+
+@pytest.mark.parametrize('path,body', [
+    ('/bookmarks/batch/favorite', {'ids': []}),
+    ('/bookmarks/batch/favorite', {'ids': ['1']}),
+    ('/bookmarks/batch/favorite', [1, 2]),
+    ('/bookmarks/batch/move', {'ids': [1], 'collection_id': 99}),
+    ('/bookmarks/batch/tags', {'ids': [1]}),
+    ('/bookmarks/batch/tags', {'ids': [1], 'add': [1], 'remove': [1]}),
+    ('/bookmarks/batch/tags', {'ids': [1], 'add': [99]}),
+])
+def test_rejects_bad_requests(client, path, body):
+    _seed(1)
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_rejects_too_many_ids(client, monkeypatch):
+    monkeypatch.setattr(app_module.batch_service, 'max_ids', 2)
+    response = client.post('/bookmarks/batch/delete', json={'ids': [1, 2, 3]})
+    assert response.status_code == 400
@@ -0,0 +1,37 @@
+from backend.api import app as app_module
+from backend.benchmarks.suite import compare
+from backend.benchmarks.synthetic import generate, library_texts
+from backend.infra.db import db
+from backend.models.bookmark import EMBEDDING_READY, Bookmark, bookmark_tags
+from backend.services.counter_service import CounterService
+
+
+def test_library_texts_are_deterministic():
+    assert library_texts(50, seed=3) == library_texts(50, seed=3)
+    assert library_texts(50, seed=3) != library_texts(50, seed=4)
+
+
+def test_generate_builds_an_embedded_library_with_consistent_counters(app):
+    service = app_module.bookmark_service
+    generate(service, 300, collections=7, tags=20, tags_per_bookmark=3, batch_size=128, log=lambda *_: None)
+
+    assert Bookmark.query.count() == 300
+    assert Bookmark.query.filter(Bookmark.embedding_status != EMBEDDING_READY).count() == 0
+    assert db.session.query(bookmark_tags).count() == 900
+    report = CounterService().reconcile(fix=False)
+    assert not report['collections'] and not report['tags']
+
+    bm = service.create("after", "https://after.example", "", 1, [])
+    assert bm.id == 301
+    assert service.search_by_query(library_texts(300)[0][0], mode='lexical')
+
+
+def _report(**scenarios):
+    return {'scenarios': {name: {'p50_ms': p50, 'queries': queries} for name, (p50, queries) in scenarios.items()}}
+
+
+def test_compare_flags_latency_and_query_regressions():
+    baseline = _report(search=(10.0, 2), listing=(10.0, 2), tags=(10.0, 1), noise=(0.2, 1), gone=(1.0, 1))
+    current = _report(search=(14.0, 2), listing=(5.0, 2), tags=(10.0, 3), noise=(0.4, 1), new=(1.0, 1))
+    statuses = {row[0]: row[4] for row in compare(current, baseline, threshold=0.25, min_delta_ms=0.5)}
+    assert statuses == {'search': 'regression', 'listing': 'improved', 'tags': 'regression', 'noise': 'ok'}
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+import sqlalchemy as sa
+
+from backend.infra import embedding_codec
+from backend.migrations import binary_embeddings
+
+
+@pytest.fixture
+def legacy_engine():
+    engine = sa.create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            'CREATE TABLE bookmark (id INTEGER PRIMARY KEY, title VARCHAR(255), embedding JSON)'
+        ))
+        conn.execute(sa.text('INSERT INTO bookmark (id, title, embedding) VALUES (:id, :title, :embedding)'), [
+            {'id': 1, 'title': 'a', 'embedding': json.dumps(json.dumps([0.5, 0.25]))},
+            {'id': 2, 'title': 'b', 'embedding': json.dumps([1.0, 2.0])},
+            {'id': 3, 'title': 'c', 'embedding': None},
+            {'id': 4, 'title': 'd', 'embedding': json.dumps('not a vector')},
+        ])
+    return engine
+
+
+def test_migrate_converts_in_batches(legacy_engine):
+    converted, skipped = binary_embeddings.migrate(legacy_engine, batch_size=1, log=lambda msg: None)
+    assert (converted, skipped) == (2, 1)
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(sa.text(
+            'SELECT id, embedding, embedding_dim, embedding_model FROM bookmark ORDER BY id'
+        )).all()
+    assert embedding_codec.unpack(rows[0][1], rows[0][2]).tolist() == [0.5, 0.25]
+    assert embedding_codec.unpack(rows[1][1], rows[1][2]).tolist() == [1.0, 2.0]
+    assert rows[0][3] == binary_embeddings.LEGACY_MODEL
+    assert rows[2][1] is None
+
+
+def test_migrate_is_resumable(legacy_engine):
+    binary_embeddings.migrate(legacy_engine, log=lambda msg: None)
+    assert binary_embeddings.migrate(legacy_engine, drop_legacy=True, log=lambda msg: None) == (0, 1)
+    columns = {col['name'] for col in sa.inspect(legacy_engine).get_columns('bookmark')}
+    assert 'embedding_json' not in columns
+    assert {'embedding', 'embedding_dim', 'embedding_model'} <= columns
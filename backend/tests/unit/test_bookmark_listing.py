@@ -0,0 +1,79 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def library(app):
+    cols = [Collection(name=f"c{i}", icon="rocket", color="#3B82F6") for i in range(2)]
+    tag = Tag(name="python", color="#3B82F6")
+    db.session.add_all(cols + [tag])
+    db.session.flush()
+    for i in range(25):
+        db.session.add(Bookmark(
+            title=f"b{i}", url=f"https://example.com/{i}", description="",
+            collection_id=cols[i % 2].id, is_favorite=i % 3 == 0,
+            # pairs of rows share a timestamp so the id tie-break matters
+            created_at=START + timedelta(days=i // 2),
+            tags=[tag] if i % 5 == 0 else [],
+        ))
+    db.session.commit()
+    return cols, tag
+
+
+def _walk(client, query):
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f"/bookmarks?limit=4{query}" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).get_json()
+        ids += [bm['id'] for bm in page['items']]
+        pages += 1
+        cursor = page['nextCursor']
+        if not cursor:
+            return ids, pages
+
+
+def _expected(predicate=lambda bm: True):
+    rows = [bm for bm in Bookmark.query.all() if predicate(bm)]
+    rows.sort(key=lambda bm: (bm.created_at, bm.id), reverse=True)
+    return [bm.id for bm in rows]
+
+
+def test_keyset_pages_cover_everything_once(client, library):
+    ids, pages = _walk(client, "")
+    assert ids == _expected()
+    assert pages == 7
+
+
+def test_filters(client, library):
+    cols, tag = library
+    assert _walk(client, f"&collection_id={cols[1].id}")[0] == _expected(lambda bm: bm.collection_id == cols[1].id)
+    assert _walk(client, f"&tag_id={tag.id}")[0] == _expected(lambda bm: tag in bm.tags)
+    assert _walk(client, "&favorite=true")[0] == _expected(lambda bm: bm.is_favorite)
+    after, before = START + timedelta(days=3), START + timedelta(days=6)
+    assert _walk(client, f"&created_after={after.isoformat()}&created_before={before.isoformat()}")[0] == \
+        _expected(lambda bm: after <= bm.created_at < before)
+
+
+def test_bad_cursor_is_rejected(client, library):
+    assert client.get('/bookmarks?cursor=garbage').status_code == 400
+
+
+def test_ndjson_stream(client, library):
+    response = client.get('/bookmarks?format=ndjson&favorite=false')
+    assert response.mimetype == 'application/x-ndjson'
+    ids = [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()]
+    assert ids == _expected(lambda bm: not bm.is_favorite)
+
+
+def test_unpaginated_list_streams_a_json_array(client, library):
+    assert [bm['id'] for bm in client.get('/bookmarks').get_json()] == _expected()
+    assert [bm['id'] for bm in client.get('/favorites').get_json()] == _expected(lambda bm: bm.is_favorite)
@@ -1,5 +1,4 @@
 # tests/unit/test_bookmark_service.py
-import json
 import pytest
 from mockito import when, verify, any as ANY_
 
@@ -25,12 +24,11 @@ def test_create_bookmark_success(bookmark_service, mock_openai_client, mock_sess
     assert bookmark.is_favorite is True
     assert len(bookmark.tags) == 1
     assert bookmark.collection_id == 1
-    assert json.loads(bookmark.embedding) == [0.01, 0.02, 0.03, 0.04]
+    # Embedding is computed later by the EmbeddingWorker
+    assert bookmark.embedding_status == "pending"
+    assert bookmark.embedding is None
 
-    verify(mock_openai_client.embeddings).create(
-        model="text-embedding-ada-002",
-        input="My Article Great article about testing"
-    )
+    verify(mock_openai_client.embeddings, times=0).create(model=ANY_, input=ANY_)
     verify(mock_session).add(ANY_)
     verify(mock_session).commit()
 
@@ -48,7 +46,7 @@ def test_create_bookmark_collection_not_found(bookmark_service, mock_session):
         )
 
 
-def test_update_bookmark_partial(bookmark_service, mock_session, sample_bookmark):
+def test_update_bookmark_partial(bookmark_service, mock_openai_client, mock_session, sample_bookmark):
     when(mock_session.query(Bookmark)).get(100).thenReturn(sample_bookmark)
 
     updated = bookmark_service.update(
@@ -59,7 +57,8 @@ def test_update_bookmark_partial(bookmark_service, mock_session, sample_bookmark
 
     assert updated.title == "Updated Title"
     assert updated.description == "New desc"
-    verify(mock_openai_client.embeddings).create(...)
+    assert updated.embedding_status == "pending"
+    verify(mock_openai_client.embeddings, times=0).create(model=ANY_, input=ANY_)
 
 
 def test_update_bookmark_not_found(bookmark_service, mock_session):
@@ -0,0 +1,87 @@
+import pytest
+
+from backend.infra.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_and_misses_are_counted():
+    cache = LRUCache(maxsize=2)
+    assert cache.get('a') is None
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set('a', 1)
+    clock.now = 4.9
+    assert cache.get('a') == 1
+    clock.now = 5.1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_a_repeated_query_is_embedded_once(reading_service, fake_embeddings):
+    reading_service.create("Python profiling", "https://a", "", 1, [])
+    reading_service.worker.drain()
+    reading_service.search_by_query("Python profiling", mode='semantic')
+
+    # A write misses the result cache, but the query's vector is reused.
+    reading_service.create("Cake", "https://b", "", 1, [])
+    reading_service.worker.drain()
+    calls = len(fake_embeddings.calls)
+    reading_service.search_by_query("  python   PROFILING ", mode='semantic')
+    assert len(fake_embeddings.calls) == calls
+    assert reading_service.query_cache.stats()['hits'] == 1
+
+
+def test_a_repeated_search_is_served_from_the_result_cache(reading_service, monkeypatch):
+    bm = reading_service.create("Python profiling", "https://a", "", 1, [])
+    reading_service.worker.drain()
+    assert [b.id for b in reading_service.search_by_query("profiling", mode='hybrid')] == [bm.id]
+
+    def rank_ids(*args):
+        raise AssertionError("ranked again")
+
+    monkeypatch.setattr(reading_service, '_rank_ids', rank_ids)
+    assert [b.id for b in reading_service.search_by_query("Profiling", mode='hybrid')] == [bm.id]
+    assert reading_service.result_cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('write,expected', [
+    (lambda service, ids: service.create("Zebra notes", "https://c", "", 1, []), 2),
+    (lambda service, ids: service.update(ids[1], title="Zebra sightings"), 2),
+    (lambda service, ids: service.delete(ids[0]), 0),
+], ids=['create', 'update', 'delete'])
+def test_writes_invalidate_cached_results(reading_service, write, expected):
+    ids = [reading_service.create(title, url, "", 1, []).id
+           for title, url in [("Zebra facts", "https://a"), ("Cake", "https://b")]]
+    assert len(reading_service.search_by_query("zebra", mode='lexical')) == 1
+    generation = reading_service.generation
+
+    write(reading_service, ids)
+    assert reading_service.generation > generation
+    assert len(reading_service.search_by_query("zebra", mode='lexical')) == expected
+    assert reading_service.result_cache.stats()['hits'] == 0
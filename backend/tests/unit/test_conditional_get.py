@@ -0,0 +1,97 @@
+from backend.api import app as app_module
+from backend.infra.cache import LRUCache
+from backend.infra.db import db
+from backend.infra.versions import VersionCounters
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.collection_service import CollectionService
+from backend.services.favorite_service import FavoriteService
+from backend.services.tag_service import TagService
+
+
+def _seed():
+    db.session.add(Collection(name="c", icon="rocket", color="#3B82F6"))
+    db.session.add(Tag(name="t", color="#3B82F6"))
+    db.session.commit()
+    return app_module.bookmark_service.create("one", "https://1", "", 1, [1])
+
+
+def test_matching_etag_gets_304_without_queries(client, count_queries):
+    _seed()
+    first = client.get('/bookmarks?limit=10')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    with count_queries() as statements:
+        again = client.get('/bookmarks?limit=10', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert statements == []
+
+
+def test_etag_depends_on_path_and_query(client):
+    _seed()
+    a = client.get('/bookmarks?limit=10').headers['ETag']
+    b = client.get('/bookmarks?limit=20').headers['ETag']
+    c = client.get('/favorites?limit=10').headers['ETag']
+    assert len({a, b, c}) == 3
+    assert client.get('/bookmarks?limit=20', headers={'If-None-Match': a}).status_code == 200
+
+
+def test_writes_change_the_etag(client):
+    bm = _seed()
+    writes = [
+        ('/bookmarks?limit=10', lambda: FavoriteService().add(bm.id)),
+        ('/bookmarks?limit=10', lambda: app_module.bookmark_service.update(bm.id, title="renamed")),
+        ('/bookmarks?limit=10', lambda: TagService().update(1, name="t2")),
+        ('/collections', lambda: CollectionService().update(1, name="c2")),
+        ('/collections', lambda: app_module.bookmark_service.create("two", "https://2", "", 1, [])),
+        ('/tags', lambda: TagService().create("new", "#10B981")),
+    ]
+    for path, write in writes:
+        etag = client.get(path).headers['ETag']
+        write()
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == 200, path
+        assert response.headers['ETag'] != etag
+
+
+def test_untouched_resources_keep_their_etag(client):
+    bm = _seed()
+    etag = client.get('/collections').headers['ETag']
+    FavoriteService().add(bm.id)
+    assert client.get('/collections', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_response_cache_serves_rendered_body(client, monkeypatch, count_queries):
+    _seed()
+    monkeypatch.setattr(app_module, 'response_cache', LRUCache(maxsize=16))
+    first = client.get('/tags')
+    with count_queries() as statements:
+        second = client.get('/tags')
+    assert statements == []
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+
+    TagService().create("new", "#10B981")
+    assert len(client.get('/tags').get_json()) == 2
+
+
+def test_counters_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'versions')
+    a = VersionCounters().open(path)
+    b = VersionCounters().open(path)
+    before = b.etag(('bookmarks',))
+    a.bump('bookmarks')
+    assert b.snapshot('bookmarks')[1] == (1,)
+    assert b.etag(('bookmarks',)) != before
+    assert b.etag(('tags',)) == a.etag(('tags',))
+
+
+def test_recreated_file_gets_a_new_epoch(tmp_path):
+    path = str(tmp_path / 'versions')
+    counters = VersionCounters().open(path)
+    old = counters.etag(('tags',))
+    (tmp_path / 'versions').unlink()
+    assert counters.etag(('tags',)) != old
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.counter_service import CounterService
+
+
+@pytest.fixture
+def service(app):
+    db.session.add_all([
+        Collection(name="a", icon="rocket", color="#3B82F6"),
+        Collection(name="b", icon="rocket", color="#3B82F6"),
+        Tag(name="x", color="#3B82F6"),
+        Tag(name="y", color="#3B82F6"),
+    ])
+    db.session.commit()
+    return app_module.bookmark_service
+
+
+def _counts():
+    db.session.expire_all()
+    return (
+        {c.name: c.count for c in Collection.query.all()},
+        {t.name: t.count for t in Tag.query.all()},
+    )
+
+
+def test_create_update_delete_keep_counts(service):
+    first = service.create("one", "https://1", "", 1, [1, 2])
+    service.create("two", "https://2", "", 1, [1])
+    assert _counts() == ({'a': 2, 'b': 0}, {'x': 2, 'y': 1})
+
+    service.update(first.id, collection_id=2, tag_ids=[2])
+    assert _counts() == ({'a': 1, 'b': 1}, {'x': 1, 'y': 1})
+
+    service.update(first.id, title="renamed")
+    assert _counts() == ({'a': 1, 'b': 1}, {'x': 1, 'y': 1})
+
+    service.delete(first.id)
+    assert _counts() == ({'a': 1, 'b': 0}, {'x': 1, 'y': 0})
+    assert CounterService().reconcile(fix=False) == {'collections': [], 'tags': []}
+
+
+def test_import_keeps_counts(service, client):
+    body = "\n".join(json.dumps(row) for row in [
+        {'url': 'https://1', 'collection': 'a', 'tags': ['x', 'z']},
+        {'url': 'https://2', 'collection': 'new', 'tags': ['x']},
+    ])
+    client.post('/bookmarks/import?format=ndjson', data=body)
+    assert _counts() == ({'a': 1, 'b': 0, 'new': 1}, {'x': 2, 'y': 0, 'z': 1})
+
+
+def test_reconcile_reports_and_fixes_drift(service):
+    service.create("one", "https://1", "", 1, [1])
+    Collection.query.get(2).count = 7
+    Tag.query.get(1).count = None
+    db.session.commit()
+
+    report = CounterService().reconcile()
+    assert report == {
+        'collections': [{'id': 2, 'stored': 7, 'actual': 0}],
+        'tags': [{'id': 1, 'stored': None, 'actual': 1}],
+    }
+    assert _counts() == ({'a': 1, 'b': 0}, {'x': 1, 'y': 0})
+    assert CounterService().reconcile() == {'collections': [], 'tags': []}
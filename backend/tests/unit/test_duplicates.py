@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.infra.urls import normalize_url
+from backend.migrations import normalized_url
+from backend.models.bookmark import Bookmark
+from backend.services.duplicate_service import similar_pairs
+
+
+@pytest.mark.parametrize('url,expected', [
+    ("HTTPS://www.Example.com/a/?utm_source=x&b=2&a=1#top", "example.com/a?a=1&b=2"),
+    ("http://example.com:80/a", "example.com/a"),
+    ("https://example.com:8443/a/", "example.com:8443/a"),
+    ("https://example.com/?fbclid=abc", "example.com"),
+    ("example.com/a/", "example.com/a"),
+    ("https://app.example.com/#/inbox", "app.example.com#/inbox"),
+    ("mailto:someone@example.com", "mailto:someone@example.com"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 64, 1000])
+def test_similar_pairs_match_a_full_comparison(block_size):
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(60, 8)).astype(np.float32)
+    matrix[10] = matrix[3] + 0.01
+    matrix[41] = matrix[3]
+    matrix[59] = matrix[20]
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    a, b, scores = similar_pairs(matrix, 0.99, block_size)
+    found = sorted(zip(a.tolist(), b.tolist()))
+    full = matrix @ matrix.T
+    assert found == [(i, j) for i in range(60) for j in range(i + 1, 60) if full[i, j] >= 0.99]
+    assert found == [(3, 10), (3, 41), (10, 41), (20, 59)]
+    assert np.allclose(sorted(scores), sorted(full[i, j] for i, j in found))
+
+
+def test_create_rejects_a_saved_url_when_asked(reading_service, client):
+    first = reading_service.create("Page", "https://example.com/page", "", 1, [])
+    body = {'title': "Page again", 'url': "http://www.example.com/page/?utm_medium=mail", 'description': "",
+            'collection_id': 1, 'reject_duplicate': True}
+    response = client.post('/create-bookmark', json=body)
+    assert response.status_code == 409
+    assert response.get_json()['duplicateOf']['id'] == first.id
+    # Clients that do not ask keep saving duplicates as before.
+    assert client.post('/create-bookmark', json={**body, 'reject_duplicate': False}).status_code == 201
+    assert client.post('/create-bookmark', json={k: v for k, v in body.items() if k != 'reject_duplicate'}).status_code == 201
+    assert client.post('/create-bookmark', json={**body, 'url': "https://example.com/other"}).status_code == 201
+
+
+def test_scan_clusters_urls_and_content(reading_service, client):
+    a = reading_service.create("Tracking", "https://example.com/post?utm_source=feed", "", 1, [])
+    b = reading_service.create("Tracking too", "https://www.example.com/post/", "", 1, [])
+    c = reading_service.create("Same article", "https://mirror.one/x", "Long read", 1, [])
+    d = reading_service.create("Same article", "https://mirror.two/y", "Long read", 1, [])
+    e = reading_service.create("Unrelated", "https://elsewhere.org", "", 1, [])
+    reading_service.worker.drain()
+
+    report = app_module.duplicate_service.scan()
+    assert report['clusters'] == 2 and report['bookmarks'] == 4
+    clusters = client.get('/bookmarks/duplicates').get_json()['clusters']
+    by_members = {tuple(bm['id'] for bm in cluster['bookmarks']): cluster for cluster in clusters}
+    assert set(by_members) == {(a.id, b.id), (c.id, d.id)}
+    assert by_members[(a.id, b.id)]['reasons'] == ['url'] and by_members[(a.id, b.id)]['score'] is None
+    assert by_members[(c.id, d.id)]['reasons'] == ['content']
+    assert by_members[(c.id, d.id)]['score'] == pytest.approx(1.0)
+    assert e.id not in [bm['id'] for cluster in clusters for bm in cluster['bookmarks']]
+
+
+def test_clusters_page_and_drop_deleted_members(reading_service, client):
+    ids = [reading_service.create(f"Copy {i // 2}", f"https://example.com/{i // 2}", "", 1, []).id for i in range(6)]
+    app_module.duplicate_service.scan()
+
+    page = client.get('/bookmarks/duplicates', query_string={'limit': 2}).get_json()
+    assert len(page['clusters']) == 2 and page['nextAfter'] is not None
+    rest = client.get('/bookmarks/duplicates', query_string={'after': page['nextAfter']}).get_json()
+    assert len(rest['clusters']) == 1 and rest['nextAfter'] is None
+
+    etag = client.get('/bookmarks/duplicates').headers['ETag']
+    client.delete(f'/bookmarks/{ids[0]}')
+    response = client.get('/bookmarks/duplicates', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()['clusters']) == 2
+
+
+def test_backfill_normalizes_existing_urls(reading_service):
+    bm = reading_service.create("Page", "https://www.Example.com/a/", "", 1, [])
+    db.session.execute(sa.update(Bookmark.__table__).values(normalized_url=None))
+    db.session.commit()
+
+    assert normalized_url.backfill(db.engine, batch_size=1, log=lambda msg: None) == 1
+    db.session.expire_all()
+    assert Bookmark.query.get(bm.id).normalized_url == "example.com/a"
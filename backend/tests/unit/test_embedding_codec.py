@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from backend.infra import embedding_codec
+
+
+def test_float32_roundtrip():
+    vector = [0.01, -0.5, 3.25, 0.0]
+    blob = embedding_codec.pack(vector)
+    assert len(blob) == 16
+    assert embedding_codec.unpack(blob, 4).tolist() == pytest.approx(vector)
+
+
+def test_float16_halves_size():
+    vector = np.linspace(-1, 1, 1536)
+    blob = embedding_codec.pack(vector, 'float16')
+    assert len(blob) == 1536 * 2
+    decoded = embedding_codec.unpack(blob, 1536)
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, vector, atol=1e-3)
+
+
+def test_unpack_rejects_wrong_dimension():
+    with pytest.raises(ValueError):
+        embedding_codec.unpack(embedding_codec.pack([1.0, 2.0, 3.0]), 2)
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        embedding_codec.pack([1.0], 'float64')
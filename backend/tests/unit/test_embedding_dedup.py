@@ -0,0 +1,73 @@
+import pytest
+import sqlalchemy as sa
+
+from backend.infra.db import db
+from backend.infra.embedding_providers import content_hash
+from backend.migrations import embedding_hash
+from backend.models.bookmark import Bookmark
+
+
+def _status(bm_id):
+    db.session.expire_all()
+    return Bookmark.query.get(bm_id).embedding_status
+
+
+def test_resaving_the_same_text_skips_reembedding(reading_service, fake_embeddings):
+    bm = reading_service.create("Title", "https://a", "About", 1, [])
+    reading_service.worker.drain()
+    calls = len(fake_embeddings.calls)
+
+    reading_service.update(bm.id, title="Title", description="About  ", url="https://b")
+    assert _status(bm.id) == "ready"
+    assert reading_service.embedding_counts['unchanged'] == 1
+    assert reading_service.worker.drain() == 0
+    assert len(fake_embeddings.calls) == calls
+
+
+def test_editing_back_to_the_embedded_text_restores_ready(reading_service, fake_embeddings):
+    bm = reading_service.create("Title", "https://a", "About", 1, [])
+    reading_service.worker.drain()
+    reading_service.update(bm.id, title="Draft")
+    assert _status(bm.id) == "pending"
+    reading_service.update(bm.id, title="Title")
+    assert _status(bm.id) == "ready"
+    assert reading_service.worker.drain() == 0
+
+
+def test_duplicate_texts_are_embedded_once(reading_service, fake_embeddings):
+    first = reading_service.create("Same article", "https://a", "Text", 1, [])
+    second = reading_service.create("Same article", "https://b", "Text", 1, [])
+    reading_service.create("Other", "https://c", "Text", 1, [])
+    reading_service.worker.drain()
+    assert fake_embeddings.calls == [["Same article Text", "Other Text"]]
+
+    third = reading_service.create("Same article", "https://d", "Text", 1, [])
+    reading_service.worker.drain()
+    assert len(fake_embeddings.calls) == 1
+    assert reading_service.embedding_counts == {'unchanged': 0, 'reused': 1, 'deduplicated': 1, 'embedded': 2}
+
+    db.session.expire_all()
+    rows = Bookmark.query.filter(Bookmark.id.in_([first.id, second.id, third.id])).all()
+    assert {row.embedding_status for row in rows} == {"ready"}
+    assert len({row.embedding for row in rows}) == 1
+    assert {row.embedding_hash for row in rows} == {reading_service.text_hash("Same article", "Text")}
+    assert {bm.id for bm in reading_service.search_by_query("Same article Text", mode='semantic')[:3]} == {first.id, second.id, third.id}
+
+
+def test_cache_stats_report_counts(reading_service, client):
+    reading_service.count_embeddings(reused=2)
+    assert client.get('/bookmarks/search/cache-stats').get_json()['embeddings']['reused'] == 2
+
+
+def test_backfill_hashes_ready_rows(reading_service):
+    bm = reading_service.create("Title", "https://a", "About", 1, [])
+    pending = reading_service.create("Other", "https://b", "About", 1, [])
+    reading_service.worker.drain()
+    reading_service.update(pending.id, title="Changed")
+    db.session.execute(sa.update(Bookmark.__table__).values(embedding_hash=None))
+    db.session.commit()
+
+    assert embedding_hash.backfill(db.engine, batch_size=1, log=lambda msg: None) == 1
+    db.session.expire_all()
+    assert Bookmark.query.get(bm.id).embedding_hash == content_hash(reading_service.embedding_model, "Title About")
+    assert Bookmark.query.get(pending.id).embedding_hash is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backend.infra.embedding_index import EmbeddingIndex
+
+
+@pytest.fixture
+def index():
+    idx = EmbeddingIndex(initial_capacity=2)
+    idx.load([
+        (1, [1.0, 0.0, 0.0]),
+        (2, [0.0, 1.0, 0.0]),
+        (3, [0.7, 0.7, 0.0]),
+    ])
+    return idx
+
+
+def test_load_normalizes_rows(index):
+    assert len(index) == 3
+    assert index.loaded is True
+    hits = index.search([2.0, 0.0, 0.0], k=1)
+    assert hits[0][0] == 1
+    assert hits[0][1] == pytest.approx(1.0)
+
+
+def test_search_orders_by_similarity(index):
+    hits = index.search([1.0, 0.2, 0.0], k=3)
+    assert [bm_id for bm_id, _ in hits] == [1, 3, 2]
+
+
+def test_search_k_larger_than_index(index):
+    assert len(index.search([0.0, 1.0, 0.0], k=50)) == 3
+
+
+def test_upsert_grows_and_replaces(index):
+    index.upsert(4, [0.0, 0.0, 1.0])
+    assert len(index) == 4
+    assert index.search([0.0, 0.0, 1.0], k=1)[0][0] == 4
+
+    index.upsert(1, [0.0, 0.0, 5.0])
+    assert len(index) == 4
+    top_two = {bm_id for bm_id, _ in index.search([0.0, 0.0, 1.0], k=2)}
+    assert top_two == {1, 4}
+
+
+def test_remove_moves_last_row(index):
+    assert index.remove(1) is True
+    assert 1 not in index
+    assert len(index) == 2
+    hits = index.search([0.7, 0.7, 0.0], k=1)
+    assert hits[0][0] == 3
+    assert index.remove(1) is False
+
+
+def test_dimension_mismatch_rejected(index):
+    with pytest.raises(ValueError):
+        index.upsert(9, [1.0, 0.0])
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16))
+    idx = EmbeddingIndex()
+    idx.load(enumerate(vectors))
+    query = rng.normal(size=16)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = list(np.argsort(-(normed @ (query / np.linalg.norm(query))))[:10])
+    assert [bm_id for bm_id, _ in idx.search(query, k=10)] == expected
@@ -0,0 +1,130 @@
+import pytest
+
+from backend.infra.db import db
+from backend.infra.embedding_providers import FakeEmbeddings, HashingEmbeddings, OpenAIEmbeddings, provider_for_model
+from backend.models.bookmark import Bookmark
+from backend.models.embedding_migration import EmbeddingMigration, StagedEmbedding
+from backend.services.bookmark_service import BookmarkService
+from backend.services.embedding_migration_service import EmbeddingMigrationService
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """fake-16 vectors, failing on the calls numbered in `fail_on`."""
+
+    def __init__(self, fail_on=()):
+        super().__init__(dim=16)
+        self.fail_on = set(fail_on)
+        self.calls = []
+
+    def embed_many(self, texts, timeout=None):
+        self.calls.append(list(texts))
+        if len(self.calls) in self.fail_on:
+            raise RuntimeError("provider unavailable")
+        return super().embed_many(texts, timeout)
+
+
+@pytest.fixture
+def service(reading_service):
+    service = reading_service
+    for i in range(5):
+        service.create(f"Note {i}", f"https://example.com/{i}", "", 1, [])
+    service.worker.drain()
+    return service
+
+
+def _quiet(msg):
+    pass
+
+
+def _models():
+    db.session.expire_all()
+    return {bm.id: (bm.embedding_model, bm.embedding_status, bm.embedding_dim) for bm in Bookmark.query}
+
+
+def test_provider_for_model():
+    assert isinstance(provider_for_model('local-hashing-64'), HashingEmbeddings)
+    assert provider_for_model('fake-16').dim == 16
+    assert isinstance(provider_for_model('text-embedding-3-small'), OpenAIEmbeddings)
+
+
+def test_resumes_from_checkpoint_and_switches(service):
+    ids = sorted(_models())
+    source = service.embedding_model
+    flaky = EmbeddingMigrationService(service, FlakyEmbeddings(fail_on={2}), batch_size=2)
+    with pytest.raises(RuntimeError):
+        flaky.run(log=_quiet)
+    migration = EmbeddingMigration.query.one()
+    assert (migration.status, migration.last_id, migration.rows_done) == ('running', ids[1], 2)
+    assert StagedEmbedding.query.count() == 2
+    # Search still serves the old vectors, which are untouched.
+    assert service.embedding_model == source
+    assert set(_models().values()) == {(source, 'ready', 8)}
+
+    # Edited after it was staged: the catch-up pass embeds it again.
+    service.update(ids[0], title="Note zero")
+    service.worker.drain()
+    target = FlakyEmbeddings()
+    report = EmbeddingMigrationService(service, target, batch_size=2).run(log=_quiet)
+    assert report['status'] == 'switched' and report['rows'] == 6
+    assert report['rowsPerSecond'] > 0 and report['tokensPerSecond'] > 0
+    assert [len(texts) for texts in target.calls] == [2, 1, 1]
+    assert set(_models().values()) == {('fake-16', 'ready', 16)}
+    assert StagedEmbedding.query.count() == 0
+
+    assert service.embedding_model == 'fake-16'
+    service.search_by_query("anything", mode='semantic')
+    assert len(service.index) == 5
+    assert service.index.search(target.vector("Note zero "), 1)[0][0] == ids[0]
+
+
+def test_rows_edited_after_staging_are_queued_at_the_switch(service):
+    ids = sorted(_models())
+    migrator = EmbeddingMigrationService(service, FakeEmbeddings(dim=16), batch_size=10)
+    assert migrator.run(switch=False, log=_quiet)['status'] == 'running'
+    service.update(ids[2], description="rewritten")
+    late = service.create("Late", "https://example.com/late", "", 1, [])
+
+    migrator.switch(EmbeddingMigration.query.one(), log=_quiet)
+    models = _models()
+    assert models[ids[2]][1] == 'pending' and models[late.id][1] == 'pending'
+    assert all(models[bm_id] == ('fake-16', 'ready', 16) for bm_id in ids if bm_id != ids[2])
+    service.worker.drain()
+    assert set(_models().values()) == {('fake-16', 'ready', 16)}
+
+
+def test_other_processes_follow_the_switch(service, fake_embeddings):
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=service.embedder.client)
+    other.search_by_query("anything", mode='semantic')
+    assert other.index.dim == 8
+
+    EmbeddingMigrationService(service, FakeEmbeddings(dim=16)).run(log=_quiet)
+    other._last_model_check = float('-inf')
+    other.search_by_query("anything", mode='semantic')
+    assert other.embedding_model == 'fake-16' and other.index.dim == 16
+
+    with pytest.raises(ValueError):
+        EmbeddingMigrationService(service, FakeEmbeddings(dim=16)).start()
+
+
+def test_throttles_rows_and_tokens(service):
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    migrator = EmbeddingMigrationService(service, FakeEmbeddings(dim=16), batch_size=2, max_rows_per_second=1,
+                                         clock=lambda: now[0], sleep=sleep)
+    report = migrator.run(switch=False, log=_quiet)
+    assert waits == [2, 2, 1]
+    assert report['seconds'] == 5 and report['rowsPerSecond'] == 1.0
+
+    # Each "Note i " text is estimated at one token.
+    db.session.query(StagedEmbedding).delete()
+    db.session.commit()
+    waits.clear()
+    migrator.max_rows_per_second, migrator.max_tokens_per_minute = 0, 30
+    migrator.run(switch=False, log=_quiet)
+    assert waits == [4, 4, 2]
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.infra.embedding_providers import (
+    FakeEmbeddings, HashingEmbeddings, OpenAIEmbeddings, provider_from_env,
+)
+from backend.models.bookmark import Bookmark
+
+
+def test_hashing_is_deterministic_and_batched():
+    texts = ["python profiling tips", "profiling python code", "chocolate cake recipe"]
+    batch = HashingEmbeddings(dim=64).embed_many(texts)
+    assert batch == [HashingEmbeddings(dim=64).embed(text) for text in texts]
+    a, b, c = np.asarray(batch)
+    assert np.linalg.norm(a) == pytest.approx(1.0)
+    assert a @ b > a @ c
+
+
+def test_hashing_empty_text():
+    assert HashingEmbeddings(dim=4).embed("") == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_fake_is_deterministic_unit_vectors():
+    fake = FakeEmbeddings(dim=16)
+    assert fake.embed_many(["a", "b", "a"])[0] == fake.embed("a")
+    assert np.linalg.norm(fake.embed("b")) == pytest.approx(1.0)
+    assert fake.model == "fake-16"
+
+
+def test_openai_orders_by_index_and_passes_timeout():
+    calls = []
+
+    def create(model, input, **kwargs):
+        calls.append((model, input, kwargs))
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=1, embedding=[0.0, 1.0]),
+            SimpleNamespace(index=0, embedding=[1.0, 0.0]),
+        ])
+
+    provider = OpenAIEmbeddings(client=SimpleNamespace(embeddings=SimpleNamespace(create=create)), model="m")
+    assert provider.embed_many(["x", "y"], timeout=1.5) == [[1.0, 0.0], [0.0, 1.0]]
+    assert calls == [("m", ["x", "y"], {'timeout': 1.5})]
+    assert provider.embed_many([]) == []
+
+
+def test_provider_from_env(monkeypatch):
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'local')
+    monkeypatch.setenv('EMBEDDING_DIM', '32')
+    assert provider_from_env().model == "local-hashing-32"
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'openai')
+    monkeypatch.setenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+    assert provider_from_env().model == "text-embedding-3-small"
+    monkeypatch.setenv('EMBEDDING_PROVIDER', 'onnx')
+    with pytest.raises(ValueError):
+        provider_from_env()
+
+
+def test_local_provider_serves_semantic_search_offline(reading_service):
+    service = reading_service
+    service.embedder = HashingEmbeddings(dim=64)
+    python = service.create("Python profiling", "https://a", "Finding slow functions", 1, [])
+    service.create("Cake", "https://b", "Chocolate recipe", 1, [])
+    service.worker.drain()
+
+    assert Bookmark.query.get(python.id).embedding_model == "local-hashing-64"
+    assert service.search_by_query("profiling python", mode='semantic')[0].id == python.id
+
+
+def test_vectors_from_another_model_are_not_indexed(reading_service):
+    service = reading_service
+    bm = service.create("Python profiling", "https://a", "", 1, [])
+    service.worker.drain()
+
+    service.embedder = HashingEmbeddings(dim=64)
+    service.index = service._make_index('flat')
+    service.warm_index()
+    assert bm.id not in service.index
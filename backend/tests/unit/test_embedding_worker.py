@@ -0,0 +1,183 @@
+import pytest
+
+from backend.infra import embedding_codec
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+
+
+@pytest.fixture
+def worker(reading_service):
+    return reading_service.worker
+
+
+def _create(reading_service, n):
+    return [reading_service.create(f"Title {i}", f"https://example.com/{i}", f"About {i}", 1, []) for i in range(n)]
+
+
+def test_writes_commit_pending_without_embedding_call(reading_service, fake_embeddings):
+    bm = _create(reading_service, 1)[0]
+    assert bm.embedding_status == "pending"
+    assert bm.embedding is None
+    assert fake_embeddings.calls == []
+
+
+def test_drain_embeds_many_texts_per_call(reading_service, worker, fake_embeddings):
+    _create(reading_service, 5)
+    worker.batch_size = 2
+
+    assert worker.drain() == 5
+    assert [len(call) for call in fake_embeddings.calls] == [2, 2, 1]
+    db.session.expire_all()
+    for bm in Bookmark.query.all():
+        assert bm.embedding_status == "ready"
+        vector = embedding_codec.unpack(bm.embedding, bm.embedding_dim)
+        assert vector.tolist() == pytest.approx(fake_embeddings.vector(f"{bm.title} {bm.description}"))
+    assert len(reading_service.index) == 5
+
+
+def test_search_skips_pending_rows(reading_service, worker, fake_embeddings):
+    first, second = _create(reading_service, 2)
+    worker.drain()
+    third = _create(reading_service, 1)[0]
+
+    ids = [bm.id for bm in reading_service.search_by_query("Title 2 About 2", mode='semantic')]
+    assert third.id not in ids
+    assert set(ids) == {first.id, second.id}
+
+
+def test_edited_row_keeps_old_vector_until_reembedded(reading_service, worker, fake_embeddings):
+    bm = _create(reading_service, 1)[0]
+    worker.drain()
+    reading_service.update(bm.id, title="Renamed")
+    assert Bookmark.query.get(bm.id).embedding_status == "pending"
+    assert [b.id for b in reading_service.search_by_query("anything", mode='semantic')] == [bm.id]
+
+    worker.drain()
+    db.session.expire_all()
+    stored = Bookmark.query.get(bm.id)
+    vector = embedding_codec.unpack(stored.embedding, stored.embedding_dim)
+    assert vector.tolist() == pytest.approx(fake_embeddings.vector("Renamed About 0"))
+
+
+def test_transient_errors_are_retried(reading_service, worker, fake_embeddings):
+    _create(reading_service, 2)
+    fake_embeddings.failures = [RuntimeError("timeout"), RuntimeError("timeout")]
+    worker.max_retries = 2
+
+    assert worker.drain() == 2
+    assert len(fake_embeddings.calls) == 3
+
+
+def test_exhausted_retries_release_then_fail(reading_service, worker, fake_embeddings):
+    bm = _create(reading_service, 1)[0]
+    worker.max_retries = 0
+    worker.max_attempts = 2
+
+    fake_embeddings.failures = [RuntimeError("down")]
+    assert worker.drain() == 0
+    assert Bookmark.query.get(bm.id).embedding_status == "pending"
+
+    fake_embeddings.failures = [RuntimeError("down")]
+    assert worker.drain() == 0
+    db.session.expire_all()
+    assert Bookmark.query.get(bm.id).embedding_status == "failed"
+
+
+def test_vectors_written_by_another_process_are_synced(reading_service, fake_embeddings):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.services.bookmark_service import BookmarkService
+    from backend.services.embedding_worker import EmbeddingWorker
+
+    first = _create(reading_service, 1)[0]
+    reading_service.worker.drain()
+    assert [bm.id for bm in reading_service.search_by_query("Title 0", mode='semantic')] == [first.id]
+
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=fake_embeddings))
+    second = _create(other, 1)[0]
+    EmbeddingWorker(reading_service.worker.app, other, backoff=0).drain()
+
+    reading_service.index_sync_interval = 0
+    assert {bm.id for bm in reading_service.search_by_query("Title 0", mode='semantic')} == {first.id, second.id}
+
+
+@pytest.mark.parametrize('kind', ['flat', 'ivf', 'int8'])
+def test_deletes_in_another_process_leave_this_index(reading_service, fake_embeddings, kind):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.services.batch_service import BatchService
+    from backend.services.bookmark_service import BookmarkService
+
+    ids = [bm.id for bm in _create(reading_service, 5)]
+    reading_service.worker.drain()
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=fake_embeddings))
+    other.index = other._make_index(kind)
+    other.index_sync_interval = 0
+    assert len(other.search_by_query("Title", limit=3, mode='semantic')) == 3
+
+    reading_service.delete(ids[0])
+    BatchService(reading_service).delete([ids[1]])
+    results = [bm.id for bm in other.search_by_query("Title", limit=3, mode='semantic')]
+    assert sorted(results) == ids[2:]
+    assert ids[0] not in other.index and ids[1] not in other.index
+
+
+def test_saved_index_is_restored_and_synced(reading_service, fake_embeddings, tmp_path):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.services.bookmark_service import BookmarkService
+
+    kept, dropped = _create(reading_service, 2)
+    reading_service.worker.drain()
+    reading_service.index_path = str(tmp_path / "index.npz")
+    assert reading_service.build_index() == 2
+
+    reading_service.delete(dropped.id)
+    added = _create(reading_service, 1)[0]
+    reading_service.worker.drain()
+
+    restarted = BookmarkService()
+    restarted.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=fake_embeddings))
+    restarted.index_path = reading_service.index_path
+    restarted.warm_index()
+    assert set(restarted.index.ids()) == {kept.id, added.id}
+
+
+def test_corrupt_saved_index_is_rebuilt(reading_service, tmp_path):
+    kept = _create(reading_service, 1)[0]
+    reading_service.worker.drain()
+    reading_service.index_path = str(tmp_path / "index.npz")
+    with open(reading_service.index_path, 'wb') as fh:
+        fh.write(b"PK\x03\x04 truncated")
+    reading_service.index.loaded = False
+    reading_service.warm_index()
+    assert set(reading_service.index.ids()) == {kept.id}
+
+
+def test_shared_store_serves_a_new_process_without_reload(reading_service, fake_embeddings, tmp_path):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.infra.mmap_store import MmapEmbeddingStore
+    from backend.services.bookmark_service import BookmarkService
+
+    path = str(tmp_path / "embeddings.store")
+    reading_service.index = MmapEmbeddingStore(path)
+    reading_service.index_path = path
+    first = _create(reading_service, 1)[0]
+    reading_service.worker.drain()
+    assert [bm.id for bm in reading_service.search_by_query("Title 0", mode='semantic')] == [first.id]
+
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=fake_embeddings))
+    other.index = MmapEmbeddingStore(path)
+    other.index_path = path
+    other.warm_index()
+    assert other.index.ids() == [first.id]
+
+    second = _create(reading_service, 1)[0]
+    reading_service.worker.drain()
+    reading_service.delete(first.id)
+    other.index_sync_interval = 3600
+    assert [bm.id for bm in other.search_by_query("Title 1", mode='semantic')] == [second.id]
@@ -0,0 +1,85 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.export_service import ExportService
+from backend.services.import_service import normalize_record, parse_netscape, parse_ndjson
+
+
+@pytest.fixture
+def library(app):
+    db.session.add_all([
+        Collection(name="Reading", icon="rocket", color="#3B82F6"),
+        Collection(name="Tools & <Code>", icon="rocket", color="#3B82F6"),
+        Tag(name="python", color="#3B82F6"),
+        Tag(name="web", color="#3B82F6"),
+    ])
+    db.session.commit()
+    service = app_module.bookmark_service
+    service.create("First", "https://example.com/1", "About, \"quoted\"", 1, [1, 2], is_favorite=True)
+    service.create("Second", "https://example.com/2?a=1&b=2", "", 2, [2])
+    service.create("Third", "https://example.com/3", "Line one\nline two", 1, [])
+    service.worker.drain()
+    return service
+
+
+def _export(client, **params):
+    response = client.get('/export', query_string=params)
+    assert response.status_code == 200
+    return response
+
+
+def test_ndjson_and_json_round_trip_through_import(client, library):
+    lines = _export(client, format='ndjson').get_data(as_text=True).splitlines()
+    records = [normalize_record(record) for record in parse_ndjson(line + '\n' for line in lines)]
+    assert [(r['title'], r['collection'], r['tags'], r['is_favorite']) for r in records] == [
+        ("First", "Reading", ["python", "web"], True),
+        ("Third", "Reading", [], False),
+        ("Second", "Tools & <Code>", ["web"], False),
+    ]
+    assert json.loads(_export(client).get_data(as_text=True)) == [json.loads(line) for line in lines]
+
+
+def test_csv_and_html(client, library):
+    response = _export(client, format='csv')
+    assert response.headers['Content-Disposition'] == 'attachment; filename="bookmarks.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['title'], row['tags'], row['isFavorite']) for row in rows] == [
+        ("First", "python,web", "true"), ("Third", "", "false"), ("Second", "web", "false")]
+    assert rows[1]['description'] == "Line one\nline two"
+
+    page = _export(client, format='html').get_data(as_text=True)
+    records = [normalize_record(record) for record in parse_netscape([page])]
+    assert [(r['title'], r['url'], r['collection'], r['tags']) for r in records] == [
+        ("First", "https://example.com/1", "Reading", ["python", "web"]),
+        ("Third", "https://example.com/3", "Reading", []),
+        ("Second", "https://example.com/2?a=1&b=2", "Tools & <Code>", ["web"]),
+    ]
+
+
+def test_embeddings_and_gzip(client, library):
+    records = [json.loads(line) for line in gzip.decompress(
+        _export(client, format='ndjson', embeddings='true', gzip='true').data).decode().splitlines()]
+    assert all(len(record['embedding']) == 8 and record['embeddingModel'] for record in records)
+
+    response = client.get('/export', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(response.data))) == 3
+
+    assert client.get('/export', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/export', query_string={'format': 'html', 'embeddings': 'true'}).status_code == 400
+
+
+def test_statements_grow_per_batch_not_per_row(client, library, count_queries, monkeypatch):
+    monkeypatch.setattr(app_module, 'export_service', ExportService(batch_size=2))
+    with count_queries() as statements:
+        assert len(_export(client, format='ndjson').get_data(as_text=True).splitlines()) == 3
+    # Collections, the bookmark cursor, and one tag query per batch of two.
+    assert len(statements) == 4
@@ -0,0 +1,180 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.filter_index import FilterIndex
+from backend.infra.ivf_index import IVFIndex
+from backend.infra.lexical_index import LexicalIndex
+from backend.infra.mmap_store import MmapEmbeddingStore
+from backend.infra.quantized_index import QuantizedIndex
+from backend.infra.versions import versions
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+
+
+def _filters():
+    filters = FilterIndex(initial_capacity=4)
+    filters.load(
+        [(1, 1, True, datetime(2024, 1, 1)), (2, 1, False, datetime(2024, 6, 1)),
+         (3, 2, True, datetime(2025, 1, 1)), (10, 2, False, None)],
+        [(1, 7), (3, 7), (3, 8)],
+    )
+    return filters
+
+
+def _ids(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_mask_combines_filters():
+    filters = _filters()
+    assert filters.mask() is None
+    assert _ids(filters.mask(collection_id=2)) == [3, 10]
+    assert _ids(filters.mask(tag_id=7, favorite=True)) == [1, 3]
+    assert _ids(filters.mask(tag_id=8, collection_id=1)) == []
+    assert _ids(filters.mask(tag_id=99)) == []
+    assert _ids(filters.mask(created_after=datetime(2024, 3, 1), created_before=datetime(2025, 1, 1))) == [2]
+
+
+def test_changes_apply_in_place_and_track_the_stamp():
+    filters = _filters()
+    filters.stamp = (5, 1)
+    filters.apply((5, 2), lambda f: (f.upsert(40, 2, True, datetime(2024, 2, 1)), f.add_tags([(40, 7)])))
+    assert filters.stamp == (5, 2)
+    assert _ids(filters.mask(tag_id=7, collection_id=2)) == [3, 40]
+    filters.apply((5, 3), lambda f: (f.move([3], 1), f.set_favorite([40], False), f.remove_tags([(1, 7)])))
+    assert _ids(filters.mask(tag_id=7)) == [3, 40]
+    assert _ids(filters.mask(collection_id=1)) == [1, 2, 3]
+    filters.apply((5, 4), lambda f: f.remove([3]))
+    assert _ids(filters.mask(tag_id=7)) == [40]
+
+    # A bump this process did not make (5 -> 6) leaves the stamp behind, so the owner reloads.
+    filters.apply((5, 6), lambda f: f.remove([40]))
+    assert filters.stamp == (5, 4)
+
+
+@pytest.mark.parametrize('make', [
+    lambda tmp_path: EmbeddingIndex(),
+    lambda tmp_path: IVFIndex(nlist=8, nprobe=2, min_train_size=0),
+    lambda tmp_path: MmapEmbeddingStore(str(tmp_path / 'store')),
+    lambda tmp_path: QuantizedIndex(rescore=3),
+])
+def test_vector_indexes_score_only_allowed_rows(tmp_path, make):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 16)).astype(np.float32)
+    index = make(tmp_path)
+    index.load((i + 1, vec) for i, vec in enumerate(vectors))
+    if hasattr(index, 'rebuild'):
+        index.rebuild()
+    index.remove(5)
+    allowed = np.zeros(500, dtype=bool)
+    allowed[[3, 5, 17, 120, 399]] = True
+    query = vectors[16]
+    hits = index.search(query, 3, allowed=allowed)
+    assert [bm_id for bm_id, _ in hits][0] == 17
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = sorted([3, 17, 120, 399], key=lambda bm_id: -float(normalized[bm_id - 1] @ query))[:3]
+    assert [bm_id for bm_id, _ in hits] == exact
+    assert index.search(query, 3, allowed=np.zeros(500, dtype=bool)) == []
+    assert index.search(query, 5, allowed=np.ones(500, dtype=bool)) == index.search(query, 5)
+
+
+def test_lexical_index_skips_postings_outside_the_filter():
+    index = LexicalIndex()
+    index.load([(1, "python tips", "", ""), (2, "python tricks", "", ""), (3, "rust", "", "")])
+    allowed = np.zeros(3, dtype=bool)
+    allowed[2] = True
+    assert [bm_id for bm_id, _ in index.search("python", 5, allowed=allowed)] == [2]
+
+
+@pytest.fixture
+def library(app):
+    db.session.add_all([
+        Collection(name="a", icon="rocket", color="#3B82F6"),
+        Collection(name="b", icon="rocket", color="#3B82F6"),
+        Tag(name="x", color="#3B82F6"),
+    ])
+    db.session.commit()
+    service = app_module.bookmark_service
+    ids = {}
+    for i in range(30):
+        ids[i] = service.create(f"python notes {i}", f"https://example.com/{i}", "python", 1, []).id
+    for i in range(30, 33):
+        ids[i] = service.create(f"python recipes {i}", f"https://example.com/{i}", "python cooking", 2, [1]).id
+    service.worker.drain()
+    return service, ids
+
+
+@pytest.mark.parametrize('mode', ['semantic', 'lexical', 'hybrid'])
+def test_filtered_search_is_not_truncated_by_unfiltered_ranking(library, mode):
+    service, ids = library
+    results = service.search_by_query("python notes", limit=3, mode=mode, filters={'collection_id': 2})
+    assert sorted(bm.id for bm in results) == [ids[30], ids[31], ids[32]]
+    assert service.search_by_query("python", mode=mode, filters={'tag_id': 1, 'favorite': True}) == []
+
+
+def test_writes_update_the_filter_index_without_a_reload(library, client, monkeypatch):
+    service, ids = library
+    assert len(service.search_by_query("python", mode='lexical', filters={'collection_id': 2})) == 3
+    loads = []
+    monkeypatch.setattr(service.filters, 'load', lambda *args, **kwargs: loads.append(args))
+
+    client.post(f'/favorites/{ids[3]}')
+    client.put(f'/bookmarks/{ids[4]}', json={'collection_id': 2})
+    client.post('/bookmarks/batch/tags', json={'ids': [ids[5]], 'add': [1]})
+    client.delete(f'/bookmarks/{ids[30]}')
+    new = service.create("python fresh", "https://example.com/new", "", 2, [1])
+
+    def found(**filters):
+        return sorted(bm.id for bm in service.search_by_query("python", mode='lexical', filters=filters))
+    assert found(favorite=True) == [ids[3]]
+    assert found(collection_id=2) == [ids[4], ids[31], ids[32], new.id]
+    assert found(tag_id=1) == [ids[5], ids[31], ids[32], new.id]
+    assert loads == []
+
+
+def test_other_processes_writes_trigger_a_reload(library):
+    service, ids = library
+    assert service.search_by_query("python", mode='lexical', filters={'favorite': True}) == []
+    # Another process favorites a bookmark: the row changes and the shared counter moves.
+    db.session.execute(db.text("UPDATE bookmark SET is_favorite = 1 WHERE id = :id"), {'id': ids[7]})
+    db.session.commit()
+    versions.bump('bookmarks', 'memberships')
+    assert [bm.id for bm in service.search_by_query("python", mode='lexical', filters={'favorite': True})] == [ids[7]]
+
+
+def test_other_processes_logged_writes_are_replayed_without_a_reload(library, monkeypatch):
+    from backend.services.batch_service import BatchService
+    from backend.services.bookmark_service import BookmarkService
+    from backend.services.favorite_service import FavoriteService
+
+    service, ids = library
+    assert len(service.search_by_query("python", mode='lexical', filters={'collection_id': 2})) == 3
+    loads = []
+    monkeypatch.setattr(service.filters, 'load', lambda *args, **kwargs: loads.append(args))
+
+    other = BookmarkService()
+    FavoriteService(other).add(ids[3])
+    other.update(ids[4], collection_id=2)
+    BatchService(other).set_tags([ids[5]], add=[1])
+    BatchService(other).set_tags([ids[31]], remove=[1])
+    other.delete(ids[30])
+
+    def found(**filters):
+        return sorted(bm.id for bm in service.search_by_query("python", mode='lexical', filters=filters))
+    assert found(favorite=True) == [ids[3]]
+    assert found(collection_id=2) == [ids[4], ids[31], ids[32]]
+    assert found(tag_id=1) == [ids[5], ids[32]]
+    assert loads == []
+
+
+def test_search_route_takes_list_filters(library, client):
+    service, ids = library
+    response = client.get('/bookmarks/search', query_string={'q': 'python', 'mode': 'lexical', 'collection_id': 2})
+    assert sorted(bm['id'] for bm in response.get_json()) == [ids[30], ids[31], ids[32]]
+    response = client.get('/bookmarks/search', query_string={'q': 'python', 'favorite': 'maybe'})
+    assert response.status_code == 400
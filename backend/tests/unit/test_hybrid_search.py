@@ -0,0 +1,101 @@
+import pytest
+from openai import APITimeoutError
+
+from backend.infra.db import db
+
+
+@pytest.fixture
+def service(reading_service):
+    service = reading_service
+    service.create("Fast Python", "https://example.org/python", "Profiling tips", 1, [])
+    service.create("Rust book", "https://doc.rust-lang.org/book", "Learning rust", 1, [])
+    service.create("Cooking", "https://recipes.example.com", "Pasta at home", 1, [])
+    service.worker.drain()
+    return service
+
+
+def _titles(bookmarks):
+    return [bm.title for bm in bookmarks]
+
+
+def test_lexical_mode_makes_no_embedding_call(service, fake_embeddings):
+    calls = len(fake_embeddings.calls)
+    assert _titles(service.search_by_query("doc.rust-lang.org", mode='lexical'))[0] == "Rust book"
+    assert len(fake_embeddings.calls) == calls
+
+
+def test_hybrid_fuses_both_rankings(service):
+    results = _titles(service.search_by_query("python profiling"))
+    assert results[0] == "Fast Python"
+    assert set(results) == {"Fast Python", "Rust book", "Cooking"}
+
+
+def test_hybrid_finds_bookmarks_still_waiting_for_embeddings(service):
+    service.create("Unembedded notes", "https://notes.example.net", "", 1, [])
+    assert "Unembedded notes" in _titles(service.search_by_query("unembedded"))
+    assert "Unembedded notes" not in _titles(service.search_by_query("unembedded", mode='semantic'))
+
+
+def test_hybrid_falls_back_to_lexical_when_provider_fails(service, fake_embeddings):
+    fake_embeddings.failures.append(APITimeoutError(request=None))
+    assert _titles(service.search_by_query("rust")) == ["Rust book"]
+    # The provider is skipped during the cooldown instead of timing out on every query.
+    calls = len(fake_embeddings.calls)
+    assert _titles(service.search_by_query("pasta")) == ["Cooking"]
+    assert len(fake_embeddings.calls) == calls
+
+    service._embedding_down_until = 0
+    assert len(service.search_by_query("pasta")) == 3
+    assert len(fake_embeddings.calls) == calls + 1
+
+
+def test_lexical_index_follows_edits_deletes_and_other_processes(service):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.services.bookmark_service import BookmarkService
+
+    assert _titles(service.search_by_query("cooking", mode='lexical')) == ["Cooking"]
+    bm = service.search_by_query("cooking", mode='lexical')[0]
+    service.update(bm.id, title="Baking")
+    assert service.search_by_query("cooking", mode='lexical') == []
+    assert _titles(service.search_by_query("baking", mode='lexical')) == ["Baking"]
+
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=None))
+    other.create("Baking bread", "https://bread.example.com", "", 1, [])
+    service.index_sync_interval = 0
+    assert set(_titles(service.search_by_query("baking", mode='lexical'))) == {"Baking", "Baking bread"}
+
+    service.delete(bm.id)
+    assert _titles(service.search_by_query("baking", mode='lexical')) == ["Baking bread"]
+
+
+def test_deletes_by_other_processes_leave_the_lexical_index(service):
+    from types import SimpleNamespace
+    from backend.infra.embedding_providers import OpenAIEmbeddings
+    from backend.infra.versions import versions
+    from backend.services.batch_service import BatchService
+    from backend.services.bookmark_service import BookmarkService
+
+    rust = service.search_by_query("rust", mode='lexical')[0]
+    cooking = service.search_by_query("cooking", mode='lexical')[0]
+    service.index_sync_interval = 0
+    other = BookmarkService()
+    other.embedder = OpenAIEmbeddings(client=SimpleNamespace(embeddings=None))
+    other.delete(rust.id)
+    BatchService(other).delete([cooking.id])
+    service.search_by_query("python", mode='lexical')
+    assert sorted(service.lexical_index.ids()) == [service.search_by_query("python", mode='lexical')[0].id]
+
+    # Deletes the log does not cover (a collection deleted with its bookmarks) are found by comparing ids.
+    db.session.execute(db.text("DELETE FROM bookmark"))
+    db.session.commit()
+    versions.bump('bookmarks', 'memberships')
+    assert service.search_by_query("python", mode='lexical') == []
+    assert service.lexical_index.ids() == []
+
+
+def test_search_route_modes(service, client):
+    response = client.get('/bookmarks/search?q=rust&mode=lexical')
+    assert [bm['title'] for bm in response.get_json()] == ["Rust book"]
+    assert client.get('/bookmarks/search?q=rust&mode=fuzzy').status_code == 400
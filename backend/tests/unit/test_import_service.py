@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.import_service import (
+    ImportRecordError, detect_format, normalize_record, parse_json, parse_ndjson, parse_netscape,
+)
+
+NETSCAPE = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><H3 ADD_DATE="1700000000">Dev</H3>
+    <DL><p>
+        <DT><A HREF="https://flask.palletsprojects.com" ADD_DATE="1700000001" TAGS="python,web">Flask</A>
+        <DD>Micro &amp; web framework
+        <DT><H3>Databases</H3>
+        <DL><p>
+            <DT><A HREF="https://postgresql.org">PostgreSQL</A>
+        </DL><p>
+    </DL><p>
+    <DT><A HREF="https://news.ycombinator.com">HN</A>
+</DL><p>
+"""
+
+
+def chunked(text, size=7):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def test_parse_netscape_folders_tags_descriptions():
+    records = list(parse_netscape(chunked(NETSCAPE)))
+    assert [(r['title'], r['collection']) for r in records] == [
+        ('Flask', 'Dev'),
+        ('PostgreSQL', 'Databases'),
+        ('HN', None),
+    ]
+    assert records[0]['tags'] == ['python', 'web']
+    assert records[0]['description'] == 'Micro & web framework'
+    assert records[0]['created_at'] == '1700000001'
+
+
+def test_parse_json_streams_array_across_chunks():
+    doc = json.dumps([{'url': 'https://a.example', 'title': 'A'}, {'url': 'https://b.example'}, 7])
+    assert list(parse_json(chunked(doc, 3))) == [
+        {'url': 'https://a.example', 'title': 'A'}, {'url': 'https://b.example'}, 7,
+    ]
+
+
+def test_parse_json_requires_array():
+    with pytest.raises(ImportRecordError):
+        list(parse_json(['{"url": "x"}']))
+
+
+def test_parse_ndjson_reports_bad_lines():
+    records = list(parse_ndjson(chunked('{"url": "https://a"}\nnot json\n\n{"url": "https://b"}')))
+    assert records[0] == {'url': 'https://a'}
+    assert isinstance(records[1], ImportRecordError)
+    assert records[2] is None
+    assert records[3] == {'url': 'https://b'}
+
+
+def test_detect_format():
+    assert detect_format('export.html') == 'html'
+    assert detect_format(content_type='application/x-ndjson') == 'ndjson'
+    assert detect_format(first_text='  [{"url": 1}]') == 'json'
+
+
+def _events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_import_netscape_upload(client, fake_embeddings):
+    response = client.post('/bookmarks/import', data={
+        'file': (io.BytesIO(NETSCAPE.encode()), 'bookmarks.html'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    done = _events(response)[-1]
+    assert done == {'event': 'done', 'format': 'html', 'processed': 3, 'imported': 3, 'failed': 0, 'aborted': False}
+    assert {c.name for c in Collection.query.all()} == {'Dev', 'Databases', 'Imported'}
+    assert {t.name for t in Tag.query.all()} == {'python', 'web'}
+    flask_bm = Bookmark.query.filter_by(title='Flask').one()
+    assert sorted(t.name for t in flask_bm.tags) == ['python', 'web']
+    assert flask_bm.embedding_status == 'pending'
+    assert fake_embeddings.calls == []
+
+
+def test_import_ndjson_batches_and_row_errors(app, client):
+    from backend.api import app as app_module
+    db.session.add(Collection(name="Inbox", icon="rocket", color="#3B82F6"))
+    db.session.add(Tag(name="existing", color="#3B82F6"))
+    db.session.commit()
+    app_module.import_service.batch_size = 2
+
+    lines = [
+        {'url': 'https://a.example', 'title': 'A', 'tags': ['existing', 'new']},
+        {'title': 'missing url'},
+        {'url': 'https://b.example', 'tags': 'new, other'},
+        {'url': 'https://c.example', 'collection_id': 99},
+        {'url': 'https://d.example', 'created_at': '2024-01-02T03:04:05Z'},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    response = client.post('/bookmarks/import?format=ndjson&collection_id=1', data=body)
+    events = _events(response)
+
+    progress = [e for e in events if e['event'] == 'progress']
+    errors = [err for e in progress for err in e['errors']]
+    assert {err['row'] for err in errors} == {2, 4}
+    assert events[-1]['imported'] == 3
+    assert events[-1]['failed'] == 2
+    assert Tag.query.count() == 3
+    assert Bookmark.query.filter_by(url='https://b.example').one().collection_id == 1
+    app_module.import_service.batch_size = 500
+
+
+def test_normalize_record_rejects_wrong_types():
+    for raw in ({'url': 5}, {'url': 'http://b.com', 'title': 5}, {'href': ['x']},
+                {'url': 'http://b.com', 'description': {}}, {'url': 'http://b.com', 'created_at': 10 ** 30},
+                {'url': 'http://b.com', 'created_at': float('inf')}, {'url': 'http://b.com', 'is_favorite': 'maybe'}):
+        with pytest.raises(ImportRecordError):
+            normalize_record(raw)
+    assert normalize_record({'url': 'http://b.com', 'is_favorite': 'false'})['is_favorite'] is False
+    assert normalize_record({'url': 'http://b.com', 'isFavorite': 'TRUE'})['is_favorite'] is True
+    assert normalize_record({'url': 'http://b.com', 'is_favorite': 0})['is_favorite'] is False
+
+
+def test_import_reports_badly_typed_rows_and_finishes(app, client):
+    db.session.add(Collection(name="Inbox", icon="rocket", color="#3B82F6"))
+    db.session.commit()
+    body = '\n'.join(json.dumps(line) for line in [
+        {'url': 'http://b.com', 'title': 5},
+        {'url': 'http://c.com', 'created_at': 10 ** 30},
+        {'url': 'http://d.com', 'is_favorite': 'false'},
+    ])
+    events = _events(client.post('/bookmarks/import?format=ndjson&collection_id=1', data=body))
+    assert events[-1]['event'] == 'done'
+    assert (events[-1]['imported'], events[-1]['failed']) == (1, 2)
+    assert Bookmark.query.filter_by(url='http://d.com').one().is_favorite is False
+
+
+def test_import_rejects_unknown_format(client):
+    response = client.post('/bookmarks/import', data='hello', content_type='text/plain')
+    assert response.status_code == 400
@@ -0,0 +1,131 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.ivf_index import IVFIndex
+
+
+def _clustered(n=3000, dim=16, clusters=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(0, clusters, n)] + rng.normal(scale=0.3, size=(n, dim))
+    return centers, points.astype(np.float32)
+
+
+@pytest.fixture
+def data():
+    return _clustered()
+
+
+@pytest.fixture
+def trained(data):
+    _, points = data
+    idx = IVFIndex(nlist=30, nprobe=4, min_train_size=0)
+    idx.load(enumerate(points))
+    idx.rebuild()
+    return idx
+
+
+def _recall(idx, points, queries, k=10, **kwargs):
+    exact = EmbeddingIndex()
+    exact.load(enumerate(points))
+    hits = 0
+    for q in queries:
+        expected = {bm_id for bm_id, _ in exact.search(q, k)}
+        hits += len(expected & {bm_id for bm_id, _ in idx.search(q, k, **kwargs)})
+    return hits / (k * len(queries))
+
+
+def test_untrained_index_is_exact(data):
+    centers, points = data
+    idx = IVFIndex(min_train_size=10 ** 6)
+    idx.load(enumerate(points))
+    assert not idx.trained and not idx.needs_rebuild()
+    assert _recall(idx, points, centers) == 1.0
+
+
+def test_trained_index_recall_and_nprobe(trained, data):
+    centers, points = data
+    assert trained.trained and trained.trained_size == len(points)
+    assert _recall(trained, points, centers) >= 0.9
+    assert _recall(trained, points, centers, nprobe=30) == 1.0
+
+
+def test_incremental_insert_and_delete_after_training(trained, data):
+    centers, _ = data
+    trained.upsert(10 ** 6, centers[3])
+    assert trained.search(centers[3], 1)[0][0] == 10 ** 6
+    trained.upsert(10 ** 6, centers[7])
+    assert trained.search(centers[7], 1)[0][0] == 10 ** 6
+    assert trained.contains_vector(10 ** 6, centers[7] * 2)
+    assert trained.remove(10 ** 6)
+    assert 10 ** 6 not in trained
+    assert all(bm_id != 10 ** 6 for bm_id, _ in trained.search(centers[7], 50, nprobe=30))
+
+
+def test_needs_rebuild_after_growth(data):
+    _, points = data
+    idx = IVFIndex(nlist=8, min_train_size=100, rebuild_growth=2.0)
+    idx.load(enumerate(points[:150]))
+    assert idx.needs_rebuild()
+    idx.rebuild()
+    assert not idx.needs_rebuild()
+    for i in range(150, 300):
+        idx.upsert(i, points[i])
+    assert idx.needs_rebuild()
+
+
+def test_writes_during_rebuild_are_replayed(data, monkeypatch):
+    centers, points = data
+    idx = IVFIndex(nlist=30, min_train_size=0)
+    idx.load(enumerate(points))
+    original_train = idx._train
+
+    def train_with_concurrent_writes(matrix, nlist):
+        writer = threading.Thread(target=lambda: (idx.upsert(-1, centers[0]), idx.remove(0)))
+        writer.start()
+        writer.join()
+        return original_train(matrix, nlist)
+
+    monkeypatch.setattr(idx, '_train', train_with_concurrent_writes)
+    assert idx.rebuild_async()
+    idx.wait_for_rebuild()
+    assert idx.trained
+    assert -1 in idx and 0 not in idx
+    assert len(idx) == len(points)
+    assert idx.search(centers[0], 1)[0][0] == -1
+
+
+def test_save_and_restore_round_trip(trained, data, tmp_path):
+    centers, _ = data
+    path = tmp_path / "index.npz"
+    trained.save(path, meta={'model': 'm'})
+    restored = IVFIndex(nprobe=4)
+    assert restored.restore(path) == {'model': 'm'}
+    assert restored.trained and len(restored) == len(trained)
+    for q in centers[:5]:
+        assert restored.search(q, 10) == trained.search(q, 10)
+    restored.upsert(10 ** 6, centers[0])
+    assert restored.search(centers[0], 1)[0][0] == 10 ** 6
+
+
+def test_concurrent_saves_never_share_a_temporary_file(trained, tmp_path):
+    path = str(tmp_path / "index.npz")
+    threads = [threading.Thread(target=trained.save, args=(path, {'model': str(i)})) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    restored = IVFIndex(nprobe=4)
+    assert restored.restore(path)['model'] in {str(i) for i in range(8)}
+    assert len(restored) == len(trained)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index.npz"]
+
+
+def test_dimension_mismatch(trained):
+    with pytest.raises(ValueError):
+        trained.upsert(1, [1.0, 0.0])
+    with pytest.raises(ValueError):
+        trained.search([1.0, 0.0], 1)
@@ -0,0 +1,49 @@
+from backend.infra.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize, url_tokens
+
+
+def test_tokenize_keeps_domains_whole():
+    assert tokenize("Read docs at GitHub.com, now!") == ["read", "docs", "at", "github", "com", "now", "github.com"]
+
+
+def test_url_tokens():
+    assert url_tokens("https://www.Example.org/blog/fast-python?tag=perf") == [
+        "www.example.org", "example.org", "example", "org", "blog", "fast", "python", "tag", "perf",
+    ]
+
+
+def _index():
+    idx = LexicalIndex()
+    idx.load([
+        (1, "Fast Python", "Profiling tips for python code", "https://example.org/python"),
+        (2, "Rust book", "Learning rust", "https://doc.rust-lang.org/book"),
+        (3, "Python packaging", "", "https://packaging.python.org"),
+    ])
+    return idx
+
+
+def test_bm25_ranks_term_frequency_and_rarity():
+    idx = _index()
+    assert {bm_id for bm_id, _ in idx.search("python", 10)} == {1, 3}
+    assert [bm_id for bm_id, _ in idx.search("python profiling", 10)] == [1, 3]
+    assert [bm_id for bm_id, _ in idx.search("python packaging", 10)] == [3, 1]
+    assert idx.search("nothing matches", 10) == []
+
+
+def test_domain_query_matches_url_host():
+    idx = _index()
+    assert [bm_id for bm_id, _ in idx.search("doc.rust-lang.org", 1)] == [2]
+    assert [bm_id for bm_id, _ in idx.search("example.org", 1)] == [1]
+
+
+def test_upsert_and_remove_are_incremental():
+    idx = _index()
+    idx.upsert(2, "Python in Rust", "", "https://pyo3.rs")
+    assert 2 in [bm_id for bm_id, _ in idx.search("python", 10)]
+    assert idx.search("book", 10) == []
+    assert idx.remove(1) and not idx.remove(1)
+    assert [bm_id for bm_id, _ in idx.search("profiling", 10)] == []
+    assert len(idx) == 2
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]]) == [1, 3, 2, 4]
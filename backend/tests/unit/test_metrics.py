@@ -0,0 +1,66 @@
+from backend.api import app as app_module
+from backend.infra import metrics
+from backend.infra.db import db
+from backend.models.collection import Collection
+
+
+def _seed(n=3):
+    db.session.add(Collection(name="c", icon="rocket", color="#3B82F6"))
+    db.session.commit()
+    for i in range(n):
+        app_module.bookmark_service.create(f"python {i}", f"https://{i}.example.com", "", 1, [])
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    hist = registry.histogram('t_seconds', 'Test.', ('route',), buckets=(0.1, 1.0))
+    hist.observe(0.05, route='/a')
+    hist.observe(0.1, route='/a')
+    hist.observe(3, route='/a')
+    text = registry.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{route="/a",le="0.1"} 2' in text
+    assert 't_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 't_seconds_count{route="/a"} 3' in text
+    assert hist.snapshot(route='/a') == (3, 3.15)
+
+
+def test_requests_report_server_timing_and_metrics(client):
+    _seed()
+    before, _ = metrics.REQUEST_QUERIES.snapshot(route='/bookmarks')
+    response = client.get('/bookmarks?limit=10')
+    entries = dict(part.strip().split(';', 1) for part in response.headers['Server-Timing'].split(','))
+    assert set(entries) >= {'app', 'db', 'serialize'}
+    assert 'queries' in entries['db']
+    assert metrics.REQUEST_QUERIES.snapshot(route='/bookmarks')[0] == before + 1
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/bookmarks",status="200",le="+Inf"}' in text
+    assert 'http_request_db_seconds_count{route="/bookmarks"}' in text
+    assert 'db_query_duration_seconds_count' in text
+    assert '# TYPE db_pool_connections gauge' in text
+
+
+def test_streamed_responses_are_recorded_after_the_body(client):
+    _seed()
+    before, _ = metrics.REQUEST_SECONDS.snapshot(method='GET', route='/favorites', status=200)
+    response = client.get('/favorites')
+    assert response.get_json() == []
+    assert metrics.REQUEST_SECONDS.snapshot(method='GET', route='/favorites', status=200)[0] == before + 1
+    assert metrics.current() is None
+
+
+def test_search_and_embedding_stages_are_timed(client):
+    _seed()
+    app_module.embedding_worker.drain()
+    model = app_module.bookmark_service.embedding_model
+    batches, _ = metrics.EMBEDDING_BATCH_SIZE.snapshot(model=model, kind='batch')
+    assert batches >= 1
+
+    response = client.get('/bookmarks/search?q=python&mode=hybrid')
+    assert response.status_code == 200
+    assert {'lexical', 'semantic', 'fusion', 'embed'} <= {
+        part.strip().split(';')[0] for part in response.headers['Server-Timing'].split(',')}
+    assert metrics.SEARCH_SECONDS.snapshot(stage='fusion')[0] >= 1
+    assert metrics.EMBEDDING_SECONDS.snapshot(model=model, kind='query')[0] >= 1
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from backend.infra.mmap_store import MmapEmbeddingStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "embeddings.store")
+
+
+@pytest.fixture
+def writer(path):
+    store = MmapEmbeddingStore(path, initial_capacity=4)
+    store.load([
+        (1, [1.0, 0.0, 0.0]),
+        (2, [0.0, 1.0, 0.0]),
+        (3, [0.7, 0.7, 0.0]),
+    ])
+    return store
+
+
+@pytest.fixture
+def reader(writer, path):
+    # A second instance on the same file stands in for another gunicorn worker.
+    store = MmapEmbeddingStore()
+    store.restore(path)
+    return store
+
+
+def test_reader_opens_written_store(reader):
+    assert reader.loaded and len(reader) == 3 and reader.dim == 3
+    assert [bm_id for bm_id, _ in reader.search([1.0, 0.2, 0.0], 3)] == [1, 3, 2]
+    assert reader.search([2.0, 0.0, 0.0], 1)[0][1] == pytest.approx(1.0)
+
+
+def test_appends_and_edits_are_visible_without_reload(writer, reader):
+    generation = reader.generation
+    writer.upsert(4, [0.0, 0.0, 1.0])
+    assert reader.generation > generation
+    assert len(reader) == 4 and 4 in reader
+    assert reader.search([0.0, 0.0, 1.0], 1)[0][0] == 4
+
+    writer.upsert(1, [0.0, 0.0, 3.0])
+    assert len(reader) == 4
+    assert reader.contains_vector(1, [0.0, 0.0, 1.0])
+
+
+def test_tombstones_are_skipped(writer, reader):
+    assert writer.remove(2)
+    assert not writer.remove(2)
+    assert 2 not in reader and len(reader) == 2
+    assert [bm_id for bm_id, _ in reader.search([0.0, 1.0, 0.0], 10)] == [3, 1]
+    assert sorted(reader.ids()) == [1, 3]
+
+
+def test_growth_and_compaction_remap_readers(writer, reader):
+    for i in range(4, 20):
+        writer.upsert(i, np.eye(3)[i % 3])
+    assert len(reader) == 19
+    assert reader.search([1.0, 0.0, 0.0], 1)[0][1] == pytest.approx(1.0)
+    for i in range(4, 20):
+        writer.remove(i)
+    assert sorted(reader.ids()) == [1, 2, 3]
+    # Either process can write once the other has compacted.
+    reader.upsert(50, [0.0, 0.0, 1.0])
+    assert writer.search([0.0, 0.0, 1.0], 1)[0][0] == 50
+
+
+def test_reload_replaces_contents_for_every_process(writer, reader):
+    writer.load([(9, [0.0, 0.0, 1.0])])
+    assert reader.ids() == [9]
+
+
+def test_save_records_model(writer, path):
+    writer.save(path, meta={'model': 'text-embedding-3-small'})
+    assert MmapEmbeddingStore().restore(path)['model'] == 'text-embedding-3-small'
+
+
+def test_dimension_mismatch(writer):
+    with pytest.raises(ValueError):
+        writer.upsert(5, [1.0, 0.0])
+    with pytest.raises(ValueError):
+        writer.search([1.0, 0.0], 1)
+
+
+def test_first_upsert_creates_store(path):
+    store = MmapEmbeddingStore(path)
+    assert not store.loaded and store.search([1.0], 1) == []
+    store.upsert(1, [0.0, 2.0])
+    assert store.loaded and store.ids() == [1]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from backend.infra.db import db
+from backend.models.neighbor import BookmarkNeighbor
+from backend.services.neighbor_service import top_neighbors
+
+
+def test_top_neighbors_match_a_full_sort():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(50, 8)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    rows, scores = top_neighbors(matrix, 10, 20, 5)
+    full = matrix @ matrix.T
+    np.fill_diagonal(full, -np.inf)
+    assert rows.tolist() == np.argsort(-full[10:20], axis=1, kind='stable')[:, :5].tolist()
+    assert np.allclose(scores, np.sort(full[10:20], axis=1)[:, ::-1][:, :5])
+
+
+@pytest.fixture
+def service(reading_service, monkeypatch):
+    monkeypatch.setattr(reading_service.neighbors, 'k', 3)
+    return reading_service
+
+
+def _lists():
+    db.session.expire_all()
+    lists = {}
+    for row in BookmarkNeighbor.query.order_by(BookmarkNeighbor.bookmark_id, BookmarkNeighbor.score.desc()):
+        lists.setdefault(row.bookmark_id, []).append(row.neighbor_id)
+    return lists
+
+
+def _create(service, n, start=0):
+    ids = [service.create(f"Note {i}", f"https://example.com/{i}", "", 1, []).id for i in range(start, start + n)]
+    service.worker.drain()
+    return ids
+
+
+def test_rebuild_matches_exact_search(service):
+    ids = _create(service, 12)
+    db.session.query(BookmarkNeighbor).delete()
+    db.session.commit()
+
+    report = service.neighbors.rebuild(chunk_size=5, workers=3, log=lambda msg: None)
+    assert report['bookmarks'] == 12 and report['neighbors'] == 36
+    stored_ids, matrix = service.stored_matrix()
+    full = matrix @ matrix.T
+    np.fill_diagonal(full, -np.inf)
+    expected = {bm_id: stored_ids[np.argsort(-full[i], kind='stable')[:3]].tolist() for i, bm_id in enumerate(stored_ids)}
+    assert _lists() == expected
+    assert sorted(expected) == ids
+
+
+def test_lists_are_maintained_as_bookmarks_change(service):
+    _create(service, 10)
+    # One embedding batch sees every vector, so incremental lists equal a rebuild.
+    incremental = _lists()
+    service.neighbors.rebuild(log=lambda msg: None)
+    assert _lists() == incremental
+
+    twin = service.create("Note 4", "https://mirror.example/4", "", 1, [])
+    service.worker.drain()
+    original = service.find_by_url("https://example.com/4")
+    lists = _lists()
+    assert lists[twin.id][0] == original.id and lists[original.id][0] == twin.id
+    assert all(len(entries) == 3 for entries in lists.values())
+
+    service.delete(twin.id)
+    lists = _lists()
+    assert twin.id not in lists
+    assert all(twin.id not in entries for entries in lists.values())
+
+
+def test_similar_route_uses_stored_vectors(service, client, fake_embeddings):
+    ids = _create(service, 6)
+    calls = len(fake_embeddings.calls)
+    response = client.get(f'/bookmarks/{ids[0]}/similar', query_string={'limit': 2})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [bm['id'] for bm in body] == _lists()[ids[0]][:2]
+    assert body[0]['score'] >= body[1]['score']
+
+    # Before a list exists, the stored vector is looked up in the search index instead.
+    db.session.query(BookmarkNeighbor).delete()
+    db.session.commit()
+    assert client.get(f'/bookmarks/{ids[0]}/similar', query_string={'limit': 2}).get_json() == body
+    assert len(fake_embeddings.calls) == calls
+    assert client.get('/bookmarks/999/similar').status_code == 404
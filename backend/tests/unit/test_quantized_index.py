@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from backend.benchmarks.quantization import run
+from backend.infra import quantized_index
+from backend.infra.embedding_index import EmbeddingIndex
+from backend.infra.quantized_index import QuantizedIndex
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(3000, 64)).astype(np.float32)
+
+
+def test_quantization_error_is_small(vectors):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    codes, scales = QuantizedIndex.quantize(normalized)
+    assert codes.dtype == np.int8 and np.abs(codes).max() == 127
+    assert np.abs(codes * scales[:, None] - normalized).max() <= scales.max() / 2 + 1e-7
+
+
+@pytest.mark.parametrize('rescore', [0, 100])
+def test_search_matches_exact(vectors, rescore):
+    exact = EmbeddingIndex()
+    exact.load(enumerate(vectors))
+    index = QuantizedIndex(rescore=rescore, initial_capacity=2)
+    index.load(enumerate(vectors))
+    queries = vectors[:50] + np.random.default_rng(1).normal(scale=0.5, size=(50, 64)).astype(np.float32)
+    found = [index.search(query, 10) for query in queries]
+    truth = [exact.search(query, 10) for query in queries]
+    recall = np.mean([len({i for i, _ in a} & {i for i, _ in b}) / 10 for a, b in zip(found, truth)])
+    assert recall >= (0.999 if rescore else 0.9)
+    if rescore:
+        # Rescored similarities are the exact float32 ones.
+        assert found[0] == pytest.approx(truth[0], abs=1e-5)
+
+
+def test_upsert_remove_and_report(vectors):
+    index = QuantizedIndex(initial_capacity=2)
+    index.load([(1, [1.0, 0.0, 0.0]), (2, [0.0, 1.0, 0.0])])
+    index.upsert(3, [0.0, 0.0, 2.0])
+    index.upsert(1, [0.0, 3.0, 3.0])
+    assert index.contains_vector(1, [0.0, 1.0, 1.0])
+    assert index.search([0.0, 0.0, 1.0], 1)[0][0] == 3
+    assert index.remove(2) and not index.remove(2)
+    assert [bm_id for bm_id, _ in index.search([0.0, 1.0, 0.0], 5)] == [1, 3]
+    index.scratch_in_memory = False
+    assert index.memory_report() == {
+        'vectors': 2, 'dim': 3, 'resident_bytes': 2 * (3 + 4 + 8), 'float32_bytes': 2 * (12 + 8),
+        'saved_bytes': 10, 'ratio': 1.33, 'scratch_bytes': 4 * 12, 'scratch_in_memory': False,
+    }
+    # On tmpfs the scratch file is RAM as well, and is counted as such.
+    index.scratch_in_memory = True
+    assert index.memory_report()['resident_bytes'] == 2 * (3 + 4 + 8) + 4 * 12
+    with pytest.raises(ValueError):
+        index.upsert(4, [1.0, 0.0])
+
+
+def test_scratch_directory_avoids_memory_filesystems(tmp_path, monkeypatch):
+    if os.path.isdir('/dev/shm') and os.path.exists('/proc/mounts'):
+        assert quantized_index.memory_backed('/dev/shm')
+    monkeypatch.delenv('EMBEDDING_RESCORE_DIR', raising=False)
+    monkeypatch.setattr(quantized_index, 'memory_backed', lambda path: path == tempfile.gettempdir())
+    assert quantized_index.default_scratch_dir() == '/var/tmp'
+    assert QuantizedIndex(directory=str(tmp_path)).scratch_in_memory is False
+
+
+def test_benchmark_reports_memory_and_recall():
+    report = run(size=2000, dim=32, clusters=20, spread=1.0, queries=20, k=5, rescores=[0, 50])
+    assert report['memory']['ratio'] > 2
+    assert [row['rescore'] for row in report['int8']] == [0, 50]
+    assert report['int8'][1]['recall'] == 1.0
+
+
+def test_service_searches_an_int8_index(reading_service, client):
+    service = reading_service
+    for i in range(20):
+        service.create(f"note {i}", f"https://example.com/{i}", "", 1, [])
+    service.worker.drain()
+    service.index = service._make_index('flat')
+    exact = [bm.id for bm in service.search_by_query("note 7", limit=5, mode='semantic')]
+    service.index = service._make_index('int8')
+    service.result_cache.clear()
+    assert [bm.id for bm in service.search_by_query("note 7", limit=5, mode='semantic')] == exact
+    assert client.get('/bookmarks/search/cache-stats').get_json()['indexMemory']['vectors'] == 20
@@ -0,0 +1,50 @@
+import pytest
+
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.counter_service import CounterService
+
+
+def _seed(n_collections, n_bookmarks, prefix=""):
+    collections = [Collection(name=f"{prefix}c{i}", icon="rocket", color="#3B82F6") for i in range(n_collections)]
+    tags = [Tag(name=f"{prefix}t{i}", color="#3B82F6") for i in range(3)]
+    db.session.add_all(collections + tags)
+    db.session.flush()
+    for i in range(n_bookmarks):
+        db.session.add(Bookmark(
+            title=f"b{i}", url=f"https://example.com/{i}", description="",
+            collection_id=collections[i % n_collections].id,
+            is_favorite=i % 2 == 0, tags=tags[:i % 4],
+        ))
+    db.session.commit()
+    CounterService().reconcile()
+    db.session.expire_all()
+
+
+@pytest.mark.parametrize('path', ['/bookmarks', '/favorites', '/collections', '/collections/1'])
+def test_query_count_does_not_grow_with_data(client, count_queries, path):
+    _seed(2, 4)
+    with count_queries() as small:
+        assert client.get(path).status_code == 200
+
+    _seed(5, 60, prefix="more-")
+    with count_queries() as large:
+        assert client.get(path).status_code == 200
+
+    assert len(large) == len(small)
+    assert len(large) <= 3
+
+
+def test_collection_counts_are_read_from_counter_column(client):
+    _seed(3, 10)
+    counts = {col['name']: col['count'] for col in client.get('/collections').get_json()}
+    assert counts == {'c0': 4, 'c1': 3, 'c2': 3}
+
+
+def test_bookmark_tags_are_serialized(client):
+    _seed(1, 4)
+    tags = {bm['title']: sorted(bm['tags']) for bm in client.get('/bookmarks').get_json()}
+    assert tags['b3'] == ['t0', 't1', 't2']
+    assert tags['b0'] == []
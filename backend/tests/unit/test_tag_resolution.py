@@ -0,0 +1,63 @@
+from backend.api import app as app_module
+from backend.infra.db import db
+from backend.models.bookmark import Bookmark
+from backend.models.collection import Collection
+from backend.models.tags import Tag
+from backend.services.tag_service import TagService, tag_cache
+
+
+def _seed(n_tags=5):
+    db.session.add(Collection(name="c", icon="rocket", color="#3B82F6"))
+    db.session.add_all([Tag(name=f"t{i}", color="#3B82F6") for i in range(n_tags)])
+    db.session.commit()
+
+
+def _tag_ids(bookmark_id):
+    db.session.expire_all()
+    return sorted(tag.id for tag in Bookmark.query.get(bookmark_id).tags)
+
+
+def test_create_resolves_tags_in_one_query(app, count_queries):
+    _seed()
+    service = app_module.bookmark_service
+    with count_queries() as statements:
+        bm = service.create("one", "https://1", "", 1, [1, 2, 3, 99, 2])
+    tag_lookups = [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'FROM tag' in s]
+    assert len(tag_lookups) == 1
+    assert _tag_ids(bm.id) == [1, 2, 3]
+
+    with count_queries() as statements:
+        service.create("two", "https://2", "", 1, [1, 2, 3])
+    assert not [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'FROM tag' in s]
+
+
+def test_update_only_touches_changed_associations(app, count_queries):
+    _seed()
+    service = app_module.bookmark_service
+    bm = service.create("one", "https://1", "", 1, [1, 2, 3])
+    with count_queries() as statements:
+        service.update(bm.id, tag_ids=[2, 3, 4])
+    writes = [s for s in statements if 'bookmark_tags' in s and not s.lstrip().upper().startswith('SELECT')]
+    assert len(writes) == 2
+    assert any(s.lstrip().upper().startswith('INSERT') for s in writes)
+    assert any(s.lstrip().upper().startswith('DELETE') for s in writes)
+    assert _tag_ids(bm.id) == [2, 3, 4]
+
+    with count_queries() as statements:
+        service.update(bm.id, tag_ids=[4, 3, 2])
+    assert not [s for s in statements if 'bookmark_tags' in s and not s.lstrip().upper().startswith('SELECT')]
+
+
+def test_tag_service_writes_invalidate_the_cache(app):
+    _seed(1)
+    tags = TagService()
+    assert tag_cache.ids_for_names(["t0", "new"]) == {"t0": 1}
+
+    created = tags.create("new", None)
+    assert tag_cache.ids_for_names(["new"]) == {"new": created.id}
+
+    tags.update(created.id, name="renamed")
+    assert tag_cache.ids_for_names(["new", "renamed"]) == {"renamed": created.id}
+
+    tags.delete(created.id)
+    assert tag_cache.existing_ids([1, created.id]) == [1]
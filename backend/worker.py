@@ -0,0 +1,8 @@
+import os
+
+os.environ['EMBEDDING_WORKER'] = 'off'
+
+from backend.api.app import embedding_worker
+
+if __name__ == "__main__":
+    embedding_worker.run_forever()